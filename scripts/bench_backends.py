@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Backend benchmark for the Flask club review application.
+Runs the test suite once per database backend, with DATABASE_URL pointing the
+default app at that backend, and prints the outcome and median wall time.
+Server databases are given as NAME=URL and must be reachable and empty.
+
+Usage: python3 -m scripts.bench_backends --backend postgres=postgresql://club@localhost/clubreview
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SUMMARY = re.compile(r"(\d+) (passed|failed|error|errors|skipped)")
+
+
+def runSuite(url, pytestArgs):
+    """Run pytest with the default app on one database.
+    (arg) url-str: The database URI exported as DATABASE_URL.
+    (arg) pytestArgs-list[str]: Extra pytest arguments, e.g. a test path.
+    (return) tuple: (seconds, dict of outcome to count, exit code).
+    """
+    environment = dict(os.environ, DATABASE_URL=url)
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider",
+                             *pytestArgs], env=environment, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    lines = result.stdout.strip().splitlines()
+    outcomes = {kind: int(count) for count, kind in SUMMARY.findall(lines[-1] if lines else "")}
+    return elapsed, outcomes, result.returncode
+
+
+def main():
+    """Run the suite against every backend and print one line per backend."""
+    parser = argparse.ArgumentParser(description="Run the test suite against each database backend")
+    parser.add_argument("--backend", action="append", default=[], metavar="NAME=URL",
+                        help="Extra backend to run against; may be repeated")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("pytestArgs", nargs="*", help="Arguments passed on to pytest")
+    args = parser.parse_args()
+
+    projectRoot = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(projectRoot)
+    with tempfile.TemporaryDirectory() as scratch:
+        backends = [("sqlite-file", f"sqlite:///{os.path.join(scratch, 'bench.db')}"),
+                    ("sqlite-memory", "sqlite:///:memory:")]
+        backends += [tuple(spec.split("=", 1)) for spec in args.backend]
+        for name, url in backends:
+            samples, outcomes, exitCode = [], {}, 0
+            for _ in range(args.runs):
+                seconds, outcomes, exitCode = runSuite(url, args.pytestArgs)
+                samples.append(seconds)
+            summary = ", ".join(f"{count} {kind}" for kind, count in outcomes.items()) or "no result"
+            print(f"{name:<16} {statistics.median(samples):7.2f} s  {summary}"
+                  f"{'' if exitCode == 0 else f' (exit {exitCode})'}")
+
+
+if __name__ == "__main__":
+    main()
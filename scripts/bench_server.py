@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the club review API servers.
+Starts the Flask development server or the pre-forking server, drives it
+with keep-alive HTTP clients for a fixed time and prints requests/second
+and latency percentiles.
+
+Usage: python3 -m scripts.bench_server --server prefork --workers 4
+"""
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+DEFAULT_PATHS = ["/api/clubs", "/api/clubs/pppjo/reviews/stats", "/api/users/1"]
+
+
+def serverCommand(args):
+    """Return the command line that starts the server under test.
+    (arg) args-Namespace: Parsed command line options.
+    (return) list[str]: The command.
+    """
+    if args.server == "dev":
+        return [sys.executable, "-m", "flask", "--app", "src.app", "run",
+                "--port", str(args.port)]
+    return [sys.executable, "-m", "scripts.serve", "--port", str(args.port),
+            "--workers", str(args.workers)]
+
+
+def waitForPort(port, timeout=30.0):
+    """Block until something accepts connections on localhost:port.
+    (return) None
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server did not start on port {port}")
+
+
+def clientLoop(port, paths, deadline, latencies, errors):
+    """Issue requests round-robin over paths until the deadline.
+    (return) None
+    """
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    index = 0
+    while time.monotonic() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            connection.request("GET", path, headers={"Accept-Encoding": "gzip"})
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+            if response.getheader("Connection", "").lower() == "close" or response.version == 10:
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        except (OSError, http.client.HTTPException):
+            errors.append(None)
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+
+
+def percentile(sortedValues, fraction):
+    """Return the value at a fraction of a sorted list.
+    (return) float: The percentile value; 0.0 for an empty list.
+    """
+    if not sortedValues:
+        return 0.0
+    return sortedValues[min(len(sortedValues) - 1, int(fraction * len(sortedValues)))]
+
+
+def main():
+    """Start the server, run the load and print the results."""
+    parser = argparse.ArgumentParser(description="Benchmark the club review API servers")
+    parser.add_argument("--server", choices=["dev", "prefork"], default="prefork")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--path", action="append", dest="paths")
+    args = parser.parse_args()
+    paths = args.paths or DEFAULT_PATHS
+
+    projectRoot = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = subprocess.Popen(serverCommand(args), cwd=projectRoot,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        waitForPort(args.port)
+        latencies, errors = [], []
+        deadline = time.monotonic() + args.duration
+        clients = [threading.Thread(target=clientLoop,
+                                    args=(args.port, paths, deadline, latencies, errors))
+                   for _ in range(args.clients)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    label = "dev server" if args.server == "dev" else f"prefork x{args.workers}"
+    print(f"{label}: {len(latencies) / args.duration:.0f} req/s, "
+          f"p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms, "
+          f"{len(errors)} errors ({args.clients} clients, {args.duration:.0f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -57,8 +57,10 @@ def create_sample_reviews():
 
 if __name__ == "__main__":
     localDbFile = f"instance/{DB_FILE}"
-    if os.path.exists(localDbFile):
-        os.remove(localDbFile)
+    # WAL mode leaves -wal/-shm files next to the database
+    for path in (localDbFile, f"{localDbFile}-wal", f"{localDbFile}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
     with app.app_context():
         db.create_all()
         load_data()  
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Synthetic dataset generator for the club review API.
+Builds a fresh database with N clubs, M users and K reviews from a seed, so
+the same arguments always produce the same rows. Club popularity and user
+activity follow power laws: a few clubs collect most favorites and reviews
+and a few users write most of them. Tag use is Zipf distributed too.
+
+Rows are written with executemany INSERTs in committed batches, bypassing the
+ORM, and the derived tables (review rollups, tag and favorite counts and
+the review search index) are recomputed once at the end. The target database is dropped and recreated;
+with --shards (or REVIEW_SHARDS) reviews are spread over shard files.
+
+Usage: python3 -m scripts.generate --clubs 2000 --users 200000 --reviews 10000000 --seed 1
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# Review dates fall in the REVIEW_DAYS before this fixed time, so output does not depend on the clock
+END_TIME = datetime(2025, 1, 1)
+REVIEW_DAYS = 730
+# Topical tags, most common first; the nth is weighted 1 / n ** TAG_SKEW
+TOPIC_TAGS = ["Pre-Professional", "Academic", "Cultural", "Technology", "Arts", "Athletics",
+              "Community Service", "Performing Arts", "Business", "Social", "Media",
+              "Literary", "Religious", "Health", "Politics", "Environmental", "Gaming",
+              "Music", "Engineering", "Entrepreneurship"]
+TAG_SKEW = 1.1
+# Zipf exponent of club popularity and Pareto shape of user activity
+POPULARITY_SKEW = 0.8
+ACTIVITY_SHAPE = 2.0
+NAME_WORDS = ["Penn", "Quaker", "Philly", "Schuylkill", "Locust", "Franklin", "Walnut", "Spruce"]
+NAME_TOPICS = ["Juggling", "Robotics", "Debate", "Chess", "Film", "Jazz", "Consulting", "Hiking",
+               "Poetry", "Finance", "Climbing", "Origami", "Astronomy", "Baking", "Sailing",
+               "Improv", "Mock Trial", "Data Science", "Pottery", "A Cappella"]
+NAME_KINDS = ["Club", "Society", "Association", "Collective", "Group", "Guild"]
+TITLES = {
+    "low": ["Not what I expected", "Disorganized meetings", "Would not recommend",
+            "Too much drama here"],
+    "mid": ["Decent but uneven", "Fine for a semester", "Good people, few events",
+            "Worth a try"],
+    "high": ["Amazing community!", "Best club on campus", "Loved every meeting",
+             "Great for recruiting", "Found my people here"]
+}
+SENTENCES = ["The board is responsive and events start on time.",
+             "Meetings are weekly and the workload is manageable.",
+             "Great place to meet upperclassmen.",
+             "Recruiting was stressful but fair.",
+             "Dues are a bit high for what you get.",
+             "The alumni network is genuinely helpful.",
+             "Some events felt like an afterthought.",
+             "I made most of my friends here.",
+             "Practices run late before competitions.",
+             "Very welcoming to transfer and graduate students."]
+# Review texts: one to three consecutive sentences; None stands for no text
+TEXTS = [None] + [" ".join((SENTENCES * 2)[first:first + count])
+                  for count in range(1, 4) for first in range(len(SENTENCES))]
+
+
+def paretoWeights(rng, count, shape):
+    """Draw a heavy-tailed weight per item.
+    (arg) rng-Random: The random stream.
+    (arg) count-int: Number of items.
+    (arg) shape-float: Pareto shape; smaller means a few items dominate.
+    (return) list[float]: One weight per item.
+    """
+    return [rng.paretovariate(shape) for _ in range(count)]
+
+
+def zipfWeights(rng, count, skew):
+    """Weight items 1 / rank ** skew, with ranks dealt out in random order.
+    (arg) rng-Random: The random stream.
+    (arg) count-int: Number of items.
+    (arg) skew-float: Zipf exponent; larger means a few items dominate.
+    (return) list[float]: One weight per item.
+    """
+    ranks = list(range(1, count + 1))
+    rng.shuffle(ranks)
+    return [1 / rank ** skew for rank in ranks]
+
+
+def allocate(total, weights, cap):
+    """Split a total over items in proportion to their weights.
+    Each item gets at most cap; the rounding remainder goes to items in order.
+    (arg) total-int: Units to hand out.
+    (arg) weights-list[float]: Item weights.
+    (arg) cap-int: Most units one item may get.
+    (return) list[int]: Units per item, summing to total.
+    """
+    if total > cap * len(weights):
+        raise ValueError(f"Cannot place {total} units on {len(weights)} items of at most {cap}")
+    scale = total / sum(weights)
+    counts = [min(cap, int(weight * scale)) for weight in weights]
+    short = total - sum(counts)
+    while short:
+        for index, count in enumerate(counts):
+            if short and count < cap:
+                counts[index] += 1
+                short -= 1
+    return counts
+
+
+def pickDistinct(rng, count, population, cumWeights):
+    """Pick count distinct items, each draw weighted by popularity.
+    Large picks fall back to a uniform sample, where rejection would stall.
+    (arg) rng-Random: The random stream.
+    (arg) count-int: Items wanted; at most len(population).
+    (arg) population-list, cumWeights-list[float]: Items and their cumulative weights.
+    (return) list: The picked items.
+    """
+    if count * 4 > len(population):
+        return rng.sample(population, count)
+    picked = set()
+    while len(picked) < count:
+        picked.update(rng.choices(population, cum_weights=cumWeights, k=count - len(picked)))
+    return sorted(picked)
+
+
+def batched(rows, size):
+    """Yield lists of up to size rows from an iterable."""
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def insertRows(session, table, rows, batchSize):
+    """Insert rows with one executemany per batch, committing after each.
+    (arg) session-Session: The session to write through.
+    (arg) table-Table: The target table.
+    (arg) rows-iterable[dict]: Column values per row.
+    (arg) batchSize-int: Rows per INSERT.
+    (return) int: Rows written.
+    """
+    written = 0
+    for batch in batched(rows, batchSize):
+        session.execute(table.insert(), batch)
+        session.commit()
+        written += len(batch)
+    return written
+
+
+class DatasetGenerator:
+    """Produces the rows of a synthetic dataset; every table has its own random stream,
+    so changing the number of reviews leaves the clubs and users unchanged.
+    """
+
+    def __init__(self, clubs, users, reviews, seed=0, favoritesPerUser=2.0, shardCount=1):
+        """Draw the club popularity, quality and user activity the rows are built from.
+        (arg) clubs-int, users-int, reviews-int: Rows to generate.
+        (arg) seed-int: Seed of every random stream.
+        (arg) favoritesPerUser-float: Mean favorites of a user.
+        (arg) shardCount-int: Review shards; review ids are assigned per shard.
+        """
+        if clubs < 1 or users < 1 or reviews < 0:
+            raise ValueError("Need at least one club and one user and no negative reviews")
+        self.clubCount, self.userCount, self.reviewCount = clubs, users, reviews
+        self.seed = seed
+        self.favoritesPerUser = favoritesPerUser
+        self.shardCount = shardCount
+        rng = self.stream("weights")
+        self.codes = [self.clubCode(index) for index in range(clubs)]
+        self.cumPopularity = list(accumulate(zipfWeights(rng, clubs, POPULARITY_SKEW)))
+        self.quality = [min(9.0, max(2.0, rng.gauss(6.5, 1.5))) for _ in range(clubs)]
+        undergraduates = [rng.random() < 0.85 for _ in range(clubs)]
+        self.studentTypes = [(allowed, not allowed or rng.random() < 0.3)
+                             for allowed in undergraduates]
+        self.reviewsPerUser = allocate(reviews, paretoWeights(rng, users, ACTIVITY_SHAPE), clubs)
+
+    def stream(self, name):
+        """Return the random stream of one part of the dataset."""
+        return random.Random(f"{self.seed}-{name}")
+
+    @staticmethod
+    def clubCode(index):
+        """Return the code of the club with the given index."""
+        return f"club-{index:06d}"
+
+    def tagRows(self):
+        """Yield the tag rows; club counts are filled in after the load."""
+        for name in ["Undergraduate", "Graduate", *TOPIC_TAGS]:
+            yield {"name": name, "clubCount": 0}
+
+    def clubRows(self):
+        """Yield club rows with power-law member counts."""
+        rng = self.stream("clubs")
+        for index, code in enumerate(self.codes):
+            undergraduates, graduates = self.studentTypes[index]
+            yield {
+                "code": code,
+                "name": f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_TOPICS)} "
+                        f"{rng.choice(NAME_KINDS)} {index}",
+                "description": f"A synthetic club about {rng.choice(NAME_TOPICS).lower()} "
+                               f"for benchmarking.",
+                "memberCount": min(5000, int(5 * rng.paretovariate(ACTIVITY_SHAPE))),
+                "undergraduatesAllowed": undergraduates,
+                "graduatesAllowed": graduates,
+                "dateCreated": END_TIME - timedelta(days=REVIEW_DAYS + rng.randrange(3650)),
+                "favorites_count": 0
+            }
+
+    def clubTagRows(self):
+        """Yield club-tag links: the student type tags plus one to four Zipf-chosen topics."""
+        rng = self.stream("tags")
+        cumTags = list(accumulate(1 / rank ** TAG_SKEW for rank in range(1, len(TOPIC_TAGS) + 1)))
+        for code, (undergraduates, graduates) in zip(self.codes, self.studentTypes):
+            names = pickDistinct(rng, 1 + min(3, int(rng.expovariate(1.0))), TOPIC_TAGS, cumTags)
+            if undergraduates:
+                names.append("Undergraduate")
+            if graduates:
+                names.append("Graduate")
+            for name in names:
+                yield {"club_code": code, "tag_name": name}
+
+    def userRows(self):
+        """Yield user rows; ids are 1 to M."""
+        for userId in range(1, self.userCount + 1):
+            yield {"id": userId, "username": f"user{userId:07d}",
+                   "email": f"user{userId:07d}@example.edu"}
+
+    def favoriteRows(self):
+        """Yield favorites: a heavy-tailed number per user, of popularity-weighted clubs."""
+        rng = self.stream("favorites")
+        population = list(range(self.clubCount))
+        scale = self.favoritesPerUser / (ACTIVITY_SHAPE / (ACTIVITY_SHAPE - 1))
+        for userId in range(1, self.userCount + 1):
+            count = min(self.clubCount, int(scale * rng.paretovariate(ACTIVITY_SHAPE)))
+            for index in pickDistinct(rng, count, population, self.cumPopularity):
+                yield {"user_id": userId, "club_code": self.codes[index]}
+
+    def reviewRows(self):
+        """Yield reviews: each user's share of K, on distinct popularity-weighted clubs.
+        Ratings scatter around each club's quality. Ids are sequential, or on
+        shard k of N the sequence k + N, k + 2N, ... like ids the app allocates.
+        """
+        rng = self.stream("reviews")
+        uniform = rng.random
+        population = list(range(self.clubCount))
+        if self.shardCount > 1:
+            from src.shards import shardIndex
+            shardOf = [shardIndex(code, self.shardCount) for code in self.codes]
+        nextIds = list(range(self.shardCount))
+        start = END_TIME - timedelta(days=REVIEW_DAYS)
+        seconds = REVIEW_DAYS * 86400
+        for userIndex, count in enumerate(self.reviewsPerUser):
+            for index in pickDistinct(rng, count, population, self.cumPopularity):
+                shard = shardOf[index] if self.shardCount > 1 else 0
+                nextIds[shard] += self.shardCount
+                rating = min(10, max(1, round(rng.gauss(self.quality[index], 1.8))))
+                titles = TITLES["low" if rating <= 4 else "mid" if rating <= 7 else "high"]
+                createdAt = start + timedelta(seconds=int(uniform() * seconds))
+                yield {
+                    "id": nextIds[shard],
+                    "user_id": userIndex + 1,
+                    "club_code": self.codes[index],
+                    "rating": rating,
+                    "title": titles[int(uniform() * len(titles))],
+                    "text": TEXTS[int(uniform() * len(TEXTS))],
+                    "created_at": createdAt,
+                    "updated_at": createdAt
+                }
+
+
+def generate(session, generator, batchSize=20000, report=None):
+    """Write a generated dataset into empty tables and recompute the derived ones.
+    (arg) session-Session: Session of the target app.
+    (arg) generator-DatasetGenerator: The dataset.
+    (arg) batchSize-int: Rows per INSERT.
+    (arg) report-callable: Called with (phase, rows, seconds) after each phase.
+    (return) dict: Rows written per table.
+    """
+    from src.models import (Club, ReviewRollup, Review, Tag, User, clubTagAssociation,
+                            userClubAssociation)
+    from src.search import pauseSearchIndexing, rebuildSearchIndex, searchConnections, \
+        supportsFullText
+    phases = [("tags", Tag.__table__, generator.tagRows),
+              ("clubs", Club.__table__, generator.clubRows),
+              ("club_tags", clubTagAssociation, generator.clubTagRows),
+              ("users", User.__table__, generator.userRows),
+              ("favorites", userClubAssociation, generator.favoriteRows),
+              ("reviews", Review.__table__, generator.reviewRows)]
+    # Reviews are indexed in one pass after the load rather than row by row
+    for connection in searchConnections(session):
+        if supportsFullText(connection):
+            pauseSearchIndexing(connection)
+    session.commit()
+    written = {}
+    for name, table, rows in phases:
+        started = time.perf_counter()
+        written[name] = insertRows(session, table, rows(), batchSize)
+        if report:
+            report(name, written[name], time.perf_counter() - started)
+    started = time.perf_counter()
+    written["rollups"] = ReviewRollup.rebuild(session)
+    Tag.recountClubs(session)
+    Club.recountFavorites(session)
+    for connection in searchConnections(session):
+        if supportsFullText(connection):
+            rebuildSearchIndex(connection)
+    session.commit()
+    if report:
+        report("derived", written["rollups"], time.perf_counter() - started)
+    return written
+
+
+def main():
+    """Parse arguments, recreate the database and fill it."""
+    parser = argparse.ArgumentParser(description="Generate a synthetic club review dataset")
+    parser.add_argument("--clubs", type=int, default=500)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--reviews", type=int, default=200000)
+    parser.add_argument("--favorites", type=float, default=2.0, help="Mean favorites per user")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=20000, help="Rows per INSERT")
+    parser.add_argument("--database", help="Database URI; defaults to DATABASE_URL or the instance database")
+    parser.add_argument("--shards", type=int, help="Review shards; defaults to REVIEW_SHARDS")
+    args = parser.parse_args()
+
+    from src.database import create_app, db
+    from src.shards import getReviewShards
+    config = {}
+    if args.database:
+        config["SQLALCHEMY_DATABASE_URI"] = args.database
+    if args.shards:
+        config["REVIEW_SHARDS"] = args.shards
+    application = create_app(config)
+    with application.app_context():
+        shards = getReviewShards()
+        generator = DatasetGenerator(args.clubs, args.users, args.reviews, args.seed,
+                                     args.favorites, shards.count if shards else 1)
+        db.drop_all()
+        db.create_all()
+        if shards is not None:
+            shards.dropAll()
+            shards.createAll()
+        started = time.perf_counter()
+        generate(db.session, generator, args.batch_size,
+                 lambda phase, rows, seconds: print(
+                     f"{phase:<10} {rows:>10} rows {seconds:8.2f} s "
+                     f"({rows / seconds if seconds else math.inf:,.0f}/s)"))
+        print(f"{'total':<10} {'':>10}      {time.perf_counter() - started:8.2f} s")
+
+
+if __name__ == "__main__":
+    main()
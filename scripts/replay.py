@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Traffic replay load generator for the club review API.
+Reads recorded requests from a JSON lines file and replays them against the
+app in-process or over HTTP at a fixed concurrency, either at the recorded
+pace (optionally sped up) or at a fixed rate. Prints per-route latency
+percentiles, throughput and error rates and can save them as JSON.
+
+Each usable line is an object with "method" and "path", plus optional
+"body" (JSON value or string), "headers" and timing as "offset" (seconds
+since the first request) or "timestamp" (epoch seconds or ISO-8601).
+Lines without a method and path are skipped.
+
+Usage: python3 -m scripts.replay traffic.jsonl --concurrency 8 --speed 2 --output run.json
+"""
+import argparse
+import http.client
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlsplit
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from werkzeug.exceptions import HTTPException
+
+from scripts.bench_server import percentile
+
+
+def parseTime(record):
+    """Return a record's recorded time in seconds, if it has one.
+    (arg) record-dict: One recorded request.
+    (return) float: Seconds on the record's own clock, or None.
+    """
+    if "offset" in record:
+        return float(record["offset"])
+    stamp = record.get("timestamp")
+    if stamp is None:
+        return None
+    if isinstance(stamp, str):
+        return datetime.fromisoformat(stamp).timestamp()
+    return float(stamp)
+
+
+def loadRecords(path):
+    """Read the replayable requests from a JSON lines file.
+    (arg) path-str: Path of the recording.
+    (return) tuple: (list of records with an "offset" in seconds, skipped line count).
+    """
+    records, skipped = [], 0
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not record.get("method") or not record.get("path"):
+                    raise ValueError("missing method or path")
+                recorded = parseTime(record)
+            except (ValueError, TypeError, AttributeError):
+                skipped += 1
+                continue
+            records.append({
+                "method": record["method"].upper(),
+                "path": record["path"],
+                "body": record.get("body"),
+                "headers": record.get("headers") or {},
+                "time": recorded
+            })
+    times = [record["time"] for record in records if record["time"] is not None]
+    start = min(times) if times else 0.0
+    for record in records:
+        recorded = record.pop("time")
+        record["offset"] = None if recorded is None else recorded - start
+    return records, skipped
+
+
+def encodeBody(record):
+    """Return the request body and headers for a record.
+    (return) tuple: (bytes or None, dict of headers).
+    """
+    headers = dict(record["headers"])
+    body = record["body"]
+    if body is None:
+        return None, headers
+    if isinstance(body, str):
+        return body.encode(), headers
+    headers.setdefault("Content-Type", "application/json")
+    return json.dumps(body).encode(), headers
+
+
+class RouteMatcher:
+    """Groups request paths by the app's URL rules."""
+
+    def __init__(self, application):
+        """Bind to an application's URL map.
+        (arg) application-Flask: The application whose routes are replayed.
+        """
+        self._adapter = application.url_map.bind("localhost")
+
+    def key(self, method, path):
+        """Return the route a request is reported under.
+        (return) str: "METHOD /rule/<arg>", or "METHOD <unmatched>".
+        """
+        try:
+            rule, _ = self._adapter.match(urlsplit(path).path, method, return_rule=True)
+            return f"{method} {rule.rule}"
+        except HTTPException:
+            return f"{method} <unmatched>"
+
+
+class InProcessSender:
+    """Sends requests through a Flask test client."""
+
+    def __init__(self, application):
+        """(arg) application-Flask: The application to call."""
+        self._client = application.test_client()
+
+    def send(self, method, path, body, headers):
+        """Issue one request.
+        (return) int: The response status code.
+        """
+        return self._client.open(path, method=method, data=body, headers=headers).status_code
+
+    def close(self):
+        """Nothing to release for a test client."""
+
+
+class HttpSender:
+    """Sends requests over one keep-alive HTTP connection."""
+
+    def __init__(self, host, port):
+        """(arg) host-str, port-int: The server to call."""
+        self.host, self.port = host, port
+        self._connection = http.client.HTTPConnection(host, port, timeout=30)
+
+    def send(self, method, path, body, headers):
+        """Issue one request, reconnecting if the server closed the connection.
+        (return) int: The response status code.
+        """
+        try:
+            self._connection.request(method, path, body=body, headers=headers)
+            response = self._connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self._connection.close()
+            self._connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            raise
+        if response.getheader("Connection", "").lower() == "close" or response.version == 10:
+            self._connection.close()
+            self._connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        return response.status
+
+    def close(self):
+        """Close the connection."""
+        self._connection.close()
+
+
+def replay(records, makeSender, matcher, concurrency=8, rate=None, speed=1.0, loops=1):
+    """Replay records from a pool of worker threads.
+    With a rate, requests are sent at fixed intervals; otherwise they follow
+    the recorded offsets divided by speed (speed 0 sends as fast as possible).
+    (arg) records-list[dict]: Records returned by loadRecords.
+    (arg) makeSender-callable: Returns a new sender for each worker.
+    (arg) matcher-RouteMatcher: Groups results by route.
+    (return) tuple: (list of (route, status or None, latency seconds, lag seconds), elapsed).
+    """
+    work = queue.Queue(maxsize=concurrency * 4)
+    results = []
+    resultsLock = threading.Lock()
+
+    def worker():
+        sender = makeSender()
+        try:
+            while True:
+                item = work.get()
+                if item is None:
+                    return
+                record, due = item
+                wait = due - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                body, headers = encodeBody(record)
+                started = time.perf_counter()
+                try:
+                    status = sender.send(record["method"], record["path"], body, headers)
+                except Exception:
+                    status = None
+                latency = time.perf_counter() - started
+                route = matcher.key(record["method"], record["path"])
+                with resultsLock:
+                    results.append((route, status, latency, max(0.0, started - due)))
+        finally:
+            sender.close()
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in workers:
+        thread.start()
+
+    span = max((record["offset"] for record in records if record["offset"] is not None),
+               default=0.0)
+    startedAt = time.perf_counter()
+    index = 0
+    for loop in range(loops):
+        loopStart = startedAt + span / speed * loop if speed else startedAt
+        for record in records:
+            if rate:
+                due = startedAt + index / rate
+            elif speed and record["offset"] is not None:
+                due = loopStart + record["offset"] / speed
+            else:
+                due = time.perf_counter()
+            index += 1
+            work.put((record, due))
+    for _ in workers:
+        work.put(None)
+    for thread in workers:
+        thread.join()
+    return results, time.perf_counter() - startedAt
+
+
+def summarizeGroup(entries, elapsed):
+    """Return latency, throughput and error figures for a list of results.
+    (return) dict: JSON-serializable statistics.
+    """
+    latencies = sorted(latency for _, _, latency, _ in entries)
+    statuses = defaultdict(int)
+    errors = 0
+    for _, status, _, _ in entries:
+        statuses["error" if status is None else str(status)] += 1
+        if status is None or status >= 500:
+            errors += 1
+    return {
+        "count": len(entries),
+        "throughput_rps": round(len(entries) / elapsed, 2) if elapsed else 0.0,
+        "errors": errors,
+        "error_rate": round(errors / len(entries), 4) if entries else 0.0,
+        "statuses": dict(sorted(statuses.items())),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_lag_ms": round(max((lag for *_, lag in entries), default=0.0) * 1000, 2)
+    }
+
+
+def summarize(results, elapsed):
+    """Return overall and per-route statistics for a replay.
+    (return) dict: {"overall": {...}, "routes": {route: {...}}}.
+    """
+    byRoute = defaultdict(list)
+    for entry in results:
+        byRoute[entry[0]].append(entry)
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "overall": summarizeGroup(results, elapsed),
+        "routes": {route: summarizeGroup(entries, elapsed)
+                   for route, entries in sorted(byRoute.items())}
+    }
+
+
+def printReport(report):
+    """Print a replay report as a table."""
+    print(f"{'route':<48} {'count':>6} {'rps':>8} {'err%':>6} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    rows = list(report["routes"].items()) + [("overall", report["overall"])]
+    for route, stats in rows:
+        print(f"{route[:48]:<48} {stats['count']:>6} {stats['throughput_rps']:>8.1f} "
+              f"{stats['error_rate'] * 100:>6.1f} {stats['p50_ms']:>8.1f} "
+              f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+
+
+def main():
+    """Load the recording, replay it and report the results."""
+    parser = argparse.ArgumentParser(description="Replay recorded traffic against the club review API")
+    parser.add_argument("recording", help="JSON lines file of recorded requests")
+    parser.add_argument("--target", default="inprocess",
+                        help="'inprocess' or a base URL such as http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Send at this many requests/second instead of the recorded pace")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Recorded pace multiplier; 0 sends as fast as possible")
+    parser.add_argument("--loops", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    records, skipped = loadRecords(args.recording)
+    if skipped:
+        print(f"Skipped {skipped} lines without a method and path", file=sys.stderr)
+    if not records:
+        parser.exit(1, f"No replayable requests in {args.recording}\n")
+
+    from src.database import create_app
+    application = create_app()
+    if args.target == "inprocess":
+        makeSender = lambda: InProcessSender(application)
+    else:
+        target = urlsplit(args.target)
+        makeSender = lambda: HttpSender(target.hostname, target.port or 80)
+
+    results, elapsed = replay(records, makeSender, RouteMatcher(application),
+                              args.concurrency, args.rate, args.speed, args.loops)
+    report = summarize(results, elapsed)
+    report["config"] = {
+        "recording": args.recording, "target": args.target, "concurrency": args.concurrency,
+        "rate": args.rate, "speed": args.speed, "loops": args.loops, "skipped_lines": skipped
+    }
+    printReport(report)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
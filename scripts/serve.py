@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Pre-forking production server for the Flask club review application.
+The parent binds one listening socket and forks worker processes that all
+accept from it and serve each request on a thread. Each worker warms its
+connections and caches before taking traffic and is replaced after a
+request or memory budget. The recommendation index and analytics store are
+per worker; each catches up on the change log before it is read, so writes
+served by one worker reach the others.
+
+Usage: python3 -m scripts.serve --workers 4 --port 8000
+"""
+import argparse
+import os
+import random
+import resource
+import signal
+import socket
+import sys
+import time
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from src.app import app
+from src.database import db, getReadEngine
+from src.groupcommit import configureGroupCommit
+from src.logconfig import startWriter
+from src.jobs import configureJobs
+from src.purge import configurePurge
+from src.models import Club
+
+# GET routes whose first call compiles statements and fills in-process caches
+WARMUP_PATHS = ["/api/clubs", "/api/users", "/api/reviews"]
+
+
+class WorkerRequestHandler(WSGIRequestHandler):
+    """Request handler that closes each connection after one request.
+    Werkzeug switches threaded servers to keep-alive; staying on HTTP/1.0
+    keeps one request per accepted connection, so the recycle budget counts
+    requests and a retiring worker never waits on an idle client.
+    """
+    protocol_version = "HTTP/1.0"
+
+
+def warmWorker(application):
+    """Prepare a freshly forked worker before it accepts requests.
+    Drops connections inherited from the parent, restarts the group-commit
+    writer, purge, job and log writer threads (threads do not survive fork) and
+    issues warm-up requests that open pooled connections, compile statements
+    and fill caches.
+    (arg) application-Flask: The application.
+    (return) None
+    """
+    with application.app_context():
+        db.engine.dispose(close=False)
+        readEngine = getReadEngine()
+        if readEngine is not None:
+            readEngine.dispose(close=False)
+    if "reviewShards" in application.extensions:
+        application.extensions["reviewShards"].dispose()
+    if application.extensions.pop("groupCommitter", None) is not None:
+        configureGroupCommit(application)
+    if application.extensions.pop("purger", None) is not None:
+        configurePurge(application)
+    application.extensions.pop("jobRunner", None)
+    configureJobs(application)
+    if application.extensions.get("logHandler") is not None:
+        startWriter(application.config["LOG_QUEUE_SIZE"])
+    client = application.test_client()
+    for path in WARMUP_PATHS:
+        client.get(path, headers={"Accept-Encoding": "gzip"})
+    with application.app_context():
+        codes = [code for (code,) in db.session.query(Club.code).limit(20)]
+    for code in codes:
+        client.get(f"/api/clubs/{code}/reviews/stats")
+        client.get(f"/api/clubs/{code}/related")
+
+
+def peakMemoryMb():
+    """Return this process's peak resident set size in megabytes.
+    (return) float: Peak RSS.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def runWorker(listener, args):
+    """Serve requests from the shared socket until the recycle budget is spent.
+    Each request runs in its own thread, so a long poll of /api/changes does
+    not hold up the worker's other requests.
+    (arg) listener-socket: The listening socket created by the parent.
+    (arg) args-Namespace: Parsed command line options.
+    (return) None
+    """
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    warmWorker(app)
+    server = make_server(args.host, args.port, app, threaded=True,
+                         request_handler=WorkerRequestHandler, fd=listener.fileno())
+    # Non-daemon request threads are joined by server_close before the worker exits
+    server.daemon_threads = False
+    budget = args.max_requests + random.randint(0, args.max_requests_jitter)
+    served = 0
+    while args.max_requests == 0 or served < budget:
+        server.handle_request()
+        served += 1
+        if args.max_memory_mb and peakMemoryMb() > args.max_memory_mb:
+            break
+    server.server_close()
+    # Finish this worker's jobs; ones cut short by a kill are failed by the next worker's start
+    app.extensions["jobRunner"].shutdown()
+
+
+def spawnWorker(listener, args):
+    """Fork one worker process.
+    (return) int: The child's pid.
+    """
+    pid = os.fork()
+    if pid == 0:
+        try:
+            runWorker(listener, args)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def main():
+    """Bind the socket, fork the workers and replace them as they retire."""
+    parser = argparse.ArgumentParser(description="Pre-forking server for the club review API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--backlog", type=int, default=1024)
+    parser.add_argument("--max-requests", type=int, default=10000,
+                        help="Recycle a worker after this many requests (0 disables)")
+    parser.add_argument("--max-requests-jitter", type=int, default=1000,
+                        help="Random extra requests so workers do not all recycle together")
+    parser.add_argument("--max-memory-mb", type=float, default=0,
+                        help="Recycle a worker once its peak RSS exceeds this (0 disables)")
+    args = parser.parse_args()
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((args.host, args.port))
+    listener.listen(args.backlog)
+    listener.set_inheritable(True)
+
+    workers = {spawnWorker(listener, args) for _ in range(args.workers)}
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers", flush=True)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while workers:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            # Brief pause so a worker that crashes on start does not spin
+            time.sleep(0.1)
+            workers.add(spawnWorker(listener, args))
+    listener.close()
+
+
+if __name__ == "__main__":
+    main()
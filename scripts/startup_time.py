@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark for the Flask club review application.
+Imports each module in a fresh interpreter with -X importtime, reports the
+cumulative import cost and the time create_app takes to build an app.
+
+Usage: python3 -m scripts.startup_time --runs 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+MODULES = ["src", "src.validation", "src.models", "src.database", "src.app"]
+FACTORY_SNIPPET = (
+    "from src.database import create_app;"
+    "print(create_app().config['STARTUP_SECONDS'])"
+)
+
+
+def importMicroseconds(module):
+    """Import a module in a new interpreter and return its cumulative import time.
+    (arg) module-str: Dotted module name.
+    (return) int: Microseconds spent importing the module and its dependencies.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1])
+    return 0
+
+
+def factorySeconds():
+    """Build the default app in a new interpreter and return create_app's duration.
+    (return) float: Seconds reported in STARTUP_SECONDS.
+    """
+    result = subprocess.run([sys.executable, "-c", FACTORY_SNIPPET],
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    """Print the median import time of each module and of create_app."""
+    parser = argparse.ArgumentParser(description="Measure cold start of the club review API")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for module in MODULES:
+        samples = [importMicroseconds(module) for _ in range(args.runs)]
+        print(f"import {module:<16} {statistics.median(samples) / 1000:8.1f} ms")
+    samples = [factorySeconds() for _ in range(args.runs)]
+    print(f"{'create_app()':<23} {statistics.median(samples) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,31 @@
 """
 Penn Club Review 
 """
-from .app import app
-from .models import Club, User, Tag, Review
-from .validation import ValidationError
-from .database import db, DB_FILE
+import importlib
 
-__all__ = ['app', 'db', 'Club', 'User', 'Tag', 'Review', 'ValidationError']
\ No newline at end of file
+# Public names and the submodule that defines them; imported on first access
+_EXPORTS = {
+    'app': '.app',
+    'create_app': '.database',
+    'db': '.database',
+    'DB_FILE': '.database',
+    'Club': '.models',
+    'User': '.models',
+    'Tag': '.models',
+    'Review': '.models',
+    'ValidationError': '.validation',
+}
+
+__all__ = ['app', 'create_app', 'db', 'Club', 'User', 'Tag', 'Review', 'ValidationError']
+
+
+def __getattr__(name):
+    """Import a public name from its submodule on first access.
+    (arg) name-str: The attribute being looked up.
+    (return) Any: The exported object.
+    """
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
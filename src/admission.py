@@ -0,0 +1,143 @@
+"""
+Admission control for the Flask club review application.
+Caps concurrent requests per route class with a bounded wait queue and
+sheds the excess with a fast 503, so overload degrades predictably.
+"""
+import threading
+import time
+
+from flask import g, jsonify, request
+
+# Endpoints that are more expensive than a plain read
+SEARCH_ENDPOINTS = {"api.searchClubs", "api.searchReviews"}
+STATS_ENDPOINTS = {"api.getClubReviewStats", "api.getClubReviewTrend", "api.getTagAnalytics",
+                   "api.getEligibilityAnalytics", "api.getMemberCountCorrelation"}
+# Long-polling endpoints, kept apart so waiting clients cannot starve reads
+FEED_ENDPOINTS = {"api.getChanges"}
+# Endpoints that are never queued, so overload stays observable
+EXEMPT_ENDPOINTS = {"static", "debug.getAdmissionStats", "debug.getQueryStats",
+                    "debug.resetQueryStats", "debug.getMemoryProfile",
+                    "debug.takeMemorySnapshot", "debug.resetMemoryProfile"}
+
+
+class AdmissionGate:
+    """Concurrency limit with a bounded wait queue for one route class."""
+
+    def __init__(self, name, limit, queueSize, timeout):
+        """Create a gate.
+        (arg) name-str: Route class name.
+        (arg) limit-int: Requests allowed to run at once.
+        (arg) queueSize-int: Requests allowed to wait for a slot.
+        (arg) timeout-float: Seconds a queued request waits before being shed.
+        """
+        self.name = name
+        self.limit = limit
+        self.queueSize = queueSize
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timedOut = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed.
+        (return) bool: True if admitted; False if the request should be shed.
+        """
+        with self._condition:
+            if self.active >= self.limit:
+                if self.waiting >= self.queueSize:
+                    self.rejected += 1
+                    return False
+                self.waiting += 1
+                deadline = time.monotonic() + self.timeout
+                try:
+                    while self.active >= self.limit:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.timedOut += 1
+                            return False
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        """Give a slot back and wake one queued request.
+        (return) None
+        """
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def stats(self):
+        """Return the gate's limits and counters.
+        (return) dict: JSON-serializable gate state.
+        """
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "queue_size": self.queueSize,
+                "active": self.active,
+                "queue_depth": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timedOut
+            }
+
+
+def routeClass(endpoint, method):
+    """Return the route class a request is admitted under.
+    (arg) endpoint-str: The matched endpoint name.
+    (arg) method-str: The HTTP method.
+    (return) str: "search", "stats", "feeds", "reads" or "writes".
+    """
+    if endpoint in SEARCH_ENDPOINTS:
+        return "search"
+    if endpoint in STATS_ENDPOINTS:
+        return "stats"
+    if endpoint in FEED_ENDPOINTS:
+        return "feeds"
+    return "reads" if method in ("GET", "HEAD", "OPTIONS") else "writes"
+
+
+def configureAdmission(app):
+    """Register per-route-class admission control on an app.
+    (arg) app-Flask: The application.
+    (return) dict[str, AdmissionGate]: Gates by route class; empty if disabled.
+    """
+    gates = {}
+    app.extensions["admissionGates"] = gates
+    if not app.config["ADMISSION_CONTROL"]:
+        return gates
+    for name, (limit, queueSize) in app.config["ADMISSION_LIMITS"].items():
+        gates[name] = AdmissionGate(name, limit, queueSize,
+                                    app.config["ADMISSION_QUEUE_TIMEOUT"])
+
+    @app.before_request
+    def admitRequest():
+        """Shed the request with 503 if its route class is saturated."""
+        if request.endpoint is None or request.endpoint in EXEMPT_ENDPOINTS:
+            return None
+        gate = gates.get(routeClass(request.endpoint, request.method))
+        if gate is None:
+            return None
+        if not gate.acquire():
+            response = jsonify({"error": "Server is overloaded, retry later"})
+            response.status_code = 503
+            response.headers["Retry-After"] = str(app.config["ADMISSION_RETRY_AFTER"])
+            return response
+        g.admissionGate = gate
+        return None
+
+    @app.teardown_request
+    def releaseRequest(error=None):
+        """Free the slot taken by admitRequest."""
+        gate = g.pop("admissionGate", None)
+        if gate is not None:
+            gate.release()
+
+    return gates
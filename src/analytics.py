@@ -0,0 +1,507 @@
+"""
+Columnar review analytics for the Flask club review application.
+Keeps an append-only, array-backed snapshot of every review's rating, club,
+user and creation time, updated from committed writes, and aggregates it
+with vectorized group-bys (NumPy when installed, pure Python otherwise).
+Writes committed by other processes are found by reading the change log from
+the cursor the store last caught up to.
+"""
+import math
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import timezone
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from .changes import CATCH_UP_LIMIT, changesSince, latestCursor
+from .models import Club, Review, User, clubTagAssociation
+from .recommendations import loadNumpy
+
+# Histogram width: index 0 holds deleted rows, 1-10 the ratings
+RATING_SLOTS = 11
+
+
+def toEpoch(moment):
+    """Return a naive UTC datetime as epoch seconds.
+    (arg) moment-datetime: The time to convert; None maps to 0.
+    (return) float: Seconds since the epoch.
+    """
+    if moment is None:
+        return 0.0
+    return moment.replace(tzinfo=timezone.utc).timestamp()
+
+
+class ReviewColumns:
+    """Review ratings stored column-wise in typed arrays.
+    Rows are appended in id order; deleted reviews keep their row with rating 0
+    until enough of them accumulate to rebuild.
+    """
+
+    def __init__(self):
+        """Create an empty, unbuilt store."""
+        self._lock = threading.RLock()
+        self._buildLock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Drop all rows so the next query rebuilds from the database.
+        (return) None
+        """
+        with self._lock:
+            self.built = False
+            self.building = False
+            self.cursor = 0
+            self.ids = array("q")
+            self.ratings = array("b")
+            self.clubs = array("i")
+            self.users = array("i")
+            self.createdAt = array("d")
+            self.clubCodes = []
+            self.clubOrdinals = {}
+            self.deleted = 0
+            self._pending = []
+
+    def __len__(self):
+        """Return the number of live reviews."""
+        with self._lock:
+            return len(self.ids) - self.deleted
+
+    def _clubOrdinal(self, clubCode):
+        """Return the ordinal of a club, assigning the next one if new.
+        (return) int: Index into clubCodes.
+        """
+        ordinal = self.clubOrdinals.get(clubCode)
+        if ordinal is None:
+            ordinal = self.clubOrdinals[clubCode] = len(self.clubCodes)
+            self.clubCodes.append(clubCode)
+        return ordinal
+
+    def _row(self, reviewId):
+        """Return the row holding a review id, or None.
+        (return) int: Row index.
+        """
+        row = bisect_left(self.ids, reviewId)
+        return row if row < len(self.ids) and self.ids[row] == reviewId else None
+
+    def _upsert(self, reviewId, clubCode, userId, rating, createdAt):
+        """Store one review, replacing every column of its row if already present.
+        SQLite can hand a deleted review's id to a new review, of another club and user.
+        (return) None
+        """
+        row = self._row(reviewId)
+        values = (reviewId, rating, self._clubOrdinal(clubCode), userId, createdAt)
+        columns = (self.ids, self.ratings, self.clubs, self.users, self.createdAt)
+        if row is not None:
+            if self.ratings[row] == 0:
+                self.deleted -= 1
+            for column, value in zip(columns, values):
+                column[row] = value
+            return
+        if not self.ids or reviewId > self.ids[-1]:
+            for column, value in zip(columns, values):
+                column.append(value)
+        else:
+            # Commits can publish slightly out of id order
+            row = bisect_left(self.ids, reviewId)
+            for column, value in zip(columns, values):
+                column.insert(row, value)
+
+    def _setRating(self, reviewId, rating):
+        """Change a stored review's rating; rating 0 marks it deleted.
+        (return) None
+        """
+        row = self._row(reviewId)
+        if row is None or self.ratings[row] == rating:
+            return
+        if rating == 0:
+            self.deleted += 1
+        elif self.ratings[row] == 0:
+            self.deleted -= 1
+        self.ratings[row] = rating
+
+    def _deleteWhere(self, column, value):
+        """Mark every review whose column equals value as deleted.
+        (arg) column-array: self.clubs or self.users.
+        (arg) value-int: Club ordinal or user id.
+        (return) None
+        """
+        np = loadNumpy()
+        if np is not None:
+            ratings = np.frombuffer(self.ratings, dtype=np.int8)
+            hits = np.flatnonzero((np.frombuffer(column, dtype=np.int32) == value) & (ratings > 0))
+            del ratings
+            rows = hits.tolist()
+        else:
+            rows = [row for row, current in enumerate(column)
+                    if current == value and self.ratings[row] > 0]
+        for row in rows:
+            self.ratings[row] = 0
+        self.deleted += len(rows)
+
+    def apply(self, changes):
+        """Apply committed review changes, or buffer them during a build.
+        (arg) changes-list[tuple]: ("upsert", id, club, user, rating, epoch),
+        ("rating", id, rating), ("delete", id), ("club", code) or ("user", id).
+        (return) None
+        """
+        with self._lock:
+            if self.building:
+                self._pending.extend(changes)
+                return
+            if not self.built:
+                return
+            for change in changes:
+                kind = change[0]
+                if kind == "upsert":
+                    self._upsert(*change[1:])
+                elif kind == "rating":
+                    self._setRating(*change[1:])
+                elif kind == "delete":
+                    self._setRating(change[1], 0)
+                elif kind == "club" and change[1] in self.clubOrdinals:
+                    self._deleteWhere(self.clubs, self.clubOrdinals[change[1]])
+                elif kind == "user":
+                    self._deleteWhere(self.users, change[1])
+
+    def build(self, session):
+        """Load every review from the database in id order.
+        (arg) session-Session: Session used to read the reviews.
+        (return) None
+        """
+        with self._lock:
+            self.reset()
+            self.building = True
+        try:
+            # Read first: changes logged after it are caught up on, possibly twice
+            cursor = latestCursor(session)
+            rows = session.execute(
+                select(Review.id, Review.club_code, Review.user_id, Review.rating,
+                       Review.created_at).order_by(Review.id)).all()
+            with self._lock:
+                for reviewId, clubCode, userId, rating, createdAt in rows:
+                    self.ids.append(reviewId)
+                    self.ratings.append(rating)
+                    self.clubs.append(self._clubOrdinal(clubCode))
+                    self.users.append(userId)
+                    self.createdAt.append(toEpoch(createdAt))
+                # Changes committed while reading are replayed on top
+                pending, self._pending = self._pending, []
+                self.cursor = cursor
+                self.building = False
+                self.built = True
+                self.apply(pending)
+        finally:
+            with self._lock:
+                self.building = False
+
+    def ensureFresh(self, session):
+        """Build the store if needed, catch up on the change log, or rebuild once most rows are deleted.
+        (arg) session-Session: Session used to read the reviews.
+        (return) None
+        """
+        with self._buildLock:
+            with self._lock:
+                current = self.built and self.deleted * 2 <= len(self.ids)
+            if not current or not self.catchUp(session):
+                self.build(session)
+
+    def catchUp(self, session):
+        """Apply review changes other processes logged since the cursor.
+        Created and updated reviews are re-read, so the rows applied are
+        current whatever order the log holds them in; changes this process
+        already applied are applied again harmlessly.
+        (arg) session-Session: Session used to read the log and reviews.
+        (return) bool: False if too far behind to catch up.
+        """
+        rows = changesSince(session, self.cursor, CATCH_UP_LIMIT)
+        if len(rows) > CATCH_UP_LIMIT:
+            return False
+        changes, reviewIds = [], set()
+        for _, entity, key, action in rows:
+            if entity == "review":
+                reviewIds.add(int(key))
+            elif entity == "club" and action == "deleted":
+                changes.append(("club", key))
+            elif entity == "user" and action == "deleted":
+                changes.append(("user", int(key)))
+        if reviewIds:
+            found = session.execute(
+                select(Review.id, Review.club_code, Review.user_id, Review.rating,
+                       Review.created_at).where(Review.id.in_(reviewIds))).all()
+            changes += [("upsert", reviewId, clubCode, userId, rating, toEpoch(createdAt))
+                        for reviewId, clubCode, userId, rating, createdAt in found]
+            changes += [("delete", reviewId) for reviewId in reviewIds - {row[0] for row in found}]
+        with self._lock:
+            self.apply(changes)
+            if rows:
+                self.cursor = max(self.cursor, rows[-1][0])
+        return True
+
+    def clubHistograms(self, start=None, end=None):
+        """Count ratings per club, optionally within a creation time window.
+        (arg) start-float: Earliest epoch second to include, or None.
+        (arg) end-float: Epoch second to stop before, or None.
+        (return) tuple: (club codes, per-club rating counts as an ordinal x 11
+        array, or a list of lists without NumPy).
+        """
+        np = loadNumpy()
+        with self._lock:
+            codes = list(self.clubCodes)
+            if np is not None:
+                ratings = np.frombuffer(self.ratings, dtype=np.int8).astype(np.int64)
+                clubs = np.frombuffer(self.clubs, dtype=np.int32)
+                keys = clubs * RATING_SLOTS + ratings
+                if start is not None or end is not None:
+                    times = np.frombuffer(self.createdAt, dtype=np.float64)
+                    mask = np.ones(len(times), dtype=bool)
+                    if start is not None:
+                        mask &= times >= start
+                    if end is not None:
+                        mask &= times < end
+                    keys = keys[mask]
+                    del times
+                del clubs
+                counts = np.bincount(keys, minlength=len(codes) * RATING_SLOTS)
+                histograms = counts.reshape(len(codes), RATING_SLOTS)
+            else:
+                histograms = [[0] * RATING_SLOTS for _ in codes]
+                for club, rating, createdAt in zip(self.clubs, self.ratings, self.createdAt):
+                    if (start is None or createdAt >= start) and (end is None or createdAt < end):
+                        histograms[club][rating] += 1
+        if np is not None:
+            histograms[:, 0] = 0
+        else:
+            for histogram in histograms:
+                histogram[0] = 0
+        return codes, histograms
+
+
+def sumHistograms(histograms, ordinals):
+    """Add up the rating histograms of a group of clubs.
+    (arg) histograms-array|list: Per-club histograms from clubHistograms.
+    (arg) ordinals-list[int]: Clubs in the group.
+    (return) list[int]: Counts for ratings 0-10.
+    """
+    np = loadNumpy()
+    if np is not None and not isinstance(histograms, list):
+        return histograms[ordinals].sum(axis=0).tolist() if ordinals else [0] * RATING_SLOTS
+    total = [0] * RATING_SLOTS
+    for ordinal in ordinals:
+        for rating, count in enumerate(histograms[ordinal]):
+            total[rating] += count
+    return total
+
+
+def summarizeHistogram(histogram, percentiles=(25, 50, 75, 90)):
+    """Return the count, mean, distribution and percentiles of a rating histogram.
+    Percentiles use the nearest-rank method, exact for integer ratings.
+    (arg) histogram-list[int]: Counts for ratings 0-10; index 0 is ignored.
+    (return) dict: JSON-serializable summary.
+    """
+    count = sum(histogram[1:])
+    summary = {
+        "count": count,
+        "average_rating": round(sum(r * n for r, n in enumerate(histogram)) / count, 2)
+        if count else 0.0,
+        "rating_distribution": {str(r): histogram[r] for r in range(1, RATING_SLOTS)}
+    }
+    for percentile in percentiles:
+        rank = math.ceil(percentile / 100 * count)
+        seen, value = 0, None
+        for rating in range(1, RATING_SLOTS):
+            seen += histogram[rating]
+            if count and seen >= max(rank, 1):
+                value = rating
+                break
+        summary[f"p{percentile}"] = value
+    return summary
+
+
+def pearson(n, sumX, sumY, sumXY, sumXX, sumYY):
+    """Return Pearson's correlation coefficient from running sums.
+    (return) float: r in [-1, 1], or None when either variable is constant.
+    """
+    if n < 2:
+        return None
+    covariance = n * sumXY - sumX * sumY
+    spread = (n * sumXX - sumX ** 2) * (n * sumYY - sumY ** 2)
+    if spread <= 0:
+        return None
+    return round(covariance / math.sqrt(spread), 4)
+
+
+def clubDimensions(session):
+    """Read the club attributes analytics group by.
+    (arg) session-Session: Session used to read the clubs.
+    (return) tuple: ({code: (memberCount, undergraduatesAllowed, graduatesAllowed)},
+    {tag name: [club codes]}).
+    """
+    clubs = {code: (memberCount or 0, bool(undergraduates), bool(graduates))
+             for code, memberCount, undergraduates, graduates in session.execute(
+                 select(Club.code, Club.memberCount, Club.undergraduatesAllowed,
+                        Club.graduatesAllowed))}
+    tags = {}
+    for clubCode, tagName in session.execute(
+            select(clubTagAssociation.c.club_code, clubTagAssociation.c.tag_name)):
+        tags.setdefault(tagName, []).append(clubCode)
+    return clubs, tags
+
+
+def eligibilityClass(undergraduates, graduates):
+    """Return the eligibility class of a club.
+    (return) str: "undergraduate", "graduate" or "both".
+    """
+    if undergraduates and graduates:
+        return "both"
+    return "undergraduate" if undergraduates else "graduate"
+
+
+def tagRatingSummaries(session, start=None, end=None):
+    """Return rating percentiles and distributions for the reviews of each tag's clubs.
+    (arg) session-Session: Session used to read reviews and clubs.
+    (arg) start-float, end-float: Optional epoch window on review creation.
+    (return) dict[str, dict]: Summary per tag name.
+    """
+    reviewColumns.ensureFresh(session)
+    codes, histograms = reviewColumns.clubHistograms(start, end)
+    ordinals = {code: i for i, code in enumerate(codes)}
+    _, tags = clubDimensions(session)
+    return {tagName: summarizeHistogram(sumHistograms(
+                histograms, [ordinals[code] for code in clubCodes if code in ordinals]))
+            for tagName, clubCodes in sorted(tags.items())}
+
+
+def eligibilitySummaries(session, start=None, end=None):
+    """Return rating distributions grouped by which students a club accepts.
+    (arg) session-Session: Session used to read reviews and clubs.
+    (arg) start-float, end-float: Optional epoch window on review creation.
+    (return) dict[str, dict]: Summary per eligibility class.
+    """
+    reviewColumns.ensureFresh(session)
+    codes, histograms = reviewColumns.clubHistograms(start, end)
+    clubs, _ = clubDimensions(session)
+    groups = {"undergraduate": [], "graduate": [], "both": []}
+    for ordinal, code in enumerate(codes):
+        if code in clubs:
+            groups[eligibilityClass(*clubs[code][1:])].append(ordinal)
+    return {name: summarizeHistogram(sumHistograms(histograms, members))
+            for name, members in groups.items()}
+
+
+def memberCountCorrelation(session, start=None, end=None):
+    """Correlate club member counts with review ratings.
+    (arg) session-Session: Session used to read reviews and clubs.
+    (arg) start-float, end-float: Optional epoch window on review creation.
+    (return) dict: Pearson r over individual reviews and over club averages.
+    """
+    reviewColumns.ensureFresh(session)
+    codes, histograms = reviewColumns.clubHistograms(start, end)
+    clubs, _ = clubDimensions(session)
+    np = loadNumpy()
+    if np is not None and not isinstance(histograms, list):
+        members = np.array([clubs.get(code, (0,))[0] for code in codes], dtype=np.float64)
+        known = np.array([code in clubs for code in codes], dtype=bool)
+        weights = np.arange(RATING_SLOTS, dtype=np.float64)
+        counts = histograms.sum(axis=1).astype(np.float64) * known
+        ratingSums = histograms @ weights * known
+        squareSums = histograms @ (weights ** 2) * known
+        reviewed = counts > 0
+        means = ratingSums[reviewed] / counts[reviewed]
+        x = members[reviewed]
+        reviewLevel = pearson(counts.sum(), (members * counts).sum(), ratingSums.sum(),
+                              (members * ratingSums).sum(), (members ** 2 * counts).sum(),
+                              squareSums.sum())
+        clubLevel = pearson(len(x), x.sum(), means.sum(), (x * means).sum(),
+                            (x ** 2).sum(), (means ** 2).sum())
+        clubCount, reviewCount = int(reviewed.sum()), int(counts.sum())
+    else:
+        totals = [0.0] * 6
+        points = []
+        for code, histogram in zip(codes, histograms):
+            count = sum(histogram)
+            if code not in clubs or not count:
+                continue
+            memberCount = clubs[code][0]
+            ratingSum = sum(r * n for r, n in enumerate(histogram))
+            squareSum = sum(r * r * n for r, n in enumerate(histogram))
+            for i, value in enumerate((count, memberCount * count, ratingSum,
+                                       memberCount * ratingSum, memberCount ** 2 * count,
+                                       squareSum)):
+                totals[i] += value
+            points.append((memberCount, ratingSum / count))
+        reviewLevel = pearson(*totals)
+        clubLevel = pearson(len(points), sum(x for x, _ in points), sum(y for _, y in points),
+                            sum(x * y for x, y in points), sum(x * x for x, _ in points),
+                            sum(y * y for _, y in points))
+        clubCount, reviewCount = len(points), int(totals[0])
+    return {
+        "review_level": reviewLevel,
+        "club_level": clubLevel,
+        "reviews": reviewCount,
+        "clubs": clubCount
+    }
+
+
+# Process-wide store shared by all requests
+reviewColumns = ReviewColumns()
+
+
+def _reviewChanges(session):
+    """Return the list of uncommitted review changes in a session.
+    (return) list[tuple]: Changes in the format accepted by ReviewColumns.apply.
+    """
+    return session.info.setdefault("reviewChanges", [])
+
+
+def recordReviewChanges(session, changes):
+    """Queue review changes made outside the ORM for the store on commit.
+    (arg) session-Session: The session whose commit publishes them.
+    (arg) changes-iterable[tuple]: Changes in the format accepted by ReviewColumns.apply.
+    (return) None
+    """
+    _reviewChanges(session).extend(changes)
+
+
+@event.listens_for(Session, "after_flush")
+def _trackReviewChanges(session, flushContext):
+    """Record flushed review inserts, rating edits and deletes."""
+    for obj in session.new:
+        if isinstance(obj, Review):
+            _reviewChanges(session).append(
+                ("upsert", obj.id, obj.club_code, obj.user_id, obj.rating, toEpoch(obj.created_at)))
+    for obj in session.dirty:
+        if isinstance(obj, Review):
+            added = inspect(obj).attrs.rating.history.added
+            if added:
+                _reviewChanges(session).append(("rating", obj.id, added[0]))
+    for obj in session.deleted:
+        if isinstance(obj, Review):
+            _reviewChanges(session).append(("delete", obj.id))
+        elif isinstance(obj, Club):
+            _reviewChanges(session).append(("club", obj.code))
+        elif isinstance(obj, User):
+            _reviewChanges(session).append(("user", obj.id))
+
+
+@event.listens_for(Session, "after_commit")
+def _publishReviewChanges(session):
+    """Hand committed review changes to the columnar store."""
+    changes = session.info.pop("reviewChanges", None)
+    if changes:
+        reviewColumns.apply(changes)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discardReviewChanges(session, previousTransaction):
+    """Forget review changes once the outer transaction is rolled back."""
+    if previousTransaction.parent is None:
+        session.info.pop("reviewChanges", None)
+
+
+@event.listens_for(Review.__table__, "after_create")
+@event.listens_for(Review.__table__, "after_drop")
+def _resetColumns(target, connection, **kwargs):
+    """Rebuild from scratch whenever the review table is recreated."""
+    reviewColumns.reset()
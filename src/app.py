@@ -1,11 +1,30 @@
-from flask import request, jsonify
+from datetime import date, datetime, time, timedelta
+from time import monotonic
+from flask import Blueprint, current_app, request, jsonify
+from sqlalchemy.orm import selectinload
 from .database import create_app, db, DB_FILE
+from .changes import changeNotifier, readChanges
+from .analytics import eligibilitySummaries, memberCountCorrelation, tagRatingSummaries, toEpoch
+from .jobs import getJobRunner
+from .lookups import lookup
+from .purge import deleteUserReviews, getPurger
+from .recommendations import coFavoriteIndex
+from .search import searchReviews as findReviews
 from .models import *
-from .validation import ValidationError, validate_json_input, validate_club_code, validate_tags, sanitize_html, validate_string
+from .validation import ValidationError, validate_json_input, validate_club_code, validate_tags, sanitize_html, validate_string, validate_integer
 
-# Create app and initialize database
-app = create_app()
-db.init_app(app)
+# Routes are registered on an app by create_app
+routes = Blueprint("api", __name__)
+
+def __getattr__(name):
+    """Create the default application the first time `app` is accessed.
+    (arg) name-str: The missing module attribute.
+    (return) Flask: The default application for name "app".
+    """
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def errorResponse(message, status=400):
     """Return a JSON error response.
@@ -13,16 +32,19 @@ def errorResponse(message, status=400):
     (arg) status-int: The HTTP status code.
     (return) tuple: (JSON response, status code).
     """
+    if status >= 500:
+        # Formatting, including the traceback, happens on the log writer thread
+        current_app.logger.error("Request failed: %s", message, exc_info=True, extra={
+            "method": request.method, "path": request.path, "status": status})
     return jsonify({"error": message}), status
 
 def getOr404(model, **kwargs):
-    """Return the first object matching kwargs or None.
+    """Return the first object matching kwargs or None, through the request's lookup cache.
     (arg) model-Class: The SQLAlchemy model to query.
     (arg) kwargs-dict: Filter criteria.
     (return) Model instance or None.
     """
-    obj = model.query.filter_by(**kwargs).first()
-    return None if not obj else obj
+    return lookup(model, **kwargs)
 
 def listToJson(objects):
     """Return a JSON response for a list of objects.
@@ -31,6 +53,73 @@ def listToJson(objects):
     """
     return jsonify([obj.toJson() for obj in objects])
 
+def purgeInBackground(kind, key, column):
+    """Queue a delete for the background purger if it has enough reviews to need one.
+    Forced with the `background=true` query parameter.
+    (arg) kind-str: "club" or "user".
+    (arg) key-str|int: The club code or user id.
+    (arg) column-Column: The review column referencing the parent.
+    (return) bool: True if the purger took the delete.
+    """
+    purger = getPurger()
+    if purger is None:
+        return False
+    if request.args.get("background", "").lower() != "true":
+        threshold = current_app.config["PURGE_THRESHOLD"]
+        reviewCount = db.session.query(Review.id).filter(column == key).limit(threshold).count()
+        if reviewCount < threshold:
+            return False
+    purger.submit(kind, key)
+    return True
+
+def multiGetKeys(name, convert):
+    """Return the keys of a comma-separated multi-get parameter, de-duplicated in request order.
+    (arg) name-str: The query parameter, e.g. "codes".
+    (arg) convert-callable: Validates one key and returns it in stored form.
+    (return) list: The keys; None if the parameter is absent.
+    """
+    raw = request.args.get(name)
+    if raw is None:
+        return None
+    keys = list(dict.fromkeys(convert(part.strip()) for part in raw.split(",") if part.strip()))
+    if not keys:
+        raise ValueError(f"{name} must list at least one key")
+    limit = current_app.config["MULTI_GET_LIMIT"]
+    if len(keys) > limit:
+        raise ValueError(f"{name} cannot list more than {limit} keys")
+    return keys
+
+def parseId(value):
+    """Return a multi-get id as an integer.
+    (arg) value-str: One comma-separated id.
+    (return) int: The id.
+    """
+    if not value.isdigit():
+        raise ValueError(f"Invalid id: {value}")
+    return int(value)
+
+def parseClubCode(value):
+    """Return a multi-get club code in the form clubs are stored under.
+    (arg) value-str: One comma-separated club code.
+    (return) str: The validated, lowercased code.
+    """
+    validate_club_code(value)
+    return value.lower()
+
+def multiGetResponse(name, keys, objects, keyOf):
+    """Return objects fetched by a multi-get in request order, with the keys not found.
+    (arg) name-str: Key of the object list in the response.
+    (arg) keys-list: Requested keys in request order.
+    (arg) objects-list: The objects found, in any order.
+    (arg) keyOf-callable: Returns an object's key.
+    (return) Response: JSON with the objects and "missing".
+    """
+    found = {keyOf(obj): obj for obj in objects}
+    return jsonify({
+        name: [found[key].toJson() for key in keys if key in found],
+        "missing": [key for key in keys if key not in found]
+    })
+
 def commitChanges():
     """Commit changes to the DB and handle exceptions.
     (return) None if successful, else a JSON error response.
@@ -42,30 +131,38 @@ def commitChanges():
         return errorResponse(str(e), 400)
     return None
 
-@app.route("/")
+@routes.route("/")
 def main():
     """Return the welcome message.
     (return) str: Welcome text.
     """
     return "Welcome to Penn Club Review!"
 
-@app.route("/api")
+@routes.route("/api")
 def api():
     """Return a simple API greeting.
     (return) Response: JSON greeting.
     """
     return jsonify("hi")
 
-@app.route("/api/clubs", methods=["GET"])
+@routes.route("/api/clubs", methods=["GET"])
 def getClubs():
-    """Return a list of all clubs as JSON.
-    (return) Response: JSON list of clubs.
+    """Return a list of all clubs as JSON, or only the clubs listed in ?codes=.
+    (return) Response: JSON list of clubs, or JSON with "clubs" and "missing" codes.
     """
+    try:
+        codes = multiGetKeys("codes", parseClubCode)
+    except (ValidationError, ValueError, TypeError) as e:
+        return errorResponse(str(e), 400)
+    if codes is not None:
+        clubs = Club.query.options(selectinload(Club.tags), selectinload(Club.reviews)) \
+            .filter(Club.code.in_(codes)).all()
+        return multiGetResponse("clubs", codes, clubs, lambda club: club.code)
     clubs = Club.query.all()
     clubsJson = [club.toJson() for club in clubs]
     return jsonify(clubsJson)
 
-@app.route("/api/clubs", methods=["POST"])
+@routes.route("/api/clubs", methods=["POST"])
 def createClub():
     """Create a new club with full validation.
     (return) Response: JSON error response if input is missing.
@@ -85,9 +182,6 @@ def createClub():
             graduatesAllowed=data["graduatesAllowed"]
         )
         Club.addClubToDb(club)
-        error = commitChanges()
-        if error:
-            return error
         return jsonify(club.toJson()), 201
         
     except (ValidationError, ValueError, TypeError) as e:
@@ -96,7 +190,7 @@ def createClub():
         db.session.rollback()
         return errorResponse(f"Server error: {str(e)}", 500)
 
-@app.route("/api/clubs/<clubCode>", methods=["PUT"])
+@routes.route("/api/clubs/<clubCode>", methods=["PUT"])
 def updateClub(clubCode):
     """Update a club with validation.
     (arg) clubCode-str: The club code.
@@ -126,8 +220,7 @@ def updateClub(clubCode):
             club.updateGraduatesAllowed(data["graduatesAllowed"])
         if "tags" in data:
             validate_tags(data["tags"])
-            club.tags.clear()
-            club.handleTags(set(data["tags"]))
+            club.setTags(set(data["tags"]))
         
         error = commitChanges()
         if error:
@@ -140,7 +233,7 @@ def updateClub(clubCode):
         db.session.rollback()
         return errorResponse(f"Server error: {str(e)}", 500)
 
-@app.route("/api/clubs/<clubCode>", methods=["DELETE"])
+@routes.route("/api/clubs/<clubCode>", methods=["DELETE"])
 def deleteClub(clubCode):
     """Delete a club by its code.
     (arg) clubCode-str: The club code.
@@ -151,6 +244,8 @@ def deleteClub(clubCode):
         club = getOr404(Club, code=clubCode)
         if not club:
             return errorResponse("Club not found", 404)
+        if purgeInBackground("club", clubCode, Review.club_code):
+            return jsonify({"message": f"Club {clubCode} scheduled for deletion"}), 202
         db.session.delete(club)
         error = commitChanges()
         if error:
@@ -162,7 +257,7 @@ def deleteClub(clubCode):
         db.session.rollback()
         return errorResponse(f"Server error: {str(e)}", 500)
 
-@app.route("/api/clubs/search", methods=["GET"])
+@routes.route("/api/clubs/search", methods=["GET"])
 def searchClubs():
     """Search clubs with query validation.
     (return) Response: JSON list of clubs matching the query.
@@ -186,16 +281,25 @@ def searchClubs():
     except Exception as e:
         return errorResponse(f"Search error: {str(e)}", 500)
 
-@app.route("/api/users", methods=["GET"])
+@routes.route("/api/users", methods=["GET"])
 def getUsers():
-    """Return a list of all users as JSON.
-    (return) Response: JSON list of users.
+    """Return a list of all users as JSON, or only the users listed in ?ids=.
+    (return) Response: JSON list of users, or JSON with "users" and "missing" ids.
     """
+    try:
+        ids = multiGetKeys("ids", parseId)
+    except (ValidationError, ValueError, TypeError) as e:
+        return errorResponse(str(e), 400)
+    if ids is not None:
+        users = User.query.options(selectinload(User.favoriteClubs),
+                                   selectinload(User.reviews_made)) \
+            .filter(User.id.in_(ids)).all()
+        return multiGetResponse("users", ids, users, lambda user: user.id)
     users = User.query.all()
     usersJson = [user.toJson() for user in users]
     return jsonify(usersJson)
 
-@app.route("/api/users", methods=["POST"])
+@routes.route("/api/users", methods=["POST"])
 def createUserRoute():
     """Create a user with validation.
     (return) Response: JSON representation of the new user.
@@ -210,9 +314,6 @@ def createUserRoute():
             favorites=set(data.get("favorites", []))
         )
         User.addUserToDb(user)
-        error = commitChanges()
-        if error:
-            return error
         return jsonify(user.toJson()), 201
         
     except (ValidationError, ValueError, TypeError) as e:
@@ -221,7 +322,7 @@ def createUserRoute():
         db.session.rollback()
         return errorResponse(f"Server error: {str(e)}", 500)
 
-@app.route("/api/users/<int:user_id>", methods=["GET"])
+@routes.route("/api/users/<int:user_id>", methods=["GET"])
 def getUser(user_id):
     """Get a user by their ID.
     (arg) user_id-int: The user's ID.
@@ -232,7 +333,7 @@ def getUser(user_id):
         return errorResponse("User not found", 404)
     return jsonify(user.toJson())
 
-@app.route("/api/users/<int:user_id>", methods=["PUT"])
+@routes.route("/api/users/<int:user_id>", methods=["PUT"])
 def updateUser(user_id):
     """Update an existing user.
     (arg) user_id-int: The user's ID.
@@ -251,8 +352,7 @@ def updateUser(user_id):
         if "username" in data:
             user.updateUsername(data["username"])
         if "favorites" in data:
-            user.favoriteClubs = []
-            user.handleFavorite(set(data["favorites"]))
+            user.setFavorites(set(data["favorites"]))
         
         error = commitChanges()
         if error:
@@ -265,7 +365,7 @@ def updateUser(user_id):
         db.session.rollback()
         return errorResponse(f"Server error: {str(e)}", 500)
 
-@app.route("/api/users/<int:user_id>", methods=["DELETE"])
+@routes.route("/api/users/<int:user_id>", methods=["DELETE"])
 def deleteUser(user_id):
     """Delete a user by their ID.
     (arg) user_id-int: The user's ID.
@@ -275,6 +375,9 @@ def deleteUser(user_id):
         user = getOr404(User, id=user_id)
         if not user:
             return errorResponse("User not found", 404)
+        if purgeInBackground("user", user_id, Review.user_id):
+            return jsonify({"message": f"User {user.username} scheduled for deletion"}), 202
+        deleteUserReviews(db.session, user)
         db.session.delete(user)
         error = commitChanges()
         if error:
@@ -284,51 +387,166 @@ def deleteUser(user_id):
         db.session.rollback()
         return errorResponse(f"Server error: {str(e)}", 500)
 
-@app.route("/api/tags/<tagName>", methods=["GET"])
+@routes.route("/api/tags", methods=["GET"])
+def getTags():
+    """Return tags with their club counts, most used first, with pagination.
+    (return) Response: JSON with tags, total count, pages and current page.
+    """
+    try:
+        page = request.args.get("page", 1, type=int)
+        per_page = request.args.get("per_page", 50, type=int)
+        sort = request.args.get("sort", "count")
+        if page < 1 or not 1 <= per_page <= 100:
+            return errorResponse("page must be at least 1 and per_page between 1 and 100", 400)
+        if sort not in ("count", "name"):
+            return errorResponse("sort must be 'count' or 'name'", 400)
+
+        query = Tag.query.order_by(Tag.name) if sort == "name" \
+            else Tag.query.order_by(Tag.clubCount.desc(), Tag.name)
+        tags = query.paginate(page=page, per_page=per_page, error_out=False)
+        return jsonify({
+            "tags": [tag.toJson() for tag in tags.items],
+            "total": tags.total,
+            "pages": tags.pages,
+            "current_page": page
+        })
+    except Exception as e:
+        return errorResponse(f"Error fetching tags: {str(e)}", 500)
+
+@routes.route("/api/tags/<tagName>", methods=["GET"])
 def getTagClubs(tagName):
-    """Return clubs associated with a tag.
+    """Return a page of the clubs associated with a tag.
     (arg) tagName-str: The tag name.
-    (return) Response: JSON with tag and list of clubs.
+    (return) Response: JSON with tag, club count and a page of compact clubs.
     """
     try:
         validate_string(tagName, "Tag name", min_length=2, max_length=50)
-        tag = Tag.query.filter_by(name=tagName).first()
+        page = request.args.get("page", 1, type=int)
+        per_page = request.args.get("per_page", 50, type=int)
+        if page < 1 or not 1 <= per_page <= 100:
+            return errorResponse("page must be at least 1 and per_page between 1 and 100", 400)
+        tag = lookup(Tag, name=tagName)
         if not tag:
             return errorResponse("Tag not found", 404)
-        clubList = [club.toJson() for club in tag.clubs]
-        return jsonify({"tag": tagName, "clubs": clubList})
+
+        clubs = db.session.query(Club.code, Club.name, Club.memberCount) \
+            .join(clubTagAssociation, clubTagAssociation.c.club_code == Club.code) \
+            .filter(clubTagAssociation.c.tag_name == tagName) \
+            .order_by(Club.code) \
+            .paginate(page=page, per_page=per_page, error_out=False, count=False)
+        return jsonify({
+            "tag": tagName,
+            "club_count": tag.clubCount,
+            "clubs": [{"code": code, "name": name, "memberCount": memberCount}
+                      for code, name, memberCount in clubs.items],
+            "pages": -(-tag.clubCount // per_page),
+            "current_page": page
+        })
     except (ValidationError, ValueError, TypeError) as e:
         return errorResponse(str(e), 400)
 
-@app.route("/api/clubs/<clubCode>/favoritedBy", methods=["GET"])
+@routes.route("/api/clubs/<clubCode>/favoritedBy", methods=["GET"])
 def getClubFavoritedBy(clubCode):
-    """Return users who have favorited a club.
+    """Return a page of the users who have favorited a club, or only their count.
+    (arg) clubCode-str: The club code.
+    (return) Response: JSON with club, favorites count and a page of usernames.
+    """
+    try:
+        validate_club_code(clubCode)
+        page = request.args.get("page", 1, type=int)
+        per_page = request.args.get("per_page", 50, type=int)
+        if page < 1 or not 1 <= per_page <= 100:
+            return errorResponse("page must be at least 1 and per_page between 1 and 100", 400)
+        club = getOr404(Club, code=clubCode)
+        if not club:
+            return errorResponse("Club not found", 404)
+        if request.args.get("count_only", "").lower() == "true":
+            return jsonify({"club": clubCode, "favorites_count": club.favorites_count})
+
+        users = db.session.query(User.username) \
+            .join(userClubAssociation, userClubAssociation.c.user_id == User.id) \
+            .filter(userClubAssociation.c.club_code == clubCode) \
+            .order_by(userClubAssociation.c.user_id) \
+            .paginate(page=page, per_page=per_page, error_out=False, count=False)
+        return jsonify({
+            "club": clubCode,
+            "favorites_count": club.favorites_count,
+            "favorited_by": [username for (username,) in users.items],
+            "pages": -(-club.favorites_count // per_page),
+            "current_page": page
+        })
+    except (ValidationError, ValueError, TypeError) as e:
+        return errorResponse(str(e), 400)
+
+def clubSummaries(scoredCodes, scoreName):
+    """Return compact club entries for ranked (club code, score) pairs.
+    (arg) scoredCodes-list[tuple]: (club code, score) pairs, best first.
+    (arg) scoreName-str: The key to store each score under.
+    (return) list[dict]: Entries with "code", "name" and the score.
+    """
+    codes = [code for code, _ in scoredCodes]
+    names = dict(db.session.query(Club.code, Club.name).filter(Club.code.in_(codes)).all())
+    return [{"code": code, "name": names[code], scoreName: round(score, 4)}
+            for code, score in scoredCodes if code in names]
+
+@routes.route("/api/clubs/<clubCode>/related", methods=["GET"])
+def getRelatedClubs(clubCode):
+    """Return clubs most often favorited by the same users as this club.
     (arg) clubCode-str: The club code.
-    (return) Response: JSON with club and list of usernames.
+    (return) Response: JSON with club and list of related clubs.
     """
     try:
         validate_club_code(clubCode)
+        limit = request.args.get("limit", 10, type=int)
+        validate_integer(limit, "limit", min_val=1, max_val=50)
         club = getOr404(Club, code=clubCode)
         if not club:
             return errorResponse("Club not found", 404)
-        users = [user.username for user in club.usersFavorited]
-        return jsonify({"club": clubCode, "favorited_by": users})
+        coFavoriteIndex.ensureFresh(db.session)
+        related = coFavoriteIndex.related(club.code, limit)
+        return jsonify({"club": clubCode, "related": clubSummaries(related, "similarity")})
+    except (ValidationError, ValueError, TypeError) as e:
+        return errorResponse(str(e), 400)
+
+@routes.route("/api/users/<int:user_id>/recommendations", methods=["GET"])
+def getUserRecommendations(user_id):
+    """Return clubs similar to the ones a user has favorited.
+    (arg) user_id-int: The user's ID.
+    (return) Response: JSON with user ID and list of recommended clubs.
+    """
+    try:
+        limit = request.args.get("limit", 10, type=int)
+        validate_integer(limit, "limit", min_val=1, max_val=50)
+        user = getOr404(User, id=user_id)
+        if not user:
+            return errorResponse("User not found", 404)
+        coFavoriteIndex.ensureFresh(db.session)
+        recommended = coFavoriteIndex.recommend(user.id, limit)
+        return jsonify({"user_id": user_id,
+                        "recommendations": clubSummaries(recommended, "score")})
     except (ValidationError, ValueError, TypeError) as e:
         return errorResponse(str(e), 400)
 
 # ===== REVIEW ENDPOINTS =====
 
-@app.route("/api/reviews", methods=["GET"])
+@routes.route("/api/reviews", methods=["GET"])
 def getReviews():
-    """Return all reviews with pagination."""
+    """Return all reviews with pagination, or only the reviews listed in ?ids=."""
     try:
+        ids = multiGetKeys("ids", parseId)
+        if ids is not None:
+            # selectinload rather than a join, as reviews may live in shard files
+            reviews = Review.query.options(selectinload(Review.user), selectinload(Review.club)) \
+                .filter(Review.id.in_(ids)).all()
+            return multiGetResponse("reviews", ids, reviews, lambda review: review.id)
+
         page = request.args.get("page", 1, type=int)
         per_page = request.args.get("per_page", 10, type=int)
         
         if per_page > 100:
             return errorResponse("per_page cannot exceed 100", 400)
         
-        reviews = Review.query.paginate(
+        reviews = Review.query.order_by(Review.id).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
@@ -338,10 +556,46 @@ def getReviews():
             "pages": reviews.pages,
             "current_page": page
         })
+    except (ValidationError, ValueError, TypeError) as e:
+        return errorResponse(str(e), 400)
     except Exception as e:
         return errorResponse(f"Error fetching reviews: {str(e)}", 500)
 
-@app.route("/api/reviews", methods=["POST"])
+@routes.route("/api/reviews/search", methods=["GET"])
+def searchReviews():
+    """Search review titles and text, best matches first.
+    Takes q, optional club_code and min_rating, and page/per_page (1-100).
+    (return) Response: JSON with "results" (reviews with "title_highlight",
+    "snippet" and "score"), "page", "per_page", "has_more" and "truncated"
+    (older matches were left unranked by SEARCH_CANDIDATES).
+    """
+    try:
+        query = request.args.get("q", "")
+        if not query.strip():
+            return errorResponse("q is required and cannot be empty", 400)
+        if len(query) > 200:
+            return errorResponse("q cannot exceed 200 characters", 400)
+        clubCode = request.args.get("club_code")
+        if clubCode is not None:
+            clubCode = parseClubCode(clubCode)
+        minRating = request.args.get("min_rating", type=int)
+        if minRating is not None:
+            validate_integer(minRating, "min_rating", min_val=1, max_val=10)
+        page = request.args.get("page", 1, type=int)
+        perPage = request.args.get("per_page", 10, type=int)
+        if page < 1 or not 1 <= perPage <= 100:
+            return errorResponse("page must be at least 1 and per_page between 1 and 100", 400)
+
+        results, hasMore, truncated = findReviews(db.session, query, clubCode, minRating, page,
+                                                  perPage, current_app.config["SEARCH_CANDIDATES"])
+        return jsonify({"results": results, "page": page, "per_page": perPage,
+                        "has_more": hasMore, "truncated": truncated})
+    except (ValidationError, ValueError, TypeError) as e:
+        return errorResponse(str(e), 400)
+    except Exception as e:
+        return errorResponse(f"Search error: {str(e)}", 500)
+
+@routes.route("/api/reviews", methods=["POST"])
 def createReview():
     """Create a new review."""
     try:
@@ -365,7 +619,7 @@ def createReview():
         db.session.rollback()
         return errorResponse(f"Server error: {str(e)}", 500)
 
-@app.route("/api/reviews/<int:review_id>", methods=["GET"])
+@routes.route("/api/reviews/<int:review_id>", methods=["GET"])
 def getReview(review_id):
     """Get specific review by ID."""
     review = getOr404(Review, id=review_id)
@@ -373,7 +627,7 @@ def getReview(review_id):
         return errorResponse("Review not found", 404)
     return jsonify(review.toJson())
 
-@app.route("/api/reviews/<int:review_id>", methods=["PUT"])
+@routes.route("/api/reviews/<int:review_id>", methods=["PUT"])
 def updateReview(review_id):
     """Update existing review."""
     try:
@@ -403,7 +657,7 @@ def updateReview(review_id):
         db.session.rollback()
         return errorResponse(f"Server error: {str(e)}", 500)
 
-@app.route("/api/reviews/<int:review_id>", methods=["DELETE"])
+@routes.route("/api/reviews/<int:review_id>", methods=["DELETE"])
 def deleteReview(review_id):
     """Delete review."""
     try:
@@ -421,7 +675,7 @@ def deleteReview(review_id):
         db.session.rollback()
         return errorResponse(f"Server error: {str(e)}", 500)
 
-@app.route("/api/clubs/<club_code>/reviews", methods=["GET"])
+@routes.route("/api/clubs/<club_code>/reviews", methods=["GET"])
 def getClubReviews(club_code):
     """Get all reviews for a specific club."""
     try:
@@ -460,7 +714,7 @@ def getClubReviews(club_code):
     except Exception as e:
         return errorResponse(f"Server error: {str(e)}", 500)
 
-@app.route("/api/clubs/<club_code>/reviews/stats", methods=["GET"])
+@routes.route("/api/clubs/<club_code>/reviews/stats", methods=["GET"])
 def getClubReviewStats(club_code):
     """Return review statistics for club."""
     try:
@@ -492,7 +746,170 @@ def getClubReviewStats(club_code):
     except Exception as e:
         return errorResponse(f"Server error: {str(e)}", 500)
 
-@app.route("/api/users/<int:user_id>/reviews", methods=["GET"])
+def parseDateArg(name):
+    """Return an ISO date query parameter as a date, or None if absent.
+    (arg) name-str: The query parameter name.
+    (bad input) value-non ISO date: Raises ValueError.
+    (return) date: The parsed date or None.
+    """
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO date (YYYY-MM-DD)")
+
+@routes.route("/api/clubs/<club_code>/reviews/trend", methods=["GET"])
+def getClubReviewTrend(club_code):
+    """Return review counts, averages and histograms per time bucket for club."""
+    try:
+        validate_club_code(club_code)
+        bucket = request.args.get("bucket", "day")
+        if bucket not in ROLLUP_BUCKETS:
+            return errorResponse(f"bucket must be one of: {', '.join(ROLLUP_BUCKETS)}", 400)
+        start = parseDateArg("from")
+        end = parseDateArg("to")
+        
+        club = getOr404(Club, code=club_code)
+        if not club:
+            return errorResponse("Club not found", 404)
+        
+        query = ReviewRollup.query.filter_by(club_code=club_code, bucket=bucket) \
+            .filter(ReviewRollup.review_count > 0)
+        if start:
+            query = query.filter(ReviewRollup.bucket_start >= bucketStart(bucket, start))
+        if end:
+            query = query.filter(ReviewRollup.bucket_start <= end)
+        rollups = query.order_by(ReviewRollup.bucket_start.asc()).all()
+        
+        return jsonify({
+            "club_code": club_code,
+            "bucket": bucket,
+            "buckets": [rollup.toJson() for rollup in rollups]
+        })
+        
+    except (ValidationError, ValueError, TypeError) as e:
+        return errorResponse(str(e), 400)
+    except Exception as e:
+        return errorResponse(f"Server error: {str(e)}", 500)
+
+def parseWindowArgs():
+    """Return the "from"/"to" query parameters as an epoch window.
+    (bad input) value-non ISO date: Raises ValueError.
+    (return) tuple: (start, end) epoch seconds; "to" is inclusive, None if absent.
+    """
+    start, end = parseDateArg("from"), parseDateArg("to")
+    return (toEpoch(datetime.combine(start, time())) if start else None,
+            toEpoch(datetime.combine(end + timedelta(days=1), time())) if end else None)
+
+@routes.route("/api/analytics/tags", methods=["GET"])
+def getTagAnalytics():
+    """Return rating percentiles and distributions per tag."""
+    try:
+        start, end = parseWindowArgs()
+        return jsonify({"tags": tagRatingSummaries(db.session, start, end)})
+    except (ValidationError, ValueError, TypeError) as e:
+        return errorResponse(str(e), 400)
+    except Exception as e:
+        return errorResponse(f"Server error: {str(e)}", 500)
+
+@routes.route("/api/analytics/eligibility", methods=["GET"])
+def getEligibilityAnalytics():
+    """Return rating distributions for undergraduate, graduate and mixed clubs."""
+    try:
+        start, end = parseWindowArgs()
+        return jsonify({"classes": eligibilitySummaries(db.session, start, end)})
+    except (ValidationError, ValueError, TypeError) as e:
+        return errorResponse(str(e), 400)
+    except Exception as e:
+        return errorResponse(f"Server error: {str(e)}", 500)
+
+@routes.route("/api/analytics/member-correlation", methods=["GET"])
+def getMemberCountCorrelation():
+    """Return the correlation between club member count and review rating."""
+    try:
+        start, end = parseWindowArgs()
+        return jsonify(memberCountCorrelation(db.session, start, end))
+    except (ValidationError, ValueError, TypeError) as e:
+        return errorResponse(str(e), 400)
+    except Exception as e:
+        return errorResponse(f"Server error: {str(e)}", 500)
+
+@routes.route("/api/changes", methods=["GET"])
+def getChanges():
+    """Return club, user and review changes after a cursor, optionally long-polling.
+    (return) Response: JSON with changes, the cursor to resume from and has_more.
+    """
+    try:
+        since = request.args.get("since", 0, type=int)
+        limit = request.args.get("limit", 100, type=int)
+        wait = request.args.get("wait", 0, type=float)
+        if since < 0:
+            return errorResponse("since must be a cursor from a previous response", 400)
+        if not 1 <= limit <= 1000:
+            return errorResponse("limit must be between 1 and 1000", 400)
+        if not 0 <= wait <= 30:
+            return errorResponse("wait must be between 0 and 30 seconds", 400)
+
+        deadline = monotonic() + wait
+        while True:
+            generation = changeNotifier.generation
+            events, hasMore = readChanges(db.session, since, limit)
+            remaining = deadline - monotonic()
+            if events or remaining <= 0:
+                break
+            # End the read transaction so the next poll sees new commits
+            db.session.rollback()
+            changeNotifier.wait(generation,
+                                min(remaining, current_app.config["CHANGES_POLL_SECONDS"]))
+
+        return jsonify({
+            "changes": [event.toJson() for event in events],
+            "cursor": events[-1].id if events else since,
+            "has_more": hasMore
+        })
+    except Exception as e:
+        return errorResponse(f"Error fetching changes: {str(e)}", 500)
+
+@routes.route("/api/jobs", methods=["POST"])
+def createJob():
+    """Queue a maintenance job such as a rollup rebuild, export or purge.
+    (return) Response: JSON job with 202, or 503 if too many jobs are queued.
+    """
+    try:
+        data = request.get_json()
+        validate_json_input(data, ["kind"])
+        job = getJobRunner().submit(db.session, data["kind"], data.get("params", {}))
+        if job is None:
+            response = jsonify({"error": "Too many jobs queued, retry later"})
+            response.status_code = 503
+            response.headers["Retry-After"] = str(current_app.config["ADMISSION_RETRY_AFTER"])
+            return response
+        response = jsonify(job.toJson())
+        response.headers["Location"] = f"/api/jobs/{job.id}"
+        return response, 202
+    except (ValidationError, ValueError, TypeError) as e:
+        return errorResponse(str(e), 400)
+    except Exception as e:
+        db.session.rollback()
+        return errorResponse(f"Server error: {str(e)}", 500)
+
+@routes.route("/api/jobs/<int:job_id>", methods=["GET"])
+def getJob(job_id):
+    """Get a job's status, progress and result.
+    (arg) job_id-int: The job's ID.
+    (return) Response: JSON job.
+    """
+    try:
+        job = getOr404(Job, id=job_id)
+        if not job:
+            return errorResponse("Job not found", 404)
+        return jsonify(job.toJson())
+    except Exception as e:
+        return errorResponse(f"Server error: {str(e)}", 500)
+
+@routes.route("/api/users/<int:user_id>/reviews", methods=["GET"])
 def getUserReviews(user_id):
     """Get all reviews written by a specific user."""
     try:
@@ -506,13 +923,13 @@ def getUserReviews(user_id):
     except Exception as e:
         return errorResponse(f"Server error: {str(e)}", 500)
 
-@app.route("/api/users/<int:user_id>/reviews/<club_code>", methods=["GET"])
+@routes.route("/api/users/<int:user_id>/reviews/<club_code>", methods=["GET"])
 def getUserClubReview(user_id, club_code):
     """Get user's review for specific club."""
     try:
         validate_club_code(club_code)
         
-        review = Review.query.filter_by(user_id=user_id, club_code=club_code).first()
+        review = lookup(Review, user_id=user_id, club_code=club_code)
         if not review:
             return errorResponse("Review not found", 404)
         
@@ -524,4 +941,4 @@ def getUserClubReview(user_id, club_code):
         return errorResponse(f"Server error: {str(e)}", 500)
 
 if __name__ == "__main__":
-    app.run()
+    create_app().run()
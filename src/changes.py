@@ -0,0 +1,109 @@
+"""
+Change feed for the Flask club review application.
+Every flush that creates, updates or deletes a club, user or review appends
+to the change_log table in the same transaction, and committed changes wake
+long-polling /api/changes requests in this process. In-process caches read
+the log from their own cursor to pick up writes made by other processes.
+"""
+import threading
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from .models import ChangeEvent
+
+
+class ChangeNotifier:
+    """Wakes waiting feed requests when this process commits logged changes.
+    Waits are bounded so changes committed by other processes are still
+    picked up by re-polling.
+    """
+
+    def __init__(self):
+        """Create a notifier with no commits seen."""
+        self.generation = 0
+        self._condition = threading.Condition()
+
+    def notify(self):
+        """Record a commit of logged changes and wake every waiter.
+        (return) None
+        """
+        with self._condition:
+            self.generation += 1
+            self._condition.notify_all()
+
+    def wait(self, generation, timeout):
+        """Block until a commit newer than generation or until the timeout.
+        (arg) generation-int: The generation seen before the last poll.
+        (arg) timeout-float: Seconds to wait at most.
+        (return) bool: True if a newer commit was recorded.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self.generation != generation, timeout)
+
+
+# Process-wide notifier shared by all requests
+changeNotifier = ChangeNotifier()
+
+
+def readChanges(session, since, limit):
+    """Return the changes after a cursor, oldest first.
+    (arg) session-Session: Session used to read the log.
+    (arg) since-int: Cursor of the last change the client has seen.
+    (arg) limit-int: Maximum number of changes.
+    (return) tuple: (list of ChangeEvent, whether more changes follow).
+    """
+    events = session.query(ChangeEvent).filter(ChangeEvent.id > since) \
+        .order_by(ChangeEvent.id).limit(limit + 1).all()
+    return events[:limit], len(events) > limit
+
+
+# Caches further behind the log than this rebuild instead of catching up
+CATCH_UP_LIMIT = 1000
+
+
+def latestCursor(session):
+    """Return the cursor of the newest logged change.
+    (arg) session-Session: Session used to read the log.
+    (return) int: The newest change id, or 0 for an empty log.
+    """
+    return session.scalar(select(func.max(ChangeEvent.id))) or 0
+
+
+def changesSince(session, since, limit):
+    """Return the bare rows logged after a cursor, oldest first.
+    (arg) session-Session: Session used to read the log.
+    (arg) since-int: Cursor the caller has caught up to.
+    (arg) limit-int: Maximum number of rows.
+    (return) list[tuple]: (cursor, entity, key, action) rows; limit + 1 of them if more follow.
+    """
+    return session.execute(
+        select(ChangeEvent.id, ChangeEvent.entity, ChangeEvent.entity_key, ChangeEvent.action)
+        .where(ChangeEvent.id > since).order_by(ChangeEvent.id).limit(limit + 1)).all()
+
+
+@event.listens_for(Session, "after_flush")
+def _logFlushedChanges(session, flushContext):
+    """Append the clubs, users and reviews written by a flush to the change log."""
+    for obj in list(session.new):
+        ChangeEvent.record(session, obj, "created")
+    for obj in list(session.dirty):
+        if session.is_modified(obj):
+            ChangeEvent.record(session, obj, "updated")
+    for obj in list(session.deleted):
+        ChangeEvent.record(session, obj, "deleted")
+
+
+@event.listens_for(Session, "after_commit")
+def _notifyCommittedChanges(session):
+    """Wake feed requests once logged changes are committed."""
+    if session.info.pop("changesLogged", False):
+        changeNotifier.notify()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forgetLoggedChanges(session, transaction):
+    """Start de-duplicating afresh in the next outer transaction."""
+    if transaction.parent is None:
+        session.info.pop("loggedChanges", None)
+        session.info.pop("changesLogged", None)
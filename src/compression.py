@@ -0,0 +1,168 @@
+"""
+Response compression for the Flask club review application.
+Negotiates gzip (and brotli/zstd when installed) from Accept-Encoding and
+caches compressed bodies by ETag, so a popular payload is compressed once.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional
+    zstandard = None
+
+
+def _gzip(body, level):
+    """Compress with gzip at a 1-9 level."""
+    return gzip.compress(body, compresslevel=max(1, min(level, 9)), mtime=0)
+
+
+def _brotli(body, level):
+    """Compress with brotli, mapping the 1-9 level onto qualities 1-11."""
+    return brotli.compress(body, quality=max(1, min(round(level * 11 / 9), 11)))
+
+
+def _zstd(body, level):
+    """Compress with zstd, mapping the 1-9 level onto levels 1-19."""
+    return zstandard.ZstdCompressor(level=max(1, min(level * 2 + 1, 19))).compress(body)
+
+
+# Supported encodings in server preference order
+ENCODERS = OrderedDict(
+    [(name, encoder) for name, encoder, module in (
+        ("br", _brotli, brotli),
+        ("zstd", _zstd, zstandard),
+        ("gzip", _gzip, gzip),
+    ) if module is not None]
+)
+
+
+class CompressedBodyCache:
+    """Thread-safe LRU of compressed bodies bounded by total bytes."""
+
+    def __init__(self, maxBytes):
+        """Create an empty cache.
+        (arg) maxBytes-int: Total size of cached bodies before evicting.
+        """
+        self.maxBytes = maxBytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached body for key, or None.
+        (arg) key-tuple: (etag, encoding, level).
+        (return) bytes: The compressed body or None.
+        """
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        """Store a compressed body, evicting least recently used entries.
+        (arg) key-tuple: (etag, encoding, level).
+        (arg) body-bytes: The compressed body.
+        (return) None
+        """
+        if len(body) > self.maxBytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.maxBytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        """Remove every entry and reset the hit counters.
+        (return) None
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+
+def chooseEncoding(acceptEncodings):
+    """Pick the best supported encoding the client accepts.
+    (arg) acceptEncodings-Accept: The parsed Accept-Encoding header.
+    (return) str: Encoding name; None for an uncompressed response.
+    """
+    best, bestQuality = None, 0
+    for name in ENCODERS:
+        quality = acceptEncodings.quality(name)
+        if quality > bestQuality:
+            best, bestQuality = name, quality
+    return best
+
+
+def routeSettings(app, endpoint):
+    """Return the compression level and size threshold for an endpoint.
+    (arg) app-Flask: The application.
+    (arg) endpoint-str: The matched endpoint name.
+    (return) tuple: (level, minimum size in bytes); level 0 disables.
+    """
+    override = app.config["COMPRESSION_ROUTES"].get(endpoint, {})
+    return (override.get("level", app.config["COMPRESSION_LEVEL"]),
+            override.get("min_size", app.config["COMPRESSION_MIN_SIZE"]))
+
+
+def configureCompression(app):
+    """Register ETag and compression handling for JSON GET responses.
+    (arg) app-Flask: The application.
+    (return) CompressedBodyCache: The cache of compressed bodies.
+    """
+    cache = CompressedBodyCache(app.config["COMPRESSION_CACHE_BYTES"])
+    app.extensions["compressionCache"] = cache
+
+    @app.after_request
+    def compressResponse(response):
+        """Tag JSON GET responses with an ETag and compress large ones."""
+        if request.method != "GET" or response.status_code != 200 \
+                or response.mimetype != "application/json" \
+                or response.direct_passthrough or "Content-Encoding" in response.headers:
+            return response
+        body = response.get_data()
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        response.vary.add("Accept-Encoding")
+
+        level, minSize = routeSettings(app, request.endpoint)
+        encoding = chooseEncoding(request.accept_encodings) if level and len(body) >= minSize \
+            else None
+        if encoding is None:
+            response.set_etag(etag)
+            return response.make_conditional(request)
+
+        # Each representation gets its own ETag, as required for strong validators
+        response.set_etag(f"{etag}-{encoding}")
+        if request.if_none_match.contains(f"{etag}-{encoding}"):
+            return response.make_conditional(request)
+        key = (etag, encoding, level)
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = ENCODERS[encoding](body, level)
+            cache.put(key, compressed)
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    return cache
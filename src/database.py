@@ -1,13 +1,337 @@
-from flask import Flask
+import copy
+import importlib
+import os
+import time
+
+from flask import Flask, current_app, has_app_context, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+DB_FILE = "clubreview.db"
+
+# Settings can be overridden from the environment as CLUBREVIEW_<KEY>, and the
+# database URI as DATABASE_URL
+ENV_PREFIX = "CLUBREVIEW"
+
+# Driver arguments that bound a single statement, per backend, from milliseconds
+STATEMENT_TIMEOUT_ARGS = {
+    # SQLite cannot cancel a running statement; this bounds the wait for a lock
+    "sqlite": lambda ms: {"timeout": ms / 1000},
+    "postgresql": lambda ms: {"options": f"-c statement_timeout={int(ms)}"},
+    "mysql": lambda ms: {"init_command": f"SET SESSION max_execution_time={int(ms)}"},
+}
+
+# Request methods whose queries are served by the read-only pool
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class RoutingSession(Session):
+    """Session that sends queries issued by read requests to the read-only pool.
+    Flushes and DML statements always go to the single writer connection, and
+    once a transaction has written, its later reads stay on the writer too.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        """Return the read engine for read requests, else the writer engine.
+        (return) Engine: The engine the statement should run on.
+        """
+        if bind is None and not self.info.get("pinnedToWriter"):
+            if self._flushing or isinstance(clause, UpdateBase):
+                self.info["pinnedToWriter"] = True
+            elif routesToReadPool():
+                readEngine = getReadEngine()
+                if readEngine is not None:
+                    return readEngine
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+    @property
+    def connection_callable(self):
+        """Return the per-object flush connection chooser when reviews are sharded.
+        (return) callable: (mapper, instance) -> Connection; None to flush through get_bind.
+        """
+        if not has_app_context():
+            return None
+        shards = current_app.extensions.get("reviewShards")
+        return None if shards is None else shards.flushConnection
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _unpinWriter(session, transaction):
+    """Let reads use the read pool again once the outer transaction ends.
+    (return) None
+    """
+    if transaction.parent is None:
+        session.info.pop("pinnedToWriter", None)
+
 
 # Create the SQLAlchemy database instance
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+def routesToReadPool():
+    """Return whether reads in the current context should use the read pool.
+    Other requests read on the writer, so a read-modify-write sees the rows
+    it is about to change.
+    (return) bool: True inside a GET/HEAD/OPTIONS request.
+    """
+    return has_request_context() and request.method in READ_METHODS
+
+
+def isMemoryDatabase(uri):
+    """Return whether a SQLite URI points at an in-memory database.
+    (arg) uri-str: The database URI.
+    (return) bool: True for in-memory SQLite databases.
+    """
+    return uri in ("sqlite://", "sqlite:///:memory:")
+
+
+def getReadEngine():
+    """Return the read-only engine of the current app, if it has one.
+    (return) Engine: The read engine; None when reads share the writer.
+    """
+    return current_app.extensions.get("readEngine")
 
-DB_FILE = "clubreview.db"
 
-def create_app():
-    """Create and configure the Flask application."""
+def _enableWal(dbapiConnection, connectionRecord):
+    """Switch a new writer connection to WAL so readers never block on it.
+    (return) None
+    """
+    cursor = dbapiConnection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+    # Let SQLAlchemy emit BEGIN itself so SAVEPOINTs nest inside a real transaction
+    dbapiConnection.isolation_level = None
+
+
+def _enableForeignKeys(dbapiConnection, connectionRecord):
+    """Enforce foreign keys, which SQLite leaves off by default, so ON DELETE CASCADE runs.
+    (return) None
+    """
+    cursor = dbapiConnection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def _beginTransaction(connection):
+    """Open the transaction pysqlite no longer begins implicitly.
+    (return) None
+    """
+    connection.exec_driver_sql("BEGIN")
+
+
+def enableSqliteWriter(engine):
+    """Put a file-backed SQLite engine's connections in WAL mode with explicit BEGINs.
+    (arg) engine-Engine: The engine that writes to the file.
+    (return) None
+    """
+    event.listen(engine, "connect", _enableWal)
+    event.listen(engine, "begin", _beginTransaction)
+
+
+def configureEngines(app):
+    """Set up the writer connection and the read-only pool for an app.
+    Every SQLite connection enforces foreign keys. The writer uses WAL and a
+    single pooled connection so writes are serialized; reads open `mode=ro`
+    URI connections to the same file. In-memory databases get no read pool.
+    (arg) app-Flask: An app that db.init_app has already been called on.
+    (return) None
+    """
+    with app.app_context():
+        writeEngine = db.engine
+    if writeEngine.dialect.name != "sqlite":
+        return
+    event.listen(writeEngine, "connect", _enableForeignKeys)
+    if isMemoryDatabase(app.config["SQLALCHEMY_DATABASE_URI"]):
+        return
+    enableSqliteWriter(writeEngine)
+    # Share the writer's driver arguments, e.g. its lock timeout and the row
+    # counting connection class of querystats
+    connectArgs = {**app.config["SQLALCHEMY_ENGINE_OPTIONS"].get("connect_args", {}),
+                   "check_same_thread": False}
+    app.extensions["readEngine"] = create_engine(
+        f"sqlite:///file:{writeEngine.url.database}?mode=ro&uri=true",
+        pool_size=app.config["READ_POOL_SIZE"],
+        max_overflow=app.config["READ_POOL_OVERFLOW"],
+        pool_recycle=app.config["DATABASE_POOL_RECYCLE"],
+        connect_args=connectArgs,
+    )
+
+
+def engineOptions(config):
+    """Return the writer engine options for the configured database.
+    File-backed SQLite keeps one dedicated writer connection; server databases
+    get a pool of DATABASE_POOL_SIZE plus DATABASE_MAX_OVERFLOW connections
+    that are checked before use. Options the caller set in
+    SQLALCHEMY_ENGINE_OPTIONS take precedence.
+    (arg) config-Config: The app's configuration.
+    (return) dict: Keyword arguments for create_engine.
+    """
+    uri = config["SQLALCHEMY_DATABASE_URI"]
+    backend = make_url(uri).get_backend_name()
+    timeout = config["DATABASE_STATEMENT_TIMEOUT_MS"]
+    connectArgs = STATEMENT_TIMEOUT_ARGS[backend](timeout) \
+        if timeout and backend in STATEMENT_TIMEOUT_ARGS else {}
+    if isMemoryDatabase(uri):
+        # Flask-SQLAlchemy shares one connection through a StaticPool
+        options = {}
+    elif backend == "sqlite":
+        options = {"pool_size": 1, "max_overflow": 0,
+                   "pool_recycle": config["DATABASE_POOL_RECYCLE"]}
+    else:
+        options = {"pool_size": config["DATABASE_POOL_SIZE"],
+                   "max_overflow": config["DATABASE_MAX_OVERFLOW"],
+                   "pool_recycle": config["DATABASE_POOL_RECYCLE"],
+                   "pool_pre_ping": True}
+    custom = config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+    options.update(custom)
+    connectArgs.update(custom.get("connect_args", {}))
+    if connectArgs:
+        options["connect_args"] = connectArgs
+    return options
+
+
+def loadEnvironment(app):
+    """Apply settings from the environment on top of the defaults.
+    DATABASE_URL sets the database URI; CLUBREVIEW_<KEY> sets any key, with
+    values parsed as JSON, e.g. CLUBREVIEW_DATABASE_POOL_SIZE=20.
+    (arg) app-Flask: The application.
+    (return) None
+    """
+    if os.environ.get("DATABASE_URL"):
+        app.config["SQLALCHEMY_DATABASE_URI"] = os.environ["DATABASE_URL"]
+    app.config.from_prefixed_env(ENV_PREFIX)
+
+
+# Defaults applied by create_app before any caller overrides
+DEFAULT_CONFIG = {
+    "SQLALCHEMY_DATABASE_URI": f"sqlite:///{DB_FILE}",
+    # Writer pool of server databases; SQLite keeps a single writer connection
+    "DATABASE_POOL_SIZE": 10,
+    "DATABASE_MAX_OVERFLOW": 10,
+    # Seconds before a pooled connection is replaced; -1 keeps connections
+    "DATABASE_POOL_RECYCLE": 3600,
+    # Longest a statement may run; on SQLite, the longest wait for a lock
+    "DATABASE_STATEMENT_TIMEOUT_MS": 5000,
+    # SQLite read pool size
+    "READ_POOL_SIZE": 8,
+    "READ_POOL_OVERFLOW": 8,
+    # Optional group commit of inserts from concurrent requests
+    "GROUP_COMMIT": False,
+    "GROUP_COMMIT_WINDOW_MS": 5,
+    "GROUP_COMMIT_MAX_BATCH": 64,
+    # Split reviews and rollups across this many SQLite files by club_code; 1 keeps them here
+    "REVIEW_SHARDS": 1,
+    # Clubs and users with at least PURGE_THRESHOLD reviews are deleted in the background
+    "BACKGROUND_PURGE": True,
+    "PURGE_THRESHOLD": 5000,
+    "PURGE_BATCH_SIZE": 500,
+    # Background jobs run at once, jobs queued per process before POST /api/jobs
+    # answers 503, and the pause after each committed job batch
+    "JOB_WORKERS": 1,
+    "JOB_QUEUE_SIZE": 16,
+    "JOB_PAUSE_MS": 10,
+    # Most keys one ?codes= or ?ids= multi-get may ask for
+    "MULTI_GET_LIMIT": 100,
+    # Review search ranks every match, or only this many of the newest per shard if set
+    "SEARCH_CANDIDATES": 0,
+    # Request-scoped lookup cache, and X-Lookup-* headers reporting the queries it saved
+    "LOOKUP_CACHE": True,
+    "LOOKUP_DEBUG_HEADERS": False,
+    # Long-polling /api/changes re-reads the log at least this often
+    "CHANGES_POLL_SECONDS": 1.0,
+    # Opt-in per-statement call counts and timings served at /api/debug/queries
+    "QUERY_STATS": False,
+    # Opt-in tracemalloc sampling of a fraction of requests for /api/debug/memory
+    "MEMORY_PROFILING": False,
+    "MEMORY_SAMPLE_RATE": 0.01,
+    "MEMORY_TRACE_FRAMES": 1,
+    # JSON log lines written by a background thread; repeated warnings are
+    # rate limited to LOG_RATE_BURST per LOG_RATE_WINDOW seconds, then sampled
+    "STRUCTURED_LOGGING": True,
+    "LOG_LEVEL": "INFO",
+    "LOG_QUEUE_SIZE": 10000,
+    "LOG_RATE_BURST": 10,
+    "LOG_RATE_WINDOW": 60.0,
+    "LOG_SAMPLE_EVERY": 100,
+    # Response compression; per-endpoint overrides of level/min_size
+    "COMPRESSION_LEVEL": 6,
+    "COMPRESSION_MIN_SIZE": 1024,
+    "COMPRESSION_ROUTES": {
+        "api.getClubs": {"level": 9},
+        "api.getReviews": {"level": 9},
+    },
+    "COMPRESSION_CACHE_BYTES": 32 * 1024 * 1024,
+    # Admission control: (concurrent limit, wait queue size) per route class
+    "ADMISSION_CONTROL": True,
+    "ADMISSION_LIMITS": {
+        "reads": (32, 64),
+        "writes": (4, 32),
+        "search": (8, 16),
+        "stats": (8, 16),
+        # Long polls mostly sleep, so many may be open at once
+        "feeds": (64, 16),
+    },
+    "ADMISSION_QUEUE_TIMEOUT": 2.0,
+    "ADMISSION_RETRY_AFTER": 1,
+    # Blueprints as "module:attribute", imported only when an app is created
+    "BLUEPRINTS": [".app:routes", ".debug:debug"],
+}
+
+
+def registerBlueprints(app):
+    """Import and register the blueprints listed in the BLUEPRINTS config.
+    (arg) app-Flask: The application.
+    (return) None
+    """
+    for path in app.config["BLUEPRINTS"]:
+        moduleName, attribute = path.split(":")
+        module = importlib.import_module(moduleName, __package__)
+        app.register_blueprint(getattr(module, attribute))
+
+
+def create_app(config=None):
+    """Create and configure the Flask application.
+    (arg) config-dict: Settings that override DEFAULT_CONFIG and the environment.
+    (return) Flask: The configured application with routes registered.
+    """
+    # Imported here so importing the models does not pull in the app layers
+    from .admission import configureAdmission
+    from .compression import configureCompression
+    from .groupcommit import configureGroupCommit
+    from .jobs import configureJobs
+    from .logconfig import configureLogging
+    from .lookups import configureLookups
+    from .memprofile import configureMemoryProfiling
+    from .purge import configurePurge
+    from .querystats import configureQueryStats, enableRowCounting
+    from .search import configureSearch
+    from .shards import configureReviewShards
+
+    startedAt = time.perf_counter()
     app = Flask(__name__)
-    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{DB_FILE}"
-    return app
\ No newline at end of file
+    app.config.from_mapping(copy.deepcopy(DEFAULT_CONFIG))
+    loadEnvironment(app)
+    app.config.from_mapping(config or {})
+    configureLogging(app)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engineOptions(app.config)
+    enableRowCounting(app)
+
+    db.init_app(app)
+    configureEngines(app)
+    configureQueryStats(app)
+    configureReviewShards(app)
+    configureSearch(app)
+    configureGroupCommit(app)
+    configurePurge(app)
+    configureJobs(app)
+    configureCompression(app)
+    configureAdmission(app)
+    configureMemoryProfiling(app)
+    configureLookups(app)
+    registerBlueprints(app)
+    app.config["STARTUP_SECONDS"] = time.perf_counter() - startedAt
+    return app
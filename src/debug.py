@@ -0,0 +1,91 @@
+"""
+Debug endpoints for the Flask club review application.
+Expose runtime counters that help diagnose load and performance problems.
+"""
+from flask import Blueprint, current_app, jsonify, request
+
+debug = Blueprint("debug", __name__, url_prefix="/api/debug")
+
+
+@debug.route("/admission", methods=["GET"])
+def getAdmissionStats():
+    """Return concurrency limits, queue depth and rejection counts per route class.
+    (return) Response: JSON object keyed by route class.
+    """
+    gates = current_app.extensions["admissionGates"]
+    return jsonify({name: gate.stats() for name, gate in gates.items()})
+
+
+@debug.route("/queries", methods=["GET"])
+def getQueryStats():
+    """Return aggregated statement statistics, most total time first.
+    (query) limit-int: Maximum number of statements (default 50, max 1000).
+    (return) Response: JSON object with the statements and the tracking window.
+    """
+    stats = current_app.extensions.get("queryStats")
+    if stats is None:
+        return jsonify({"error": "Query statistics are disabled"}), 404
+    limit = request.args.get("limit", 50, type=int)
+    if not 1 <= limit <= 1000:
+        return jsonify({"error": "limit must be between 1 and 1000"}), 400
+    return jsonify({
+        "since": stats.resetAt,
+        "fingerprints": len(stats),
+        "statements": stats.snapshot(limit)
+    })
+
+
+@debug.route("/queries", methods=["DELETE"])
+def resetQueryStats():
+    """Clear the statement statistics.
+    (return) Response: JSON confirmation message.
+    """
+    stats = current_app.extensions.get("queryStats")
+    if stats is None:
+        return jsonify({"error": "Query statistics are disabled"}), 404
+    stats.reset()
+    return jsonify({"message": "Query statistics reset"}), 200
+
+
+@debug.route("/memory", methods=["GET"])
+def getMemoryProfile():
+    """Return sampled per-route allocations and the diff of the last two snapshots.
+    (query) limit-int: Maximum number of allocation sites (default 20, max 200).
+    (return) Response: JSON object with routes, snapshot count and diff.
+    """
+    profiler = current_app.extensions.get("memoryProfiler")
+    if profiler is None:
+        return jsonify({"error": "Memory profiling is disabled"}), 404
+    limit = request.args.get("limit", 20, type=int)
+    if not 1 <= limit <= 200:
+        return jsonify({"error": "limit must be between 1 and 200"}), 400
+    return jsonify({
+        "sample_rate": profiler.sampleRate,
+        "routes": profiler.routeStats(),
+        "snapshots": len(profiler.snapshots),
+        "diff": profiler.diff(limit)
+    })
+
+
+@debug.route("/memory", methods=["POST"])
+def takeMemorySnapshot():
+    """Take an allocation snapshot; the previous one becomes the diff baseline.
+    (return) Response: JSON object with the snapshot count and traced bytes.
+    """
+    profiler = current_app.extensions.get("memoryProfiler")
+    if profiler is None:
+        return jsonify({"error": "Memory profiling is disabled"}), 404
+    tracedBytes = profiler.takeSnapshot()
+    return jsonify({"snapshots": len(profiler.snapshots), "traced_bytes": tracedBytes}), 201
+
+
+@debug.route("/memory", methods=["DELETE"])
+def resetMemoryProfile():
+    """Drop snapshots and route figures and stop snapshot tracing.
+    (return) Response: JSON confirmation message.
+    """
+    profiler = current_app.extensions.get("memoryProfiler")
+    if profiler is None:
+        return jsonify({"error": "Memory profiling is disabled"}), 404
+    profiler.reset()
+    return jsonify({"message": "Memory profile reset"}), 200
@@ -0,0 +1,152 @@
+"""
+Group commit for the Flask club review application.
+A background writer gathers inserts submitted by concurrent requests and
+commits them together, so a burst of requests pays for one fsync.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import current_app, has_app_context
+from sqlalchemy.orm import Session
+
+from .database import db, isMemoryDatabase
+
+
+class GroupCommitter:
+    """Writer thread that commits queued units of work in shared transactions.
+    Every unit runs inside its own SAVEPOINT, so a constraint error only
+    fails the request that caused it.
+    """
+
+    def __init__(self, engine, window=0.005, maxBatch=64, timeout=30.0):
+        """Start the writer thread.
+        (arg) engine-Engine: The writer engine.
+        (arg) window-float: Seconds to wait for more work after the first unit.
+        (arg) maxBatch-int: Largest number of units committed together.
+        (arg) timeout-float: Seconds a request waits for its result.
+        """
+        self.engine = engine
+        self.window = window
+        self.maxBatch = maxBatch
+        self.timeout = timeout
+        self.batchesCommitted = 0
+        self.unitsCommitted = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, work):
+        """Queue a unit of work and wait until its batch is committed.
+        (arg) work-callable: Called with the writer Session; may add or execute.
+        (bad input) work-raising: The exception is re-raised to the caller.
+        (return) Any: The value returned by work.
+        """
+        future = Future()
+        self._queue.put((work, future))
+        return future.result(timeout=self.timeout)
+
+    def stop(self):
+        """Stop the writer thread after it drains the queue.
+        (return) None
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        """Collect units for up to one window and commit each batch.
+        (return) None
+        """
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            stopping = False
+            while len(batch) < self.maxBatch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commitBatch(batch)
+            if stopping:
+                return
+
+    def _commitBatch(self, batch):
+        """Run every unit in its own savepoint, then commit once.
+        (arg) batch-list[tuple]: (work, Future) pairs.
+        (return) None
+        """
+        session = Session(bind=self.engine, expire_on_commit=False)
+        outcomes = []
+        try:
+            session.begin()
+            for work, future in batch:
+                try:
+                    with session.begin_nested():
+                        result = work(session)
+                    outcomes.append((future, result, None))
+                except Exception as e:
+                    outcomes.append((future, None, e))
+            session.commit()
+        except Exception as e:
+            # BEGIN or an early SAVEPOINT may fail before every unit has an outcome
+            errors = {future: error for future, _, error in outcomes}
+            outcomes = [(future, None, errors.get(future) or e) for _, future in batch]
+            session.rollback()
+        finally:
+            # Hand committed objects back detached so requests can re-attach them
+            session.expunge_all()
+            session.close()
+            self._resolve(outcomes)
+
+    def _resolve(self, outcomes):
+        """Pass every unit's result or exception to its waiting request.
+        (arg) outcomes-list[tuple]: (Future, result, exception) per unit.
+        (return) None
+        """
+        self.batchesCommitted += 1
+        for future, result, error in outcomes:
+            if error is None:
+                self.unitsCommitted += 1
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+def getGroupCommitter():
+    """Return the current app's group committer, if group commit is enabled.
+    (return) GroupCommitter: The committer; None when writes commit inline.
+    """
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("groupCommitter")
+
+
+def configureGroupCommit(app):
+    """Start a group committer for an app when GROUP_COMMIT is enabled.
+    In-memory databases share one connection and always commit inline.
+    (arg) app-Flask: An app that configureEngines has already run on.
+    (return) GroupCommitter: The committer; None when disabled.
+    """
+    if not app.config.get("GROUP_COMMIT") or \
+            isMemoryDatabase(app.config["SQLALCHEMY_DATABASE_URI"]):
+        return None
+    with app.app_context():
+        engine = db.engine
+    committer = GroupCommitter(
+        engine,
+        window=app.config["GROUP_COMMIT_WINDOW_MS"] / 1000,
+        maxBatch=app.config["GROUP_COMMIT_MAX_BATCH"],
+    )
+    app.extensions["groupCommitter"] = committer
+    return committer
@@ -0,0 +1,357 @@
+"""
+Background jobs for the Flask club review application.
+Maintenance work such as rebuilding aggregates, exporting data and purging
+large deletions is recorded in the job table and run by a small thread pool,
+in short committed batches with a pause between them, so requests keep
+getting the writer connection while a job runs. Each job records the process
+that took it; on startup, queued and running jobs whose process has exited
+are marked failed, so they do not report progress forever.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, inspect, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from .analytics import reviewColumns
+from .database import db, isMemoryDatabase
+from .models import Club, Job, Review, ReviewRollup, Tag, User
+from .purge import PURGE_TARGETS, purgeParent
+from .recommendations import coFavoriteIndex
+from .search import rebuildSearchIndex, supportsFullText
+from .shards import getReviewShards
+
+# Job kind to the function that runs it, filled in by registerJobKind
+JOB_KINDS = {}
+# Tables written by the export job, in order
+EXPORT_MODELS = {"clubs": Club, "users": User, "reviews": Review}
+# Error recorded on jobs whose process exited before they finished
+INTERRUPTED_ERROR = "Interrupted: the process running the job exited before it finished"
+
+
+def registerJobKind(name):
+    """Register a function as the runner of a job kind.
+    The function takes (JobContext, params dict) and returns a JSON-serializable result.
+    (arg) name-str: The kind accepted by POST /api/jobs.
+    (return) callable: Decorator returning the function unchanged.
+    """
+    def register(function):
+        JOB_KINDS[name] = function
+        return function
+    return register
+
+
+class JobContext:
+    """What a running job sees: its session, its row and a way to report progress."""
+
+    def __init__(self, runner, session, job):
+        """(arg) runner-JobRunner, session-Session, job-Job: The job being run."""
+        self.runner = runner
+        self.session = session
+        self.job = job
+
+    def checkpoint(self, progress, message=None):
+        """Commit the work done so far with the job's progress, then yield to requests.
+        (arg) progress-float: Fraction done, 0 to 1.
+        (arg) message-str: Optional status text.
+        (return) None
+        """
+        self.job.progress = max(0.0, min(1.0, progress))
+        if message is not None:
+            self.job.message = message
+        self.session.commit()
+        if self.runner.pauseSeconds:
+            time.sleep(self.runner.pauseSeconds)
+
+
+class JobRunner:
+    """Runs queued jobs on a bounded thread pool and records their outcome in the job table.
+    With no workers, jobs run inline in the submitting thread, e.g. for
+    in-memory databases whose single connection cannot be shared.
+    """
+
+    def __init__(self, app, workers=1, queueSize=16, pauseSeconds=0.01):
+        """Create a runner; pool threads start with the first job.
+        (arg) app-Flask: The application whose database the jobs use.
+        (arg) workers-int: Jobs run at once; 0 runs them inline.
+        (arg) queueSize-int: Jobs queued or running before new ones are refused.
+        (arg) pauseSeconds-float: Sleep after each checkpoint so requests can write.
+        """
+        self.app = app
+        self.workers = workers
+        self.queueSize = queueSize
+        self.pauseSeconds = pauseSeconds
+        self._active = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job") \
+            if workers else None
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def submit(self, session, kind, params):
+        """Record a job and queue it.
+        (arg) session-Session: Session the job row is created in; it is committed.
+        (arg) kind-str: A registered job kind.
+        (arg) params-dict: The job's parameters.
+        (return) Job: The new job, or None if the queue is full.
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"kind must be one of: {', '.join(sorted(JOB_KINDS))}")
+        if not isinstance(params, dict):
+            raise TypeError("params must be an object")
+        with self._lock:
+            if len(self._active) >= self.queueSize:
+                return None
+            job = Job.createJob(kind, params)
+            job.owner = self.owner
+            session.add(job)
+            session.commit()
+            self._active.add(job.id)
+        if self._executor is None:
+            self._run(job.id)
+            session.expire(job)
+        else:
+            self._executor.submit(self._run, job.id)
+        return job
+
+    def pending(self):
+        """Return the number of jobs queued or running in this process.
+        (return) int
+        """
+        with self._lock:
+            return len(self._active)
+
+    def shutdown(self):
+        """Wait for queued jobs to finish and stop the pool.
+        (return) None
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def reconcile(self, session):
+        """Mark the unfinished jobs of exited processes on this host as failed.
+        Jobs without an owner predate it and are failed too; jobs taken on
+        other hosts are left to those hosts. This process's own pid counts as
+        exited, since its runner has only just been created.
+        (arg) session-Session: Session the jobs are updated in; it is committed.
+        (return) int: Number of jobs marked failed.
+        """
+        host = self.owner.rsplit(":", 1)[0]
+        orphaned = []
+        for job in session.scalars(select(Job).where(Job.status.in_(("queued", "running")))):
+            ownerHost, _, pid = (job.owner or "").rpartition(":")
+            if job.owner is None or job.owner == self.owner \
+                    or (ownerHost == host and not processAlive(int(pid))):
+                orphaned.append(job)
+        for job in orphaned:
+            job.status = "failed"
+            job.error = INTERRUPTED_ERROR
+            job.finished_at = datetime.utcnow()
+        session.commit()
+        return len(orphaned)
+
+    def _run(self, jobId):
+        """Run one job in its own app context and record how it ended.
+        (return) None
+        """
+        try:
+            with self.app.app_context():
+                session = db.session
+                try:
+                    job = session.get(Job, jobId)
+                    if job is None:
+                        self.app.logger.warning("Job %s vanished before it ran", jobId)
+                        return
+                    job.status = "running"
+                    job.started_at = datetime.utcnow()
+                    session.commit()
+                    result = JOB_KINDS[job.kind](JobContext(self, session, job), job.parameters())
+                    job.status = "succeeded"
+                    job.progress = 1.0
+                    job.result = json.dumps(result, default=str)
+                    job.finished_at = datetime.utcnow()
+                    session.commit()
+                except Exception as e:
+                    session.rollback()
+                    self.app.logger.exception("Job %s failed", jobId)
+                    job = session.get(Job, jobId)
+                    if job is not None:
+                        job.status = "failed"
+                        job.error = str(e)
+                        job.finished_at = datetime.utcnow()
+                        session.commit()
+                finally:
+                    session.remove()
+        finally:
+            with self._lock:
+                self._active.discard(jobId)
+
+
+@registerJobKind("rebuild_rollups")
+def rebuildRollups(context, params):
+    """Recompute the review rollups from the review table."""
+    rows = ReviewRollup.rebuild(context.session)
+    context.checkpoint(1.0)
+    return {"rollup_rows": rows}
+
+
+@registerJobKind("recount_tags")
+def recountTags(context, params):
+    """Recompute every tag's club count."""
+    Tag.recountClubs(context.session)
+    context.checkpoint(1.0)
+    return {"tags": context.session.scalar(select(func.count()).select_from(Tag))}
+
+
+@registerJobKind("recount_favorites")
+def recountFavorites(context, params):
+    """Recompute every club's favorites_count."""
+    Club.recountFavorites(context.session)
+    context.checkpoint(1.0)
+    return {"clubs": context.session.scalar(select(func.count()).select_from(Club))}
+
+
+@registerJobKind("rebuild_analytics")
+def rebuildAnalytics(context, params):
+    """Reload the in-memory review columns used by /api/analytics."""
+    reviewColumns.build(context.session)
+    return {"reviews": len(reviewColumns.ids) - reviewColumns.deleted}
+
+
+@registerJobKind("rebuild_recommendations")
+def rebuildRecommendations(context, params):
+    """Rebuild the club co-favorite index used for recommendations."""
+    coFavoriteIndex.build(context.session)
+    return {"clubs": len(coFavoriteIndex.clubUsers)}
+
+
+@registerJobKind("reindex_search")
+def reindexSearch(context, params):
+    """Create the review search index where missing and refill it, one shard at a time."""
+    shards = getReviewShards()
+    engines = shards.engines if shards is not None else [None]
+    indexed = 0
+    for done, engine in enumerate(engines, start=1):
+        connection = context.session.connection(
+            bind_arguments={"bind": engine} if engine is not None else None)
+        if not supportsFullText(connection):
+            return {"reviews": 0, "message": "Full-text search needs SQLite"}
+        indexed += rebuildSearchIndex(connection)
+        context.checkpoint(done / len(engines), f"Indexed {done} of {len(engines)} databases")
+    return {"reviews": indexed}
+
+
+@registerJobKind("export")
+def exportData(context, params):
+    """Write clubs, users and reviews as JSON lines under the instance folder.
+    Rows are read in primary key order, batchSize at a time.
+    (arg) params-dict: "entities", any of "clubs", "users" and "reviews" (all by
+    default), and "batchSize", rows read per query (1000 by default).
+    """
+    entities = params.get("entities", list(EXPORT_MODELS))
+    if not isinstance(entities, list) or not set(entities) <= set(EXPORT_MODELS):
+        raise ValueError(f"entities must be a list of: {', '.join(EXPORT_MODELS)}")
+    batchSize = int(params.get("batchSize", 1000))
+    if batchSize < 1:
+        raise ValueError("batchSize must be at least 1")
+    session = context.session
+    totals = {name: session.scalar(select(func.count()).select_from(EXPORT_MODELS[name]))
+              for name in entities}
+    total = max(1, sum(totals.values()))
+    directory = os.path.join(current_app.instance_path, "exports")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"job-{context.job.id}.jsonl")
+    written = 0
+    with open(path, "w") as output:
+        for name in entities:
+            table = EXPORT_MODELS[name].__table__
+            key = list(table.primary_key.columns)[0]
+            last = None
+            while True:
+                query = select(table).order_by(key).limit(batchSize)
+                if last is not None:
+                    query = query.where(key > last)
+                rows = session.execute(query).mappings().all()
+                if not rows:
+                    break
+                for row in rows:
+                    output.write(json.dumps({"type": name, **row}, default=str) + "\n")
+                last = rows[-1][key.name]
+                written += len(rows)
+                context.checkpoint(written / total, f"Exported {written} of {total} rows")
+    return {"path": path, "rows": totals}
+
+
+@registerJobKind("purge")
+def purgeJob(context, params):
+    """Delete a club or user and its reviews in batches.
+    (arg) params-dict: "kind", "club" or "user", and "key", the club code or user id.
+    """
+    kind, key = params.get("kind"), params.get("key")
+    if kind not in PURGE_TARGETS or key is None:
+        raise ValueError("purge needs a kind of club or user and a key")
+    column = PURGE_TARGETS[kind][1]
+    total = max(1, context.session.scalar(select(func.count()).select_from(Review).where(column == key)))
+    deleted = purgeParent(context.session, kind, key, current_app.config["PURGE_BATCH_SIZE"],
+                          lambda done: context.checkpoint(done / total,
+                                                          f"Deleted {done} reviews"))
+    return {"reviews_deleted": deleted}
+
+
+def getJobRunner():
+    """Return the job runner of the current app.
+    (return) JobRunner: The runner.
+    """
+    return current_app.extensions["jobRunner"]
+
+
+def processAlive(pid):
+    """Return whether a process with this pid exists on this host.
+    (arg) pid-int: The process id.
+    (return) bool
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def reconcileJobs(app, runner):
+    """Fail the jobs orphaned by exited processes, if the job table exists yet.
+    (arg) app-Flask: The application.
+    (arg) runner-JobRunner: The runner just created for this process.
+    (return) int: Number of jobs marked failed.
+    """
+    with app.app_context():
+        try:
+            if not inspect(db.engine).has_table(Job.__tablename__):
+                return 0
+            return runner.reconcile(db.session)
+        except SQLAlchemyError:
+            app.logger.exception("Could not reconcile unfinished jobs")
+            return 0
+        finally:
+            db.session.remove()
+
+
+def configureJobs(app):
+    """Create the app's job runner and fail jobs left unfinished by exited processes.
+    In-memory databases run jobs inline, as they share one connection.
+    (arg) app-Flask: The application.
+    (return) JobRunner: The runner.
+    """
+    workers = 0 if isMemoryDatabase(app.config["SQLALCHEMY_DATABASE_URI"]) \
+        else app.config["JOB_WORKERS"]
+    runner = JobRunner(app, workers, app.config["JOB_QUEUE_SIZE"],
+                       app.config["JOB_PAUSE_MS"] / 1000)
+    app.extensions["jobRunner"] = runner
+    reconcileJobs(app, runner)
+    return runner
@@ -0,0 +1,183 @@
+"""
+Structured logging for the Flask club review application.
+Records from the `src` loggers (validation, purges, request errors and the
+app's own logger) are put on a bounded queue and written as JSON lines by a
+background thread, so request threads never format messages or block on I/O.
+Repeated warnings are rate limited and then sampled per message template.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) \
+    | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line."""
+
+    def format(self, record):
+        """Return the record as JSON, including `extra` fields and exceptions.
+        (arg) record-LogRecord: The record to format.
+        (return) str: A single line of JSON.
+        """
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Limits repeated records below a level, per logger and message template.
+    The first `burst` records of a template in each window pass; after that
+    one in `sampleEvery` passes, carrying the number suppressed since the last.
+    """
+
+    def __init__(self, burst=10, window=60.0, sampleEvery=100, level=logging.ERROR):
+        """Create a filter.
+        (arg) burst-int: Records per template let through in each window.
+        (arg) window-float: Window length in seconds.
+        (arg) sampleEvery-int: Keep one in this many records past the burst; 0 drops them all.
+        (arg) level-int: Records at or above this level always pass.
+        """
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.sampleEvery = sampleEvery
+        self.level = level
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        """Return whether a record should be logged.
+        Keys on the unformatted template, so no message is built here.
+        (return) bool
+        """
+        if record.levelno >= self.level:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            state = self._counts.get(key)
+            if state is None or now - state[0] >= self.window:
+                if len(self._counts) > 10000:
+                    self._counts.clear()
+                state = self._counts[key] = [now, 0, 0]
+            state[1] += 1
+            if state[1] <= self.burst:
+                return True
+            if self.sampleEvery and (state[1] - self.burst) % self.sampleEvery == 0:
+                record.suppressed = state[2]
+                state[2] = 0
+                return True
+            state[2] += 1
+            return False
+
+
+class StderrHandler(logging.StreamHandler):
+    """Writes to whatever sys.stderr is when a record is emitted."""
+
+    @property
+    def stream(self):
+        """Return the current standard error stream."""
+        return sys.stderr
+
+    @stream.setter
+    def stream(self, value):
+        """Ignore the stream StreamHandler.__init__ assigns."""
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records when the queue is full and defers formatting."""
+
+    def __init__(self, logQueue):
+        """(arg) logQueue-Queue: Bounded queue read by the writer thread."""
+        super().__init__(logQueue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        """Enqueue the record as is; the writer thread merges args and formats.
+        (return) LogRecord
+        """
+        return record
+
+    def enqueue(self, record):
+        """Put a record on the queue without waiting.
+        (return) None
+        """
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# The single handler and writer thread of this process
+_handler = None
+_listener = None
+_startLock = threading.Lock()
+
+
+def startWriter(queueSize):
+    """Start (or, after fork, restart) the background writer on a fresh queue.
+    (arg) queueSize-int: Records held before new ones are dropped.
+    (return) QueueListener: The running listener.
+    """
+    global _listener
+    output = StderrHandler()
+    output.setFormatter(JsonFormatter())
+    logQueue = queue.Queue(maxsize=queueSize)
+    _handler.queue = logQueue
+    _listener = logging.handlers.QueueListener(logQueue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stopWriter():
+    """Flush queued records and stop the writer thread.
+    (return) None
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configureLogging(app):
+    """Send the `src` loggers through the queue handler once per process.
+    Later apps in the same process share the first app's handler.
+    (arg) app-Flask: The application.
+    (return) NonBlockingQueueHandler: The handler, or None if disabled.
+    """
+    global _handler
+    if not app.config["STRUCTURED_LOGGING"]:
+        return None
+    with _startLock:
+        if _handler is None:
+            _handler = NonBlockingQueueHandler(None)
+            _handler.addFilter(RateLimitFilter(app.config["LOG_RATE_BURST"],
+                                               app.config["LOG_RATE_WINDOW"],
+                                               app.config["LOG_SAMPLE_EVERY"]))
+            startWriter(app.config["LOG_QUEUE_SIZE"])
+            atexit.register(stopWriter)
+            logger = logging.getLogger("src")
+            logger.addHandler(_handler)
+            logger.setLevel(app.config["LOG_LEVEL"])
+            logger.propagate = False
+    app.extensions["logHandler"] = _handler
+    return _handler
@@ -0,0 +1,145 @@
+"""
+Request-scoped lookup cache for the Flask club review application.
+Routes and model helpers find clubs, users, reviews and tags through
+`lookup`, which keeps each result, found or not, for the rest of the request,
+so an entity is fetched at most once. The request's commits leave loaded
+objects as they are instead of expiring them, so the response is built from
+them rather than by reading every row again. A flush that adds, changes or
+deletes rows drops the results it could make wrong; a rollback drops all.
+"""
+from flask import current_app, g, has_request_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .database import db
+
+
+class RequestLookups:
+    """The lookup results of one request and the queries they saved."""
+
+    def __init__(self):
+        """Start with no results."""
+        self.results = {}
+        self.hits = 0
+        self.queries = 0
+
+    @staticmethod
+    def keyOf(model, criteria):
+        """Return the cache key of a lookup.
+        (arg) model-Class: The mapped class.
+        (arg) criteria-dict: Attribute name to value.
+        (return) tuple: Hashable key.
+        """
+        return model, tuple(sorted(criteria.items()))
+
+    def get(self, session, model, criteria):
+        """Return the first object matching the criteria, querying only the first time.
+        (arg) session-Session: The request's session.
+        (arg) model-Class: The mapped class.
+        (arg) criteria-dict: Attribute name to value, as for filter_by.
+        (return) Model instance or None.
+        """
+        key = self.keyOf(model, criteria)
+        if key in self.results:
+            self.hits += 1
+            return self.results[key]
+        self.queries += 1
+        obj = session.query(model).filter_by(**criteria).first()
+        self.results[key] = obj
+        if obj is not None:
+            # A later lookup by primary key finds the same object
+            mapper = inspect(model)
+            primaryKey = {mapper.get_property_by_column(column).key: value
+                          for column, value in zip(mapper.primary_key, inspect(obj).identity)}
+            self.results.setdefault(self.keyOf(model, primaryKey), obj)
+        return obj
+
+    def forget(self, changed):
+        """Drop results a flush may have made wrong.
+        Misses of a model with new or changed rows may now match, and hits on a
+        changed or deleted object may no longer.
+        (arg) changed-iterable: Objects added, modified or deleted by the flush.
+        (return) None
+        """
+        changed = list(changed)
+        models = {type(obj) for obj in changed}
+        ids = {id(obj) for obj in changed}
+        self.results = {key: obj for key, obj in self.results.items()
+                        if not (obj is None and key[0] in models) and id(obj) not in ids}
+
+
+def requestLookups():
+    """Return the lookup cache of the current request, if caching is on.
+    (return) RequestLookups: The cache, or None outside requests.
+    """
+    if not has_request_context() or not current_app.config["LOOKUP_CACHE"]:
+        return None
+    if "lookups" not in g:
+        g.lookups = RequestLookups()
+    return g.lookups
+
+
+def lookup(model, **criteria):
+    """Return the first object matching the criteria, at most one query per request.
+    Outside a request this is model.query.filter_by(**criteria).first().
+    (arg) model-Class: The mapped class.
+    (arg) criteria-dict: Attribute name to value.
+    (return) Model instance or None.
+    """
+    lookups = requestLookups()
+    if lookups is None:
+        return db.session.query(model).filter_by(**criteria).first()
+    return lookups.get(db.session, model, criteria)
+
+
+@event.listens_for(Session, "after_flush")
+def _forgetChangedLookups(session, flushContext):
+    """Drop cached lookups that the flushed rows may contradict."""
+    lookups = g.get("lookups") if has_request_context() else None
+    if lookups is not None and lookups.results:
+        lookups.forget([*session.new, *session.dirty, *session.deleted])
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forgetAllLookups(session, previousTransaction):
+    """Drop every cached lookup once the outer transaction rolls back."""
+    if previousTransaction.parent is None and has_request_context():
+        lookups = g.get("lookups")
+        if lookups is not None:
+            lookups.results.clear()
+
+
+def configureLookups(app):
+    """Keep objects loaded across a request's commits and report lookup savings.
+    With LOOKUP_DEBUG_HEADERS on, responses carry X-Lookup-Hits (queries
+    avoided) and X-Lookup-Queries (lookups that reached the database).
+    (arg) app-Flask: The application.
+    (return) None
+    """
+    if not app.config["LOOKUP_CACHE"]:
+        return
+
+    @app.before_request
+    def keepObjectsLoaded():
+        """Stop this request's commits from expiring what it has loaded."""
+        db.session().expire_on_commit = False
+
+    @app.after_request
+    def reportLookups(response):
+        """Add the lookup counters to the response."""
+        lookups = g.get("lookups")
+        if lookups is not None and app.config["LOOKUP_DEBUG_HEADERS"]:
+            response.headers["X-Lookup-Hits"] = str(lookups.hits)
+            response.headers["X-Lookup-Queries"] = str(lookups.queries)
+        return response
+
+    @app.teardown_request
+    def restoreExpiry(error=None):
+        """Expire what the request loaded, as a commit would have, for later users of the session.
+        g belongs to the app context, which can outlive the request, so the cache is dropped too.
+        """
+        g.pop("lookups", None)
+        session = db.session()
+        if not session.expire_on_commit:
+            session.expire_on_commit = True
+            session.expire_all()
@@ -0,0 +1,159 @@
+"""
+Memory profiling for the Flask club review application.
+When enabled, a small fraction of requests run with tracemalloc tracing to
+record their peak and retained bytes per route, and /api/debug/memory takes
+snapshots and diffs the top allocation sites between the last two.
+"""
+import random
+import threading
+import tracemalloc
+
+from flask import g, request
+
+# Frames from the profiler itself are left out of snapshot diffs
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+)
+
+
+class MemoryProfiler:
+    """Samples per-route request allocations and keeps allocation snapshots.
+    One sampled request is traced at a time so the figures are not mixed
+    with another sampled request; concurrent unsampled requests still add
+    to them, so per-route numbers are upper bounds under load.
+    """
+
+    def __init__(self, sampleRate=0.01, frames=1):
+        """Create a profiler; tracing only runs while a sample or snapshot needs it.
+        (arg) sampleRate-float: Fraction of requests to trace, 0 to 1.
+        (arg) frames-int: Stack frames stored per allocation.
+        """
+        self.sampleRate = sampleRate
+        self.frames = frames
+        self.routes = {}
+        self.snapshots = []
+        self._sampling = threading.Lock()
+        self._lock = threading.Lock()
+        self._persistent = False
+
+    def startRequest(self):
+        """Begin tracing the current request if it is sampled.
+        (return) int: Traced bytes at the start, or None if not sampled.
+        """
+        if random.random() >= self.sampleRate or not self._sampling.acquire(blocking=False):
+            return None
+        with self._lock:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start(self.frames)
+            return tracemalloc.get_traced_memory()[0]
+
+    def finishRequest(self, route, startBytes):
+        """Record a sampled request's peak and retained bytes under its route.
+        (arg) route-str: "METHOD /rule" of the request.
+        (arg) startBytes-int: Value returned by startRequest.
+        (return) None
+        """
+        try:
+            with self._lock:
+                current, peak = tracemalloc.get_traced_memory()
+                if not self._persistent:
+                    tracemalloc.stop()
+                entry = self.routes.setdefault(route, [0, 0, 0, 0, 0])
+                peakBytes, retained = max(0, peak - startBytes), current - startBytes
+                entry[0] += 1
+                entry[1] += peakBytes
+                entry[2] = max(entry[2], peakBytes)
+                entry[3] += retained
+                entry[4] = max(entry[4], retained)
+        finally:
+            self._sampling.release()
+
+    def routeStats(self):
+        """Return the sampled figures per route, largest mean peak first.
+        (return) dict: Route to samples and peak/retained bytes.
+        """
+        with self._lock:
+            items = [(route, list(entry)) for route, entry in self.routes.items()]
+        items.sort(key=lambda item: item[1][1] / item[1][0], reverse=True)
+        return {route: {
+            "samples": samples,
+            "peak_bytes_mean": peakTotal // samples,
+            "peak_bytes_max": peakMax,
+            "retained_bytes_mean": retainedTotal // samples,
+            "retained_bytes_max": retainedMax
+        } for route, (samples, peakTotal, peakMax, retainedTotal, retainedMax) in items}
+
+    def takeSnapshot(self):
+        """Snapshot current allocations, starting persistent tracing if needed.
+        Allocations made before tracing started are invisible, so the first
+        snapshot is a baseline for the next one.
+        (return) int: Bytes traced in the new snapshot.
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+            self._persistent = True
+            snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+            self.snapshots = (self.snapshots + [snapshot])[-2:]
+        return sum(stat.size for stat in snapshot.statistics("filename"))
+
+    def diff(self, limit=20):
+        """Return the allocation sites that grew most between the last two snapshots.
+        (arg) limit-int: Maximum number of sites.
+        (return) list[dict]: Sites with size and count changes; None with fewer than two snapshots.
+        """
+        with self._lock:
+            if len(self.snapshots) < 2:
+                return None
+            previous, latest = self.snapshots
+        stats = latest.compare_to(previous, "lineno")
+        return [{
+            "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_diff": stat.size_diff,
+            "size": stat.size,
+            "count_diff": stat.count_diff,
+            "count": stat.count
+        } for stat in stats[:limit]]
+
+    def reset(self):
+        """Drop snapshots and route figures and stop persistent tracing.
+        (return) None
+        """
+        with self._lock:
+            self.snapshots = []
+            self.routes.clear()
+            if self._persistent and tracemalloc.is_tracing() and not self._sampling.locked():
+                tracemalloc.stop()
+            self._persistent = False
+
+
+def configureMemoryProfiling(app):
+    """Sample request allocations when MEMORY_PROFILING is on.
+    (arg) app-Flask: The application.
+    (return) MemoryProfiler: The profiler, or None if disabled.
+    """
+    if not app.config["MEMORY_PROFILING"]:
+        return None
+    profiler = MemoryProfiler(app.config["MEMORY_SAMPLE_RATE"], app.config["MEMORY_TRACE_FRAMES"])
+    app.extensions["memoryProfiler"] = profiler
+
+    @app.before_request
+    def startSample():
+        """Trace this request if the profiler samples it."""
+        if request.url_rule is None or request.blueprint == "debug":
+            return None
+        g.memoryStart = profiler.startRequest()
+        return None
+
+    @app.teardown_request
+    def finishSample(error=None):
+        """Record a traced request's allocations."""
+        start = g.pop("memoryStart", None)
+        if start is not None:
+            profiler.finishRequest(f"{request.method} {request.url_rule.rule}", start)
+
+    return profiler
@@ -1,30 +1,106 @@
+import json
+import threading
+
 from .database import db
-from datetime import datetime
-from sqlalchemy import String, Text, Integer, Boolean, CheckConstraint, Table, Column, \
-    ForeignKey, DateTime, UniqueConstraint
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from .groupcommit import getGroupCommitter
+from .lookups import lookup
+from datetime import date, datetime, timedelta
+from sqlalchemy import String, Text, Integer, Float, Boolean, CheckConstraint, Table, Column, \
+    ForeignKey, DateTime, Date, Index, UniqueConstraint, event, func, select, inspect, update, delete, \
+    column, or_, case
+from sqlalchemy.orm import Mapped, Session, mapped_column, relationship
 from .validation import (validate_string, validate_integer, validate_boolean, 
                        validate_club_code, validate_tags, validate_email, sanitize_html)
 
+# Association rows are written before their club during creation, so the
+# checks are deferred to commit; deleting either side cascades in the database
 clubTagAssociation = Table(
     'club_tag_association', db.metadata,
-    Column('club_code', String, ForeignKey('club.code'), primary_key=True),
-    Column('tag_name', String, ForeignKey('tag.name'), primary_key=True)
+    Column('club_code', String, ForeignKey('club.code', ondelete="CASCADE",
+                                           deferrable=True, initially="DEFERRED"),
+           primary_key=True),
+    Column('tag_name', String, ForeignKey('tag.name', ondelete="CASCADE",
+                                          deferrable=True, initially="DEFERRED"),
+           primary_key=True)
 )
 
 userClubAssociation = Table(
     'user_club_association', db.metadata,
-    Column('user_id', Integer, ForeignKey('user.id'),
+    Column('user_id', Integer, ForeignKey('user.id', ondelete="CASCADE",
+                                          deferrable=True, initially="DEFERRED"),
+           primary_key=True),
+    Column('club_code', String, ForeignKey('club.code', ondelete="CASCADE",
+                                           deferrable=True, initially="DEFERRED"),
            primary_key=True),
-    Column('club_code', String, ForeignKey('club.code'), primary_key=True)
+    # Pages a club's favoriting users in user id order without touching the user table
+    Index('ix_user_club_association_club_user', 'club_code', 'user_id')
 )
 
 
+class TagDictionary:
+    """Process-wide cache of the tag names that exist, one set per database.
+    Names created in a transaction are published only after it commits, so a
+    rollback never leaves the cache claiming a tag that was not written.
+    """
+
+    def __init__(self):
+        """Create an empty cache; each database's names load on first use."""
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Forget every cached name, e.g. after the tag table is recreated.
+        (return) None
+        """
+        with self._lock:
+            self._names.clear()
+
+    def missing(self, session, names: set) -> set:
+        """Return the names with no tag row, asking the database only about cache misses.
+        (arg) session-Session: The session whose database is checked.
+        (arg) names-set[str]: Sanitized tag names.
+        (return) set[str]: Names that still have to be created.
+        """
+        key = str(db.engine.url)
+        with self._lock:
+            known = self._names.get(key)
+        if known is None:
+            known = set(session.scalars(select(Tag.name)))
+            with self._lock:
+                self._names.setdefault(key, set()).update(known)
+        unknown = set(names) - known
+        if unknown:
+            # Another process may have created them since the cache was loaded
+            found = set(session.scalars(select(Tag.name).where(Tag.name.in_(unknown))))
+            self.publish(key, found)
+            unknown -= found
+        return unknown
+
+    def publish(self, key: str, names: set):
+        """Add committed tag names to a database's cache.
+        (arg) key-str: The database URL the names belong to.
+        (arg) names-set[str]: Names known to exist.
+        (return) None
+        """
+        if not names:
+            return
+        with self._lock:
+            if key in self._names:
+                self._names[key].update(names)
+
+
+# Shared by every request and thread in this process
+tagDictionary = TagDictionary()
+
+
 class Tag(db.Model):
     __tablename__ = 'tag'
     name = mapped_column(String, primary_key=True)
+    # Number of clubs with this tag, kept current by Club.applyTagChanges
+    clubCount: Mapped[int] = mapped_column(Integer, nullable=False, default=0,
+                                           server_default="0", index=True)
     clubs = relationship("Club", secondary=clubTagAssociation,
-                         back_populates="tags")
+                         back_populates="tags", passive_deletes=True)
 
     def __repr__(self):
         """Return a string representation of the Tag instance.
@@ -52,6 +128,58 @@ class Tag(db.Model):
         if isinstance(newTag, Tag):
             db.session.add(newTag)
             db.session.flush()
+            cls.noteCreated(db.session, {newTag.name})
+
+    @classmethod
+    def ensureExist(cls, names: set):
+        """Create the tags that do not exist yet with a single INSERT.
+        (arg) names-set[str]: Sanitized tag names.
+        (return) None
+        """
+        missing = tagDictionary.missing(db.session, names)
+        if missing:
+            db.session.execute(cls.__table__.insert(),
+                               [{"name": name, "clubCount": 0} for name in sorted(missing)])
+            cls.noteCreated(db.session, missing)
+
+    @staticmethod
+    def noteCreated(session, names: set):
+        """Remember tags created in this transaction for the tag dictionary.
+        (arg) session-Session: The session that created them.
+        (arg) names-set[str]: The new tag names.
+        (return) None
+        """
+        created = session.info.setdefault("createdTags", (str(db.engine.url), set()))
+        created[1].update(names)
+
+    @classmethod
+    def adjustClubCount(cls, tagNames, delta: int):
+        """Add delta to the club count of one or more tags in a single UPDATE.
+        (arg) tagNames-str|set[str]: The tag or tags whose count changes.
+        (arg) delta-int: Clubs gained (positive) or lost (negative).
+        (return) None
+        """
+        if isinstance(tagNames, str):
+            tagNames = {tagNames}
+        if tagNames:
+            db.session.execute(update(cls).where(cls.name.in_(tagNames))
+                               .values(clubCount=cls.clubCount + delta))
+
+    @classmethod
+    def recountClubs(cls, session):
+        """Recompute every tag's club count from the association table.
+        (arg) session-Session: The session to run the update in.
+        (return) None
+        """
+        counts = select(func.count()).where(
+            clubTagAssociation.c.tag_name == cls.name).scalar_subquery()
+        session.execute(update(cls).values(clubCount=counts))
+
+    def toJson(self) -> dict:
+        """Return a JSON-serializable dictionary of the Tag.
+        (return) dict: Dictionary with keys "name" and "club_count".
+        """
+        return {"name": self.name, "club_count": self.clubCount}
 
 
 class Club(db.Model):
@@ -63,17 +191,25 @@ class Club(db.Model):
     undergraduatesAllowed: Mapped[bool] = mapped_column(Boolean)
     graduatesAllowed: Mapped[bool] = mapped_column(Boolean)
     dateCreated: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Users who favorited the club, adjusted by every favorite change in User
+    favorites_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0,
+                                                 server_default="0")
+    # Expressions rather than SQL strings, so mixed-case names are quoted and
+    # char_length is spelled for each backend
     __table_args__ = (
-        CheckConstraint('memberCount >= 0', name="Positive member count"),
-        CheckConstraint('LENGTH(name) >= 3', name="No short name length"),
-        CheckConstraint('undergraduatesAllowed OR graduatesAllowed',
+        CheckConstraint(column('memberCount') >= 0, name="Positive member count"),
+        CheckConstraint(func.char_length(column('name')) >= 3, name="No short name length"),
+        CheckConstraint(or_(column('undergraduatesAllowed', Boolean),
+                            column('graduatesAllowed', Boolean)),
                         name='check_at_least_one_student_type_allowed')
     )
+    # passive_deletes leaves unloaded children to ON DELETE CASCADE
     tags = relationship("Tag", secondary=clubTagAssociation,
-                        back_populates="clubs")
+                        back_populates="clubs", passive_deletes=True)
     usersFavorited = relationship("User", secondary=userClubAssociation,
-                                  back_populates="favoriteClubs")
-    reviews = relationship("Review", back_populates="club", cascade="all, delete-orphan")
+                                  back_populates="favoriteClubs", passive_deletes=True)
+    reviews = relationship("Review", back_populates="club", cascade="all, delete-orphan",
+                           passive_deletes=True)
 
     def handleTags(self, tagNames: set):
         """Associate the provided tag names with this Club instance.
@@ -82,18 +218,81 @@ class Club(db.Model):
         (return) None
         """
         validate_tags(tagNames)
-        for tagName in tagNames:
-            sanitized_name = sanitize_html(tagName.strip())
-            tag = Tag.query.filter_by(name=sanitized_name).first()
-            if not tag:
-                tag = Tag.createTag(sanitized_name)
-                Tag.addTagToDb(tag)
-            if not db.session.query(clubTagAssociation).filter_by(
-                club_code=self.code, tag_name=tag.name).first():
-                db.session.execute(
-                    clubTagAssociation.insert().values(
-                        club_code=self.code, tag_name=tag.name)
-                )
+        self.applyTagChanges(added={sanitize_html(name.strip()) for name in tagNames})
+
+    def setTags(self, tagNames: set):
+        """Replace the club's tags with exactly the provided names.
+        (arg) tagNames-set[str]: The tag names the club should end up with.
+        (return) None
+        """
+        validate_tags(tagNames)
+        wanted = {sanitize_html(name.strip()) for name in tagNames}
+        current = self.currentTagNames()
+        self.applyTagChanges(added=wanted - current, removed=current - wanted, current=current)
+
+    def currentTagNames(self) -> set:
+        """Return the names of the tags linked to this club in the database.
+        (return) set[str]: Tag names; empty for a club that was never saved.
+        """
+        state = inspect(self)
+        if not (state.persistent or state.pending):
+            return set()
+        return set(db.session.scalars(select(clubTagAssociation.c.tag_name)
+                                      .where(clubTagAssociation.c.club_code == self.code)))
+
+    def applyTagChanges(self, added=frozenset(), removed=frozenset(), current=None):
+        """Link and unlink tags with at most one DELETE and one INSERT.
+        Missing tags are created through the tag dictionary and each affected
+        tag's club count is adjusted in one UPDATE per direction.
+        (arg) added-set[str]: Sanitized names to link.
+        (arg) removed-set[str]: Sanitized names to unlink.
+        (arg) current-set[str]: Names already linked, if the caller has read them.
+        (return) set[str]: The names that were actually unlinked.
+        """
+        if current is None:
+            current = self.currentTagNames()
+        added = set(added) - current
+        removed = set(removed) & current
+        if removed:
+            db.session.execute(delete(clubTagAssociation).where(
+                clubTagAssociation.c.club_code == self.code,
+                clubTagAssociation.c.tag_name.in_(removed)))
+            Tag.adjustClubCount(removed, -1)
+        if added:
+            Tag.ensureExist(added)
+            db.session.execute(clubTagAssociation.insert(),
+                               [{"club_code": self.code, "tag_name": name}
+                                for name in sorted(added)])
+            Tag.adjustClubCount(added, 1)
+        if added or removed:
+            state = inspect(self)
+            if state.persistent and "tags" not in state.unloaded:
+                db.session.expire(self, ["tags"])
+            ChangeEvent.record(db.session, self, "updated")
+        return removed
+
+    @classmethod
+    def adjustFavoritesCount(cls, clubCodes, delta: int, session=None):
+        """Add delta to the favorite count of each club.
+        (arg) clubCodes-set[str]: Codes of the clubs gaining or losing a favorite.
+        (arg) delta-int: Favorites gained (positive) or lost (negative) per club.
+        (arg) session-Session: Session to write through; defaults to db.session.
+        (return) None
+        """
+        if clubCodes:
+            (session or db.session).execute(
+                update(cls).where(cls.code.in_(clubCodes))
+                .values(favorites_count=cls.favorites_count + delta))
+
+    @classmethod
+    def recountFavorites(cls, session):
+        """Recompute every club's favorite count from the association table.
+        (arg) session-Session: The session to run the update in.
+        (return) None
+        """
+        counts = select(func.count()).where(
+            userClubAssociation.c.club_code == cls.code).scalar_subquery()
+        session.execute(update(cls).values(favorites_count=counts))
 
     @classmethod
     def fromLegacyDbJson(cls, jsonData: dict):
@@ -202,7 +401,7 @@ class Club(db.Model):
             raise ValueError("At least one student type must be allowed")
         
         # Check for duplicate club code
-        existing_club = cls.query.filter_by(code=code.strip().lower()).first()
+        existing_club = lookup(cls, code=code.strip().lower())
         if existing_club:
             raise ValueError(f"Club with code '{code}' already exists")
         
@@ -246,7 +445,7 @@ class Club(db.Model):
         """Return a JSON-serializable dictionary of the Club.
         (return) dict: Dictionary with keys "code", "name", "description",
         "tags", "memberCount", "undergraduatesAllowed", "graduatesAllowed", "dateCreated",
-        "reviews_count", and "average_rating".
+        "favorites_count", "reviews_count", and "average_rating".
         """
         return {
             "code": self.code,
@@ -257,6 +456,7 @@ class Club(db.Model):
             "undergraduatesAllowed": self.undergraduatesAllowed,
             "graduatesAllowed": self.graduatesAllowed,
             "dateCreated": self.dateCreated.isoformat() if self.dateCreated else None,
+            "favorites_count": self.favorites_count or 0,
             "reviews_count": len(self.reviews),
             "average_rating": self.get_average_rating()
         }
@@ -291,9 +491,15 @@ class Club(db.Model):
         (return) str: The removed tag name; None if not found.
         """
         validate_string(removedTag, "Tag", min_length=2, max_length=50)
-        tag = Tag.query.filter_by(name=removedTag).first()
-        if tag and tag in self.tags:
-            self.tags.remove(tag)
+        name = sanitize_html(removedTag.strip())
+        if self.applyTagChanges(removed={name}):
+            return name
+
+    def clearTags(self):
+        """Remove every tag from the club.
+        (return) None
+        """
+        self.setTags(set())
 
     def updateMemberCount(self, newCount: int):
         """Update member count with validation.
@@ -351,28 +557,89 @@ class User(db.Model):
     username: Mapped[str] = mapped_column(String, nullable=False, unique=True)
     email: Mapped[str] = mapped_column(String, nullable=False, unique=True)
     favoriteClubs = relationship("Club", secondary=userClubAssociation,
-                                 back_populates="usersFavorited")
-    reviews_made = relationship("Review", back_populates="user", cascade="all, delete-orphan")
+                                 back_populates="usersFavorited", passive_deletes=True)
+    reviews_made = relationship("Review", back_populates="user", cascade="all, delete-orphan",
+                                passive_deletes=True)
 
-    def handleFavorite(self, favoriteNames: set):
+    def handleFavorite(self, favoriteNames: set, session=None):
         """Associate provided club codes as user's favorites.
+        Codes of clubs that do not exist are skipped.
         (arg) favoriteNames-set[str]: Set of club codes.
+        (arg) session-Session: Session to write through; defaults to db.session.
         (return) None
         """
         if not isinstance(favoriteNames, set):
             raise TypeError("Favorites must be a set")
-        
-        for clubCode in favoriteNames:
+        session = session or db.session
+        self.applyFavoriteChanges(added=self._existingClubCodes(favoriteNames, session),
+                                  session=session)
+
+    def setFavorites(self, favoriteNames: set, session=None):
+        """Replace the user's favorites with exactly the provided club codes.
+        (arg) favoriteNames-set[str]: Codes the user should end up with; unknown clubs are skipped.
+        (arg) session-Session: Session to write through; defaults to db.session.
+        (return) None
+        """
+        if not isinstance(favoriteNames, set):
+            raise TypeError("Favorites must be a set")
+        session = session or db.session
+        wanted = self._existingClubCodes(favoriteNames, session)
+        current = self.currentFavoriteCodes(session)
+        self.applyFavoriteChanges(added=wanted - current, removed=current - wanted,
+                                  session=session, current=current)
+
+    @staticmethod
+    def _existingClubCodes(clubCodes, session):
+        """Validate club codes and return those of clubs that exist, in one query."""
+        for clubCode in clubCodes:
             validate_club_code(clubCode)
-            club = Club.query.filter_by(code=clubCode).first()
-            if not club:
-                continue
-            if not db.session.query(userClubAssociation).filter_by(
-                club_code=club.code, user_id=self.id).first():
-                db.session.execute(
-                    userClubAssociation.insert().values(
-                        club_code=club.code, user_id=self.id)
-                )
+        if not clubCodes:
+            return set()
+        return set(session.scalars(select(Club.code).where(Club.code.in_(clubCodes))))
+
+    def currentFavoriteCodes(self, session=None) -> set:
+        """Return the codes of the clubs this user has favorited in the database.
+        (arg) session-Session: Session to read through; defaults to db.session.
+        (return) set[str]: Club codes; empty for a user that was never saved.
+        """
+        if self.id is None:
+            return set()
+        return set((session or db.session).scalars(
+            select(userClubAssociation.c.club_code)
+            .where(userClubAssociation.c.user_id == self.id)))
+
+    def applyFavoriteChanges(self, added=frozenset(), removed=frozenset(), session=None,
+                             current=None):
+        """Link and unlink favorite clubs with at most one DELETE and one INSERT.
+        Each affected club's favorites_count is adjusted in one UPDATE per direction.
+        (arg) added-set[str]: Codes of existing clubs to favorite.
+        (arg) removed-set[str]: Codes to unfavorite.
+        (arg) session-Session: Session to write through; defaults to db.session.
+        (arg) current-set[str]: Codes already favorited, if the caller has read them.
+        (return) set[str]: The codes that were actually unfavorited.
+        """
+        session = session or db.session
+        if current is None:
+            current = self.currentFavoriteCodes(session)
+        added = set(added) - current
+        removed = set(removed) & current
+        if removed:
+            session.execute(delete(userClubAssociation).where(
+                userClubAssociation.c.user_id == self.id,
+                userClubAssociation.c.club_code.in_(removed)))
+            Club.adjustFavoritesCount(removed, -1, session)
+        if added:
+            session.execute(userClubAssociation.insert(),
+                            [{"user_id": self.id, "club_code": code} for code in sorted(added)])
+            Club.adjustFavoritesCount(added, 1, session)
+        if added or removed:
+            state = inspect(self)
+            if state.persistent and "favoriteClubs" not in state.unloaded:
+                session.expire(self, ["favoriteClubs"])
+            # Lets the recommendation index refresh this user after commit
+            session.info.setdefault("favoritesChanged", set()).add(self.id)
+            ChangeEvent.record(session, self, "updated")
+        return removed
 
     @classmethod
     def createNewUser(cls, username: str, email: str, favorites: set[str]):
@@ -391,15 +658,15 @@ class User(db.Model):
             raise TypeError("Favorites must be a set")
         
         # Check for duplicates
-        if cls.query.filter_by(username=username.strip()).first():
+        if lookup(cls, username=username.strip()):
             raise ValueError(f"Username '{username}' already exists")
-        if cls.query.filter_by(email=email.strip().lower()).first():
+        if lookup(cls, email=email.strip().lower()):
             raise ValueError(f"Email '{email}' already exists")
         
         # Validate favorite club codes exist
         for club_code in favorites:
             validate_club_code(club_code)
-            if not Club.query.filter_by(code=club_code).first():
+            if not lookup(Club, code=club_code):
                 raise ValueError(f"Club with code '{club_code}' does not exist")
         
         # Sanitize inputs
@@ -413,20 +680,33 @@ class User(db.Model):
     @classmethod
     def addUserToDb(cls, newUser):
         """Add a User instance to the database if valid.
+        With group commit on, the insert is committed by the writer thread.
         (arg) newUser-User: The User instance to add.
         (return) User: The added User instance.
         """
         if isinstance(newUser, User):
-            db.session.add(newUser)
-            db.session.flush()
-            
-            if hasattr(newUser, '_pending_favorites'):
-                newUser.handleFavorite(newUser._pending_favorites)
-                delattr(newUser, '_pending_favorites')
-            
+            committer = getGroupCommitter()
+            if committer is not None:
+                # The request's reads ran on the writer; hand it back to the writer thread
+                db.session.commit()
+                committer.submit(newUser._insertWith)
+                db.session.add(newUser)
+                return newUser
+            newUser._insertWith(db.session)
             db.session.commit()
             return newUser
 
+    def _insertWith(self, session):
+        """Insert this user and its pending favorites through a session.
+        (arg) session-Session: The session to write through.
+        (return) None
+        """
+        session.add(self)
+        session.flush()
+        if hasattr(self, '_pending_favorites'):
+            self.handleFavorite(self._pending_favorites, session)
+            delattr(self, '_pending_favorites')
+
     def toJson(self) -> dict:
         """Return a JSON-serializable dict of the User.
         (return) dict: Dictionary with "id", "username", "email", "favorites", and "reviews_count".
@@ -448,7 +728,7 @@ class User(db.Model):
         validate_email(newEmail)
         
         # Check for duplicate
-        existing_user = User.query.filter_by(email=newEmail.strip().lower()).first()
+        existing_user = lookup(User, email=newEmail.strip().lower())
         if existing_user and existing_user.id != self.id:
             raise ValueError(f"Email '{newEmail}' already exists")
         
@@ -462,15 +742,15 @@ class User(db.Model):
         validate_club_code(newFavorite)
         
         # Check if club exists
-        club = Club.query.filter_by(code=newFavorite).first()
-        if not club:
+        if not self._existingClubCodes({newFavorite}, db.session):
             raise ValueError(f"Club with code '{newFavorite}' does not exist")
         
         # Check if already favorited
-        if club in self.favoriteClubs:
+        current = self.currentFavoriteCodes()
+        if newFavorite in current:
             raise ValueError(f"Club '{newFavorite}' is already in favorites")
         
-        self.handleFavorite({newFavorite})
+        self.applyFavoriteChanges(added={newFavorite}, current=current)
 
     def removeFavorite(self, removedFavoriteCode: str) -> str:
         """Remove the specified club from favorites.
@@ -478,9 +758,8 @@ class User(db.Model):
         (return) str: The removed club code; None if not found.
         """
         validate_club_code(removedFavoriteCode)
-        club = Club.query.filter_by(code=removedFavoriteCode).first()
-        if club in self.favoriteClubs:
-            self.favoriteClubs.remove(club)
+        if self.applyFavoriteChanges(removed={removedFavoriteCode}):
+            return removedFavoriteCode
 
     def updateUsername(self, newUsername: str):
         """Update username with validation.
@@ -490,7 +769,7 @@ class User(db.Model):
         validate_string(newUsername, "Username", min_length=3, max_length=50)
         
         # Check for duplicate
-        existing_user = User.query.filter_by(username=newUsername.strip()).first()
+        existing_user = lookup(User, username=newUsername.strip())
         if existing_user and existing_user.id != self.id:
             raise ValueError(f"Username '{newUsername}' already exists")
         
@@ -506,9 +785,12 @@ class User(db.Model):
 class Review(db.Model):
     __tablename__ = 'review'
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('user.id'), nullable=False)
-    club_code: Mapped[str] = mapped_column(String, ForeignKey('club.code'), nullable=False)
-    rating: Mapped[int] = mapped_column(Integer, nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('user.id', ondelete="CASCADE"),
+                                         nullable=False)
+    club_code: Mapped[str] = mapped_column(String, ForeignKey('club.code', ondelete="CASCADE"),
+                                           nullable=False, index=True)
+    # active_history keeps the old rating on edits so rollups can move it
+    rating: Mapped[int] = mapped_column(Integer, nullable=False, active_history=True)
     title: Mapped[str] = mapped_column(String(100), nullable=False)
     text: Mapped[str] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -520,8 +802,8 @@ class Review(db.Model):
     
     # Constraints
     __table_args__ = (
-        CheckConstraint('rating >= 1 AND rating <= 10', name='rating_range'),
-        CheckConstraint('LENGTH(title) >= 5', name='title_min_length'),
+        CheckConstraint(column('rating').between(1, 10), name='rating_range'),
+        CheckConstraint(func.char_length(column('title')) >= 5, name='title_min_length'),
         UniqueConstraint('user_id', 'club_code', name='one_review_per_user_per_club')
     )
 
@@ -544,16 +826,16 @@ class Review(db.Model):
         validate_string(text, "Text", min_length=0, max_length=2000, required=False)
         
         # Check if user and club exist
-        user = User.query.filter_by(id=user_id).first()
+        user = lookup(User, id=user_id)
         if not user:
             raise ValueError(f"User with ID {user_id} does not exist")
         
-        club = Club.query.filter_by(code=club_code).first()
+        club = lookup(Club, code=club_code)
         if not club:
             raise ValueError(f"Club with code '{club_code}' does not exist")
         
         # Check for duplicate review
-        existing_review = cls.query.filter_by(user_id=user_id, club_code=club_code).first()
+        existing_review = lookup(cls, user_id=user_id, club_code=club_code)
         if existing_review:
             raise ValueError(f"User has already reviewed club '{club_code}'")
         
@@ -574,10 +856,17 @@ class Review(db.Model):
     @classmethod 
     def addReviewToDb(cls, newReview):
         """Add review to database if valid.
+        With group commit on, the insert is committed by the writer thread.
         (arg) newReview-Review: The Review instance to add.
         (return) Review: The added Review instance.
         """
         if isinstance(newReview, Review):
+            committer = getGroupCommitter()
+            if committer is not None:
+                db.session.commit()
+                committer.submit(lambda session: session.add(newReview))
+                db.session.add(newReview)
+                return newReview
             db.session.add(newReview)
             db.session.commit()
             return newReview
@@ -631,3 +920,391 @@ class Review(db.Model):
         (return) str: String in the format "<Review id: title>".
         """
         return f"<Review {self.id}: {self.title}>"
+
+
+ROLLUP_BUCKETS = ("day", "week", "month")
+
+
+def bucketStart(bucket: str, day: date) -> date:
+    """Return the first day of the rollup bucket containing a date.
+    (arg) bucket-str: "day", "week" (starting Monday) or "month".
+    (arg) day-date: The date to bucket.
+    (return) date: The bucket's first day.
+    """
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+class ReviewRollup(db.Model):
+    """Per-club review counts and rating histograms per day, week and month."""
+    __tablename__ = 'review_rollup'
+    club_code: Mapped[str] = mapped_column(String, ForeignKey('club.code', ondelete="CASCADE"),
+                                           primary_key=True)
+    bucket: Mapped[str] = mapped_column(String(5), primary_key=True)
+    bucket_start: Mapped[date] = mapped_column(Date, primary_key=True)
+    review_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rating_sum: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rating_1: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rating_2: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rating_3: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rating_4: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rating_5: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rating_6: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rating_7: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rating_8: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rating_9: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rating_10: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    @classmethod
+    def applyDelta(cls, connection, clubCode: str, createdAt: datetime, rating: int, sign: int):
+        """Add (sign=1) or remove (sign=-1) one review from every bucket it falls in.
+        (arg) connection-Connection: Connection of the flush writing the review.
+        (arg) clubCode-str: The reviewed club.
+        (arg) createdAt-datetime: When the review was created.
+        (arg) rating-int: The review's rating.
+        (arg) sign-int: 1 to add the review, -1 to remove it.
+        (return) None
+        """
+        table = cls.__table__
+        ratingColumn = table.c[f"rating_{rating}"]
+        for bucket in ROLLUP_BUCKETS:
+            start = bucketStart(bucket, createdAt.date())
+            key = ((table.c.club_code == clubCode) & (table.c.bucket == bucket)
+                   & (table.c.bucket_start == start))
+            updated = connection.execute(table.update().where(key).values({
+                table.c.review_count: table.c.review_count + sign,
+                table.c.rating_sum: table.c.rating_sum + sign * rating,
+                ratingColumn: ratingColumn + sign,
+            }))
+            if updated.rowcount == 0 and sign > 0:
+                connection.execute(table.insert().values({
+                    "club_code": clubCode, "bucket": bucket, "bucket_start": start,
+                    "review_count": 1, "rating_sum": rating, ratingColumn.name: 1,
+                    **{f"rating_{i}": 0 for i in range(1, 11) if i != rating},
+                }))
+
+    @classmethod
+    def rebuild(cls, session, clubsPerQuery=200):
+        """Recompute every rollup row from the review table.
+        Needed after bulk loads that bypass the ORM. Ratings are counted per
+        club and day in SQL and the day rows folded into every bucket, a chunk
+        of clubs at a time, so memory stays bounded by the chunk.
+        (arg) session-Session: The session to rebuild through.
+        (arg) clubsPerQuery-int: Clubs aggregated per query.
+        (return) int: Number of rollup rows written.
+        """
+        day = func.date(Review.created_at)
+        histogram = [func.sum(case((Review.rating == i, 1), else_=0)) for i in range(1, 11)]
+        session.execute(cls.__table__.delete())
+        codes = session.scalars(select(Club.code).order_by(Club.code)).all()
+        written = 0
+        for first in range(0, len(codes), clubsPerQuery):
+            totals = {}
+            rows = session.execute(
+                select(Review.club_code, day, *histogram)
+                .where(Review.club_code.in_(codes[first:first + clubsPerQuery]))
+                .group_by(Review.club_code, day))
+            for clubCode, reviewDay, *counts in rows:
+                if isinstance(reviewDay, str):
+                    reviewDay = date.fromisoformat(reviewDay)
+                for bucket in ROLLUP_BUCKETS:
+                    key = (clubCode, bucket, bucketStart(bucket, reviewDay))
+                    total = totals.get(key)
+                    if total is None:
+                        totals[key] = list(counts)
+                    else:
+                        for i, count in enumerate(counts):
+                            total[i] += count
+            values = [{"club_code": clubCode, "bucket": bucket, "bucket_start": start,
+                       "review_count": sum(counts),
+                       "rating_sum": sum(i * count for i, count in enumerate(counts, start=1)),
+                       **{f"rating_{i}": count for i, count in enumerate(counts, start=1)}}
+                      for (clubCode, bucket, start), counts in totals.items()]
+            if values:
+                session.execute(cls.__table__.insert(), values)
+                written += len(values)
+        return written
+
+    def histogram(self) -> dict:
+        """Return the rating histogram of this bucket.
+        (return) dict: Rating ("1"-"10") to number of reviews.
+        """
+        return {str(i): getattr(self, f"rating_{i}") for i in range(1, 11)}
+
+    def toJson(self) -> dict:
+        """Return a JSON-serializable dictionary of the bucket.
+        (return) dict: Dictionary with "bucket_start", "count", "average_rating"
+        and "histogram".
+        """
+        return {
+            "bucket_start": self.bucket_start.isoformat(),
+            "count": self.review_count,
+            "average_rating": round(self.rating_sum / self.review_count, 2) if self.review_count else 0.0,
+            "histogram": self.histogram()
+        }
+
+    def __repr__(self):
+        """Return a string representation of the ReviewRollup.
+        (return) str: String in the format "<ReviewRollup club bucket start>".
+        """
+        return f"<ReviewRollup {self.club_code} {self.bucket} {self.bucket_start}>"
+
+
+class ChangeEvent(db.Model):
+    """Append-only log of created, updated and deleted clubs, users and reviews.
+    The id is the feed cursor; AUTOINCREMENT keeps ids from ever being reused.
+    """
+    __tablename__ = 'change_log'
+    __table_args__ = {"sqlite_autoincrement": True}
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    entity: Mapped[str] = mapped_column(String(10), nullable=False)
+    entity_key: Mapped[str] = mapped_column(String, nullable=False)
+    action: Mapped[str] = mapped_column(String(10), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+    @staticmethod
+    def keyOf(obj):
+        """Return the entity name and key of a logged model instance.
+        (arg) obj-Club|User|Review: The changed object.
+        (return) tuple: (entity, key as str), or None for other models.
+        """
+        if isinstance(obj, Club):
+            return "club", obj.code
+        if isinstance(obj, User):
+            return "user", str(obj.id)
+        if isinstance(obj, Review):
+            return "review", str(obj.id)
+        return None
+
+    @classmethod
+    def record(cls, session, obj, action: str):
+        """Append a change to the log in the session's current transaction.
+        Updates to objects already logged in the transaction are skipped, so
+        repeated flushes produce one event per object.
+        (arg) session-Session: The session making the change.
+        (arg) obj-Club|User|Review: The changed object; must be persistent for updates.
+        (arg) action-str: "created", "updated" or "deleted".
+        (return) None
+        """
+        entityKey = cls.keyOf(obj)
+        if entityKey is None or (action == "updated" and not inspect(obj).persistent):
+            return
+        logged = session.info.setdefault("loggedChanges", set())
+        if action == "updated" and entityKey in logged:
+            return
+        logged.add(entityKey)
+        session.execute(cls.__table__.insert().values(
+            entity=entityKey[0], entity_key=entityKey[1], action=action,
+            created_at=datetime.utcnow()))
+        session.info["changesLogged"] = True
+
+    @classmethod
+    def recordDeletes(cls, session, entity: str, keys):
+        """Append deletes made outside the ORM, e.g. bulk review deletes, to the log.
+        (arg) session-Session: The session making the change.
+        (arg) entity-str: "club", "user" or "review".
+        (arg) keys-iterable: Keys of the deleted rows.
+        (return) None
+        """
+        now = datetime.utcnow()
+        rows = [{"entity": entity, "entity_key": str(key), "action": "deleted", "created_at": now}
+                for key in keys]
+        if not rows:
+            return
+        session.execute(cls.__table__.insert(), rows)
+        session.info.setdefault("loggedChanges", set()).update((entity, row["entity_key"]) for row in rows)
+        session.info["changesLogged"] = True
+
+    def toJson(self) -> dict:
+        """Return a JSON-serializable dictionary of the change.
+        (return) dict: Dictionary with keys "cursor", "entity", "key", "action" and "at".
+        """
+        return {
+            "cursor": self.id,
+            "entity": self.entity,
+            "key": self.entity_key,
+            "action": self.action,
+            "at": self.created_at.isoformat()
+        }
+
+    def __repr__(self):
+        """Return a string representation of the ChangeEvent instance.
+        (return) str: String in the format "<ChangeEvent id action entity key>".
+        """
+        return f"<ChangeEvent {self.id} {self.action} {self.entity} {self.entity_key}>"
+
+
+# Lifecycle of a background job
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+
+class Job(db.Model):
+    """A maintenance job run by the background job runner, with its progress and outcome."""
+    __tablename__ = 'job'
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(40), nullable=False)
+    params: Mapped[str] = mapped_column(Text, nullable=False, default="{}")
+    status: Mapped[str] = mapped_column(String(10), nullable=False, default="queued", index=True)
+    progress: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    message: Mapped[str] = mapped_column(Text, nullable=True)
+    result: Mapped[str] = mapped_column(Text, nullable=True)
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    # "host:pid" of the process whose runner took the job
+    owner: Mapped[str] = mapped_column(String(64), nullable=True)
+
+    @classmethod
+    def createJob(cls, kind: str, params: dict):
+        """Create a queued job.
+        (arg) kind-str: Name of a registered job kind.
+        (arg) params-dict: JSON-serializable job parameters.
+        (return) Job: The new, unsaved job.
+        """
+        return cls(kind=kind, params=json.dumps(params or {}, sort_keys=True), status="queued",
+                   progress=0.0, created_at=datetime.utcnow())
+
+    def parameters(self) -> dict:
+        """Return the job's parameters.
+        (return) dict
+        """
+        return json.loads(self.params)
+
+    @property
+    def finished(self) -> bool:
+        """Return whether the job has succeeded or failed."""
+        return self.status in ("succeeded", "failed")
+
+    def toJson(self) -> dict:
+        """Return a JSON-serializable dictionary of the job.
+        (return) dict: Dictionary with keys "id", "kind", "params", "status",
+        "progress", "message", "result", "error" and the timestamps.
+        """
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.parameters(),
+            "status": self.status,
+            "progress": round(self.progress, 4),
+            "message": self.message,
+            "result": json.loads(self.result) if self.result is not None else None,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        """Return a string representation of the Job instance.
+        (return) str: String in the format "<Job id kind status>".
+        """
+        return f"<Job {self.id} {self.kind} {self.status}>"
+
+
+@event.listens_for(Review, "after_insert")
+def _rollupInsertedReview(mapper, connection, review):
+    """Count a new review in its club's rollups."""
+    ReviewRollup.applyDelta(connection, review.club_code, review.created_at, review.rating, 1)
+
+
+@event.listens_for(Review, "after_update")
+def _rollupUpdatedReview(mapper, connection, review):
+    """Move an edited review between rollup cells when its rating changed."""
+    history = inspect(review).attrs.rating.history
+    if not (history.added and history.deleted):
+        return
+    oldRating, newRating = history.deleted[0], history.added[0]
+    if oldRating == newRating:
+        return
+    # Attributes may have been expired by an earlier commit; avoid lazy loads mid-flush
+    clubCode, createdAt = connection.execute(
+        select(Review.club_code, Review.created_at).where(Review.id == review.id)).one()
+    ReviewRollup.applyDelta(connection, clubCode, createdAt, oldRating, -1)
+    ReviewRollup.applyDelta(connection, clubCode, createdAt, newRating, 1)
+
+
+@event.listens_for(Review, "before_delete")
+def _rollupDeletedReview(mapper, connection, review):
+    """Remove a deleted review from its club's rollups."""
+    ReviewRollup.applyDelta(connection, review.club_code, review.created_at, review.rating, -1)
+
+
+
+@event.listens_for(Session, "before_flush")
+def _uncountDeletedClubTags(session, flushContext, instances):
+    """Take deleted clubs out of their tags' club counts."""
+    codes = [club.code for club in session.deleted if isinstance(club, Club)]
+    if not codes:
+        return
+    # Runs before the club rows, and so their association rows, are deleted
+    removed = select(func.count()).where(
+        clubTagAssociation.c.tag_name == Tag.name,
+        clubTagAssociation.c.club_code.in_(codes)).scalar_subquery()
+    session.execute(update(Tag).where(Tag.name.in_(
+        select(clubTagAssociation.c.tag_name).where(clubTagAssociation.c.club_code.in_(codes))))
+        .values(clubCount=Tag.clubCount - removed),
+        execution_options={"synchronize_session": False})
+
+
+@event.listens_for(Session, "before_flush")
+def _countFavoriteChanges(session, flushContext, instances):
+    """Keep favorites_count in step with deleted users and with favoriteClubs
+    collections edited directly instead of through applyFavoriteChanges."""
+    deltas = {}
+    for user in list(session.new) + list(session.dirty):
+        if isinstance(user, User):
+            history = inspect(user).attrs.favoriteClubs.history
+            for club, delta in [(club, 1) for club in history.added] \
+                    + [(club, -1) for club in history.deleted]:
+                if inspect(club).pending:
+                    club.favorites_count = (club.favorites_count or 0) + delta
+                else:
+                    deltas[club.code] = deltas.get(club.code, 0) + delta
+    for delta in {delta for delta in deltas.values() if delta}:
+        session.execute(update(Club).where(Club.code.in_(
+            [code for code, value in deltas.items() if value == delta]))
+            .values(favorites_count=Club.favorites_count + delta),
+            execution_options={"synchronize_session": False})
+    if any(deltas.values()):
+        for club in list(session.identity_map.values()):
+            if isinstance(club, Club) and deltas.get(club.code):
+                session.expire(club, ["favorites_count"])
+
+    ids = [user.id for user in session.deleted if isinstance(user, User)]
+    if not ids:
+        return
+    # Runs before the user rows, and so their association rows, are deleted
+    removed = select(func.count()).where(
+        userClubAssociation.c.club_code == Club.code,
+        userClubAssociation.c.user_id.in_(ids)).scalar_subquery()
+    session.execute(update(Club).where(Club.code.in_(
+        select(userClubAssociation.c.club_code).where(userClubAssociation.c.user_id.in_(ids))))
+        .values(favorites_count=Club.favorites_count - removed),
+        execution_options={"synchronize_session": False})
+
+
+@event.listens_for(Session, "after_commit")
+def _publishCreatedTags(session):
+    """Add tags created by a committed transaction to the tag dictionary."""
+    created = session.info.pop("createdTags", None)
+    if created:
+        tagDictionary.publish(*created)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forgetCreatedTags(session, previousTransaction):
+    """Drop unpublished tag names on any rollback, savepoints included.
+    Names that did survive are found again by the dictionary's miss lookup.
+    """
+    session.info.pop("createdTags", None)
+
+
+@event.listens_for(Tag.__table__, "after_create")
+@event.listens_for(Tag.__table__, "after_drop")
+def _resetTagDictionary(target, connection, **kw):
+    """Start the tag dictionary afresh when the tag table is recreated."""
+    tagDictionary.reset()
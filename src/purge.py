@@ -0,0 +1,189 @@
+"""
+Background purges for the Flask club review application.
+Clubs and users with many reviews are deleted by a worker thread in small
+batches, each in its own short transaction, so the request that asked for
+the delete returns at once and other writers are never locked out for long.
+"""
+import queue
+import threading
+
+from flask import current_app
+from sqlalchemy import delete, select
+
+from .analytics import recordReviewChanges
+from .database import db, isMemoryDatabase
+from .models import ChangeEvent, Club, Review, ReviewRollup, User
+from .shards import reviewConnection
+
+# Parent model and the review column that points at it, by purge kind
+PURGE_TARGETS = {
+    "club": (Club, Review.club_code),
+    "user": (User, Review.user_id),
+}
+
+
+class BackgroundPurger:
+    """Worker thread that deletes a club's or user's reviews in batches, then the parent."""
+
+    def __init__(self, app, batchSize=500):
+        """Start the worker thread.
+        (arg) app-Flask: The application whose database is purged.
+        (arg) batchSize-int: Reviews deleted per transaction.
+        """
+        self.app = app
+        self.batchSize = batchSize
+        self.purged = 0
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="purge", daemon=True)
+        self._thread.start()
+
+    def submit(self, kind, key):
+        """Queue a club or user for deletion.
+        (arg) kind-str: "club" or "user".
+        (arg) key-str|int: The club code or user id.
+        (return) bool: False if the same purge is already queued.
+        """
+        with self._lock:
+            if (kind, key) in self._pending:
+                return False
+            self._pending.add((kind, key))
+        self._queue.put((kind, key))
+        return True
+
+    def isPending(self, kind, key):
+        """Return whether a purge is queued or running.
+        (return) bool
+        """
+        with self._lock:
+            return (kind, key) in self._pending
+
+    def join(self):
+        """Block until every queued purge has finished.
+        (return) None
+        """
+        self._queue.join()
+
+    def stop(self):
+        """Stop the worker thread after it drains the queue.
+        (return) None
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        """Run queued purges one at a time.
+        (return) None
+        """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            try:
+                with self.app.app_context():
+                    self.purge(*item)
+            except Exception:
+                self.app.logger.exception("Purge of %s %s failed", *item)
+            finally:
+                with self._lock:
+                    self._pending.discard(item)
+                self._queue.task_done()
+
+    def purge(self, kind, key):
+        """Delete a parent's reviews batch by batch, then the parent itself.
+        (arg) kind-str: "club" or "user".
+        (arg) key-str|int: The club code or user id.
+        (return) None
+        """
+        try:
+            self.purged += purgeParent(db.session, kind, key, self.batchSize)
+        finally:
+            db.session.remove()
+
+
+def purgeParent(session, kind, key, batchSize, onBatch=None):
+    """Delete a club's or user's reviews in committed batches, then the parent.
+    (arg) session-Session: The session to delete in.
+    (arg) kind-str: "club" or "user".
+    (arg) key-str|int: The club code or user id.
+    (arg) batchSize-int: Reviews deleted per transaction.
+    (arg) onBatch-callable: Called with the running total after each batch commits.
+    (return) int: Number of reviews deleted.
+    """
+    model, column = PURGE_TARGETS[kind]
+    deleted = 0
+    while True:
+        rows = session.execute(
+            select(Review.id, Review.club_code, Review.created_at, Review.rating)
+            .where(column == key).limit(batchSize)).all()
+        if not rows:
+            break
+        deleteReviews(session, rows)
+        session.commit()
+        deleted += len(rows)
+        if onBatch is not None:
+            onBatch(deleted)
+    parent = session.get(model, key)
+    if parent is not None:
+        session.delete(parent)
+        session.commit()
+    return deleted
+
+
+def deleteReviews(session, rows):
+    """Delete reviews with one statement, taking them out of their rollups first.
+    Bulk deletes skip the ORM events that normally maintain the rollups.
+    (arg) session-Session: The session to delete in.
+    (arg) rows-list[tuple]: (id, club_code, created_at, rating) of each review.
+    (return) None
+    """
+    if not rows:
+        return
+    for _, clubCode, createdAt, rating in rows:
+        ReviewRollup.applyDelta(reviewConnection(session, clubCode), clubCode, createdAt,
+                                rating, -1)
+    session.execute(delete(Review).where(Review.id.in_([row[0] for row in rows])),
+                    execution_options={"synchronize_session": False})
+    recordReviewChanges(session, [("delete", row[0]) for row in rows])
+    ChangeEvent.recordDeletes(session, "review", [row[0] for row in rows])
+
+
+def deleteUserReviews(session, user):
+    """Delete all of a user's reviews ahead of deleting the user inline.
+    Left to ON DELETE CASCADE they would vanish without leaving their clubs'
+    rollups or reaching the analytics store and change log. A club's rollups
+    cascade with the club, so deleted clubs need no such step.
+    (arg) session-Session: The session to delete in.
+    (arg) user-User: The user about to be deleted.
+    (return) int: Number of reviews deleted.
+    """
+    rows = session.execute(
+        select(Review.id, Review.club_code, Review.created_at, Review.rating)
+        .where(Review.user_id == user.id)).all()
+    deleteReviews(session, rows)
+    # A loaded collection would have the ORM delete the same rows again
+    session.expire(user, ["reviews_made"])
+    return len(rows)
+
+
+def getPurger():
+    """Return the background purger of the current app, if enabled.
+    (return) BackgroundPurger: The purger, or None.
+    """
+    return current_app.extensions.get("purger")
+
+
+def configurePurge(app):
+    """Start a background purger when enabled for a file-backed database.
+    In-memory databases share one connection, so their deletes stay inline.
+    (arg) app-Flask: The application.
+    (return) BackgroundPurger: The purger, or None if disabled.
+    """
+    if not app.config["BACKGROUND_PURGE"] \
+            or isMemoryDatabase(app.config["SQLALCHEMY_DATABASE_URI"]):
+        return None
+    purger = BackgroundPurger(app, app.config["PURGE_BATCH_SIZE"])
+    app.extensions["purger"] = purger
+    return purger
@@ -0,0 +1,216 @@
+"""
+Statement statistics for the Flask club review application.
+Every statement the engines execute is fingerprinted by replacing its
+literals and bound value lists with placeholders, and calls, total and
+maximum time and rows are aggregated per fingerprint for /api/debug/queries.
+"""
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from sqlalchemy import event
+
+from .database import db
+
+# Fingerprints beyond this many are folded into one entry to bound memory
+MAX_FINGERPRINTS = 1000
+OVERFLOW_FINGERPRINT = "<other statements>"
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_VALUE_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_REPEATED_ROWS = re.compile(r"(\(\?(?:, \?)*\))(?:\s*,\s*\1)+")
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """Return a statement with literals and value lists normalized.
+    IN lists and multi-row VALUES of any length share one fingerprint.
+    (arg) statement-str: SQL text as sent to the driver.
+    (return) str: The normalized statement.
+    """
+    text = _SPACE.sub(" ", statement).strip()
+    text = _STRING.sub("?", text)
+    text = _NUMBER.sub("?", text)
+    text = _REPEATED_ROWS.sub(r"\1, ...", text)
+    return _VALUE_LIST.sub("(?, ...)", text)
+
+
+class QueryStats:
+    """Thread-safe per-fingerprint call counts, timings and row counts."""
+
+    def __init__(self, maxFingerprints=MAX_FINGERPRINTS):
+        """Create empty statistics.
+        (arg) maxFingerprints-int: Distinct fingerprints tracked before folding.
+        """
+        self.maxFingerprints = maxFingerprints
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.resetAt = time.time()
+
+    def _entry(self, key):
+        """Return the mutable [calls, total, max, rows] entry for a fingerprint.
+        Must be called with the lock held.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            if len(self._entries) >= self.maxFingerprints:
+                key = OVERFLOW_FINGERPRINT
+                entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = [0, 0.0, 0.0, 0]
+        return entry
+
+    def record(self, key, seconds, rows=0):
+        """Count one execution of a statement.
+        (arg) key-str: The statement fingerprint.
+        (arg) seconds-float: Time spent executing it.
+        (arg) rows-int: Rows affected, if known at execution time.
+        (return) None
+        """
+        with self._lock:
+            entry = self._entry(key)
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] += rows
+
+    def addRows(self, key, rows):
+        """Count rows fetched from a statement's result.
+        (arg) key-str: The statement fingerprint.
+        (arg) rows-int: Rows returned by one fetch.
+        (return) None
+        """
+        with self._lock:
+            self._entry(key)[3] += rows
+
+    def reset(self):
+        """Forget every statistic.
+        (return) None
+        """
+        with self._lock:
+            self._entries.clear()
+            self.resetAt = time.time()
+
+    def snapshot(self, limit=None):
+        """Return the statistics, most total time first.
+        (arg) limit-int: Maximum number of statements; None for all.
+        (return) list[dict]: One entry per fingerprint.
+        """
+        with self._lock:
+            items = [(key, list(entry)) for key, entry in self._entries.items()]
+        items.sort(key=lambda item: item[1][1], reverse=True)
+        return [{
+            "statement": key,
+            "calls": calls,
+            "total_ms": round(total * 1000, 3),
+            "mean_ms": round(total * 1000 / calls, 3) if calls else 0.0,
+            "max_ms": round(longest * 1000, 3),
+            "rows": rows
+        } for key, (calls, total, longest, rows) in items[:limit]]
+
+    def __len__(self):
+        """Return the number of fingerprints tracked."""
+        with self._lock:
+            return len(self._entries)
+
+
+# Shared by every engine in this process
+queryStats = QueryStats()
+
+
+class CountingCursor(sqlite3.Cursor):
+    """SQLite cursor that adds the rows it returns to its statement's statistics."""
+    statsKey = None
+
+    def _count(self, rows):
+        """Add fetched rows to the current statement's entry."""
+        if rows and self.statsKey is not None:
+            queryStats.addRows(self.statsKey, rows)
+
+    def fetchone(self):
+        """Fetch one row and count it."""
+        row = super().fetchone()
+        if row is not None:
+            self._count(1)
+        return row
+
+    def fetchmany(self, size=None):
+        """Fetch up to size rows and count them."""
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        """Fetch the remaining rows and count them."""
+        rows = super().fetchall()
+        self._count(len(rows))
+        return rows
+
+
+class CountingConnection(sqlite3.Connection):
+    """SQLite connection whose cursors count fetched rows."""
+
+    def cursor(self, factory=CountingCursor):
+        """Return a new counting cursor."""
+        return super().cursor(factory)
+
+
+def _startTimer(conn, cursor, statement, parameters, context, executemany):
+    """Remember when a statement started."""
+    conn.info["statementStartedAt"] = time.perf_counter()
+
+
+def _recordStatement(conn, cursor, statement, parameters, context, executemany):
+    """Aggregate a finished statement under its fingerprint."""
+    elapsed = time.perf_counter() - conn.info.pop("statementStartedAt", time.perf_counter())
+    key = fingerprint(statement)
+    # SELECT rows are counted as they are fetched; rowcount covers DML
+    affected = cursor.rowcount if cursor.description is None and cursor.rowcount > 0 else 0
+    queryStats.record(key, elapsed, affected)
+    if isinstance(cursor, CountingCursor):
+        cursor.statsKey = key
+
+
+def enableRowCounting(app):
+    """Make new SQLite connections count rows returned by their cursors.
+    Must run before db.init_app creates the engine.
+    (arg) app-Flask: The application.
+    (return) None
+    """
+    if not app.config["QUERY_STATS"] \
+            or not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        return
+    options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    connectArgs = dict(options.get("connect_args", {}))
+    connectArgs.setdefault("factory", CountingConnection)
+    options["connect_args"] = connectArgs
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+
+def watchEngine(engine):
+    """Aggregate statement statistics for an engine.
+    (arg) engine-Engine: The engine to instrument.
+    (return) None
+    """
+    event.listen(engine, "before_cursor_execute", _startTimer)
+    event.listen(engine, "after_cursor_execute", _recordStatement)
+
+
+def configureQueryStats(app):
+    """Instrument the app's writer and read engines when enabled.
+    (arg) app-Flask: An app whose engines are configured.
+    (return) QueryStats: The shared statistics, or None if disabled.
+    """
+    if not app.config["QUERY_STATS"]:
+        return None
+    with app.app_context():
+        watchEngine(db.engine)
+    readEngine = app.extensions.get("readEngine")
+    if readEngine is not None:
+        watchEngine(readEngine)
+    app.extensions["queryStats"] = queryStats
+    return queryStats
@@ -0,0 +1,331 @@
+"""
+Co-favorite club recommendations for the Flask club review application.
+Keeps an in-memory item-item cosine similarity index built from the
+user/club favorites association table. Commits in this process mark
+changed users stale directly; changes committed by other processes are found
+by reading the change log from the cursor the index last caught up to.
+"""
+import math
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from .changes import CATCH_UP_LIMIT, changesSince, latestCursor
+from .models import Club, User, userClubAssociation
+
+# numpy is optional and slow to import, so it is loaded on first use
+_UNLOADED = object()
+np = _UNLOADED
+
+
+def loadNumpy():
+    """Import numpy the first time it is needed.
+    (return) module: numpy, or None when it is not installed.
+    """
+    global np
+    if np is _UNLOADED:
+        try:
+            import numpy
+        except ImportError:  # the index falls back to pure Python
+            numpy = None
+        np = numpy
+    return np
+
+
+def countCooccurrences(userIds, clubIds, clubCount):
+    """Count how often every pair of clubs was favorited by the same user.
+    Computes the sparse product A^T A of the user x club incidence matrix.
+    (arg) userIds-list[int]: User ordinal of every association row.
+    (arg) clubIds-list[int]: Club ordinal of every association row.
+    (arg) clubCount-int: Number of distinct clubs.
+    (return) list[tuple]: (clubA, clubB, count) for every non-zero pair, a != b.
+    """
+    if not userIds:
+        return []
+    np = loadNumpy()
+    if np is None:
+        clubsByUser = defaultdict(list)
+        for userId, clubId in zip(userIds, clubIds):
+            clubsByUser[userId].append(clubId)
+        counts = defaultdict(int)
+        for clubs in clubsByUser.values():
+            for a in clubs:
+                for b in clubs:
+                    if a != b:
+                        counts[(a, b)] += 1
+        return [(a, b, count) for (a, b), count in counts.items()]
+
+    users = np.asarray(userIds, dtype=np.int64)
+    clubs = np.asarray(clubIds, dtype=np.int64)
+    order = np.argsort(users, kind="stable")
+    users, clubs = users[order], clubs[order]
+    # Row ranges of each user in the sorted incidence list
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    degrees = np.diff(np.r_[starts, len(users)])
+    rowDegree = np.repeat(degrees, degrees)
+    rowStart = np.repeat(starts, degrees)
+    # Pair every row with every row of the same user
+    left = np.repeat(np.arange(len(users)), rowDegree)
+    offsets = np.arange(len(left)) - np.repeat(np.cumsum(rowDegree) - rowDegree, rowDegree)
+    right = np.repeat(rowStart, rowDegree) + offsets
+    keep = left != right
+    keys = clubs[left[keep]] * clubCount + clubs[right[keep]]
+    pairKeys, pairCounts = np.unique(keys, return_counts=True)
+    return list(zip((pairKeys // clubCount).tolist(), (pairKeys % clubCount).tolist(),
+                    pairCounts.tolist()))
+
+
+class CoFavoriteIndex:
+    """Sparse club co-favorite counts with cosine top-k lookups.
+    Users whose favorites changed are refreshed lazily on the next lookup.
+    """
+
+    def __init__(self):
+        """Create an empty, unbuilt index."""
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        """Drop all state so the next lookup rebuilds from the database.
+        (return) None
+        """
+        with self._lock:
+            self.built = False
+            self.cursor = 0
+            self.userClubs = {}
+            self.clubUsers = defaultdict(set)
+            self.cooccur = defaultdict(dict)
+            self._stale = set()
+            self._related = {}
+
+    def markStale(self, userIds):
+        """Queue users whose favorites changed for an incremental refresh.
+        (arg) userIds-iterable[int]: The changed users.
+        (return) None
+        """
+        with self._lock:
+            self._stale.update(userIds)
+
+    def usersOf(self, clubCode):
+        """Return the users currently indexed as favoriting a club.
+        (arg) clubCode-str: The club code.
+        (return) set[int]: User ids.
+        """
+        with self._lock:
+            return set(self.clubUsers.get(clubCode, ()))
+
+    def build(self, session):
+        """Rebuild the whole index from the association table.
+        (arg) session-Session: Session used to read the favorites.
+        (return) None
+        """
+        # Read first: changes logged after it are caught up on, possibly twice
+        cursor = latestCursor(session)
+        rows = session.execute(select(userClubAssociation.c.user_id,
+                                      userClubAssociation.c.club_code)).all()
+        codes = sorted({clubCode for _, clubCode in rows})
+        ordinals = {code: i for i, code in enumerate(codes)}
+        pairs = countCooccurrences([userId for userId, _ in rows],
+                                   [ordinals[clubCode] for _, clubCode in rows], len(codes))
+        with self._lock:
+            # Users marked while reading may have changed after the read
+            stale = self._stale
+            self.reset()
+            self._stale = stale
+            for userId, clubCode in rows:
+                self.userClubs.setdefault(userId, set()).add(clubCode)
+                self.clubUsers[clubCode].add(userId)
+            for a, b, count in pairs:
+                self.cooccur[codes[a]][codes[b]] = count
+            self.cursor = cursor
+            self.built = True
+
+    def catchUp(self, session):
+        """Mark users whose favorites other processes changed as stale.
+        Users changed in the log since the cursor are refreshed, along with
+        every fan of a deleted club; far behind, the index is rebuilt instead.
+        (arg) session-Session: Session used to read the change log.
+        (return) bool: False if the index was rebuilt.
+        """
+        rows = changesSince(session, self.cursor, CATCH_UP_LIMIT)
+        if len(rows) > CATCH_UP_LIMIT:
+            self.build(session)
+            return False
+        users = set()
+        for _, entity, key, action in rows:
+            if entity == "user":
+                users.add(int(key))
+            elif entity == "club" and action == "deleted":
+                users |= self.usersOf(key)
+        with self._lock:
+            self._stale.update(users)
+            if rows:
+                self.cursor = max(self.cursor, rows[-1][0])
+        return True
+
+    def ensureFresh(self, session):
+        """Build the index if needed and apply pending favorite changes, wherever committed.
+        (arg) session-Session: Session used to read the favorites.
+        (return) None
+        """
+        if not self.built:
+            self.build(session)
+            return
+        if not self.catchUp(session):
+            return
+        with self._lock:
+            stale, self._stale = self._stale, set()
+        if not stale:
+            return
+        current = defaultdict(set)
+        rows = session.execute(
+            select(userClubAssociation.c.user_id, userClubAssociation.c.club_code)
+            .where(userClubAssociation.c.user_id.in_(stale))).all()
+        for userId, clubCode in rows:
+            current[userId].add(clubCode)
+        with self._lock:
+            for userId in stale:
+                self._applyUser(userId, current.get(userId, set()))
+
+    def _applyUser(self, userId, newClubs):
+        """Move one user's favorites to newClubs, adjusting pair counts.
+        (arg) userId-int: The user.
+        (arg) newClubs-set[str]: The user's favorites now in the database.
+        (return) None
+        """
+        clubs = set(self.userClubs.get(userId, ()))
+        for clubCode in clubs - newClubs:
+            clubs.discard(clubCode)
+            self._adjustPairs(clubCode, clubs, -1)
+            self.clubUsers[clubCode].discard(userId)
+            if not self.clubUsers[clubCode]:
+                del self.clubUsers[clubCode]
+        for clubCode in newClubs - clubs:
+            self._adjustPairs(clubCode, clubs, 1)
+            self.clubUsers[clubCode].add(userId)
+            clubs.add(clubCode)
+        if clubs:
+            self.userClubs[userId] = clubs
+        else:
+            self.userClubs.pop(userId, None)
+        self._related.clear()
+
+    def _adjustPairs(self, clubCode, others, delta):
+        """Add delta to the co-favorite count of clubCode with every other club.
+        (return) None
+        """
+        for other in others:
+            for a, b in ((clubCode, other), (other, clubCode)):
+                count = self.cooccur[a].get(b, 0) + delta
+                if count > 0:
+                    self.cooccur[a][b] = count
+                else:
+                    self.cooccur[a].pop(b, None)
+
+    def similarities(self, clubCode):
+        """Return the cosine similarity of a club to every co-favorited club.
+        (arg) clubCode-str: The club code.
+        (return) dict[str, float]: Club code to similarity in (0, 1].
+        """
+        with self._lock:
+            size = len(self.clubUsers.get(clubCode, ()))
+            return {other: count / math.sqrt(size * len(self.clubUsers[other]))
+                    for other, count in self.cooccur.get(clubCode, {}).items()}
+
+    def related(self, clubCode, limit=10):
+        """Return the clubs most often favorited together with a club.
+        (arg) clubCode-str: The club code.
+        (arg) limit-int: Maximum number of results.
+        (return) list[tuple]: (club code, similarity), best first.
+        """
+        with self._lock:
+            ranked = self._related.get(clubCode)
+            if ranked is None:
+                ranked = sorted(self.similarities(clubCode).items(),
+                                key=lambda item: (-item[1], item[0]))
+                self._related[clubCode] = ranked
+            return ranked[:limit]
+
+    def recommend(self, userId, limit=10):
+        """Return clubs similar to a user's favorites that they have not favorited.
+        (arg) userId-int: The user.
+        (arg) limit-int: Maximum number of results.
+        (return) list[tuple]: (club code, score), best first.
+        """
+        with self._lock:
+            favorites = self.userClubs.get(userId, set())
+            scores = defaultdict(float)
+            for favorite in favorites:
+                for other, similarity in self.similarities(favorite).items():
+                    if other not in favorites:
+                        scores[other] += similarity
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+            return ranked[:limit]
+
+
+# Process-wide index shared by all requests
+coFavoriteIndex = CoFavoriteIndex()
+
+
+def _changedUsers(session):
+    """Return the set of users with uncommitted favorite changes in a session.
+    (return) set[int]: User ids.
+    """
+    return session.info.setdefault("favoritesChanged", set())
+
+
+def _markFromCollection(user, club):
+    """Record a favorites collection change on the session holding the objects.
+    (return) None
+    """
+    session = object_session(user) or object_session(club)
+    if session is not None and user.id is not None:
+        _changedUsers(session).add(user.id)
+
+
+@event.listens_for(User.favoriteClubs, "append")
+@event.listens_for(User.favoriteClubs, "remove")
+def _userFavoritesChanged(user, club, initiator):
+    """Track favorites added or removed through User.favoriteClubs."""
+    _markFromCollection(user, club)
+
+
+@event.listens_for(Club.usersFavorited, "append")
+@event.listens_for(Club.usersFavorited, "remove")
+def _clubFavoritesChanged(club, user, initiator):
+    """Track favorites added or removed through Club.usersFavorited."""
+    _markFromCollection(user, club)
+
+
+@event.listens_for(Session, "after_flush")
+def _trackDeletedFavorites(session, flushContext):
+    """Track favorites dropped by deleting users or clubs."""
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            _changedUsers(session).add(obj.id)
+        elif isinstance(obj, Club):
+            _changedUsers(session).update(coFavoriteIndex.usersOf(obj.code))
+
+
+@event.listens_for(Session, "after_commit")
+def _publishFavoriteChanges(session):
+    """Hand committed favorite changes to the index."""
+    changed = session.info.pop("favoritesChanged", None)
+    if changed:
+        coFavoriteIndex.markStale(changed)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discardFavoriteChanges(session, previousTransaction):
+    """Forget favorite changes once the outer transaction is rolled back."""
+    if previousTransaction.parent is None:
+        session.info.pop("favoritesChanged", None)
+
+
+@event.listens_for(userClubAssociation, "after_create")
+@event.listens_for(userClubAssociation, "after_drop")
+def _resetIndex(target, connection, **kwargs):
+    """Rebuild from scratch whenever the favorites table is recreated."""
+    coFavoriteIndex.reset()
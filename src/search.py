@@ -0,0 +1,262 @@
+"""
+Full-text search over review titles and text for the Flask club review application.
+On SQLite the review table carries an FTS5 index, an external-content table
+kept in sync by triggers on insert, update and delete, so ORM writes, bulk
+loads and cascading deletes all reach it. Every review shard has its own
+index; a search ranks the matches on each shard that can hold any, or only
+the newest of them when a candidate window is set, and merges them by rank.
+Other backends fall back to a LIKE scan with snippets built in Python.
+"""
+import re
+
+from sqlalchemy import event, inspect, or_, text
+from sqlalchemy.orm import selectinload
+
+from .database import db
+from .models import Review
+from .shards import getReviewShards, reviewConnection
+
+SEARCH_TABLE = "review_search"
+# Marks put around matched terms in highlights and snippets
+MARK_OPEN, MARK_CLOSE = "<mark>", "</mark>"
+SNIPPET_TOKENS = 16
+# bm25 weights of the title and text columns; a title match counts double
+RANK_FUNCTION = "bm25(2.0, 1.0)"
+SEARCH_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    f"title, text, content='review', content_rowid='id', tokenize='porter unicode61')",
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rank) VALUES ('rank', '{RANK_FUNCTION}')",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert AFTER INSERT ON review BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, title, text) VALUES (new.id, new.title, new.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON review BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, text) "
+    f"VALUES ('delete', old.id, old.title, old.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update AFTER UPDATE OF title, text ON review BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, text) "
+    f"VALUES ('delete', old.id, old.title, old.text); "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, title, text) VALUES (new.id, new.title, new.text); END"
+]
+SEARCH_SQL = f"""
+SELECT {SEARCH_TABLE}.rowid, highlight({SEARCH_TABLE}, 0, :open, :close),
+       snippet({SEARCH_TABLE}, 1, :open, :close, '…', :tokens), {SEARCH_TABLE}.rank
+FROM {SEARCH_TABLE} JOIN review ON review.id = {SEARCH_TABLE}.rowid
+WHERE {SEARCH_TABLE} MATCH :query{{filters}}
+ORDER BY {SEARCH_TABLE}.rank LIMIT :limit"""
+# Id of the newest match outside the newest :offset; FTS5 walks ids backwards without scoring
+FLOOR_SQL = f"""
+SELECT {SEARCH_TABLE}.rowid FROM {SEARCH_TABLE} JOIN review ON review.id = {SEARCH_TABLE}.rowid
+WHERE {SEARCH_TABLE} MATCH :query{{filters}}
+ORDER BY {SEARCH_TABLE}.rowid DESC LIMIT 1 OFFSET :offset"""
+TERM = re.compile(r"(\w+)(\*?)")
+
+
+def parseQuery(query):
+    """Split a search string into terms, keeping a trailing * as a prefix match.
+    (arg) query-str: What the user typed.
+    (return) list[tuple]: (term, isPrefix) pairs; empty if nothing searchable.
+    """
+    return [(term.lower(), bool(star)) for term, star in TERM.findall(query)]
+
+
+def matchExpression(terms):
+    """Return an FTS5 query matching reviews that contain every term.
+    Terms are quoted, so operators and punctuation in the input are never parsed.
+    (arg) terms-list[tuple]: Output of parseQuery.
+    (return) str: The MATCH expression.
+    """
+    return " ".join(f'"{term}"' + ("*" if prefix else "") for term, prefix in terms)
+
+
+def supportsFullText(connection):
+    """Return whether a connection's database has the FTS5 review index.
+    (arg) connection-Connection: The connection to check.
+    (return) bool
+    """
+    return connection.dialect.name == "sqlite"
+
+
+def createSearchIndex(connection):
+    """Create the review search table and its triggers if they do not exist.
+    (arg) connection-Connection: A SQLite connection with the review table.
+    (return) None
+    """
+    for statement in SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+
+
+def pauseSearchIndexing(connection):
+    """Stop indexing inserted reviews, e.g. for a bulk load; rebuildSearchIndex resumes it.
+    (arg) connection-Connection: A SQLite connection with the search index.
+    (return) None
+    """
+    connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_insert")
+
+
+def rebuildSearchIndex(connection):
+    """Create the index if needed and refill it from the review table.
+    (arg) connection-Connection: A SQLite connection with the review table.
+    (return) int: Reviews indexed.
+    """
+    createSearchIndex(connection)
+    connection.exec_driver_sql(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+    connection.exec_driver_sql(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+    return connection.exec_driver_sql("SELECT COUNT(*) FROM review").scalar()
+
+
+def searchConnections(session, clubCode=None):
+    """Return the connections whose review tables can hold matches.
+    (arg) session-Session: The request's session.
+    (arg) clubCode-str: Only this club's reviews are searched, if given.
+    (return) list[Connection]: The main connection, or the shard connections.
+    """
+    shards = getReviewShards()
+    if shards is None:
+        return [session.connection()]
+    if clubCode is not None:
+        return [reviewConnection(session, clubCode)]
+    return [session.connection(bind_arguments={"bind": engine}) for engine in shards.engines]
+
+
+def highlightTerms(value, terms):
+    """Mark every occurrence of the terms in a string.
+    (arg) value-str: Stored title or text.
+    (arg) terms-list[tuple]: Output of parseQuery.
+    (return) str: The string with matches wrapped in marks.
+    """
+    pattern = "|".join(re.escape(term) + (r"\w*" if prefix else r"\b")
+                       for term, prefix in terms)
+    return re.sub(rf"\b(?:{pattern})", lambda match: f"{MARK_OPEN}{match.group(0)}{MARK_CLOSE}",
+                  value, flags=re.IGNORECASE)
+
+
+def textSnippet(value, terms):
+    """Return about SNIPPET_TOKENS words of text around the first match, highlighted.
+    (arg) value-str: Stored review text.
+    (arg) terms-list[tuple]: Output of parseQuery.
+    (return) str: The snippet; empty for no text.
+    """
+    words = (value or "").split()
+    lowered = [word.lower() for word in words]
+    first = next((index for index, word in enumerate(lowered)
+                  if any(word.startswith(term) for term, _ in terms)), 0)
+    start = max(0, first - SNIPPET_TOKENS // 2)
+    window = " ".join(words[start:start + SNIPPET_TOKENS])
+    return ("…" if start else "") + highlightTerms(window, terms) \
+        + ("…" if start + SNIPPET_TOKENS < len(words) else "")
+
+
+def _fullTextMatches(connection, terms, clubCode, minRating, limit, candidates):
+    """Return (id, title highlight, snippet, rank) of the best matches on one database.
+    Scoring every match of a common word is what makes search slow, so with
+    candidates set only the newest that many matches are ranked.
+    (return) tuple: (list of matches, whether older matches were left unranked).
+    """
+    filters, params = "", {"query": matchExpression(terms), "open": MARK_OPEN,
+                           "close": MARK_CLOSE, "tokens": SNIPPET_TOKENS, "limit": limit}
+    if clubCode is not None:
+        filters += " AND review.club_code = :club_code"
+        params["club_code"] = clubCode
+    if minRating is not None:
+        filters += " AND review.rating >= :min_rating"
+        params["min_rating"] = minRating
+    floor = None
+    if candidates:
+        floor = connection.execute(text(FLOOR_SQL.format(filters=filters)),
+                                   {**params, "offset": candidates}).scalar()
+        if floor is not None:
+            filters += f" AND {SEARCH_TABLE}.rowid > :floor"
+            params["floor"] = floor
+    return connection.execute(text(SEARCH_SQL.format(filters=filters)), params).all(), \
+        floor is not None
+
+
+def _likeMatches(session, terms, clubCode, minRating, limit):
+    """Return matches as _fullTextMatches does, by scanning with LIKE, newest first."""
+    query = session.query(Review.id, Review.title, Review.text)
+    for term, prefix in terms:
+        pattern = f"%{term}%"
+        query = query.filter(or_(Review.title.ilike(pattern), Review.text.ilike(pattern)))
+    if clubCode is not None:
+        query = query.filter(Review.club_code == clubCode)
+    if minRating is not None:
+        query = query.filter(Review.rating >= minRating)
+    return [(reviewId, highlightTerms(title, terms), textSnippet(reviewText, terms), 0.0)
+            for reviewId, title, reviewText in query.order_by(Review.id.desc()).limit(limit)]
+
+
+def searchReviews(session, query, clubCode=None, minRating=None, page=1, perPage=10,
+                  candidates=0):
+    """Return one page of reviews matching every term of a query, best first.
+    Every match of each shard is ranked, or only its newest candidates
+    matches if set; each shard returns its best page * perPage and the merged
+    list is cut to the page. bm25 statistics are per shard, so ranks across
+    shards are close but not exact.
+    (arg) session-Session: The request's session.
+    (arg) query-str: The search string.
+    (arg) clubCode-str: Restrict to one club's reviews.
+    (arg) minRating-int: Restrict to reviews rated at least this.
+    (arg) page-int, perPage-int: 1-based page and its size.
+    (arg) candidates-int: Newest matches ranked per shard, 0 for all; pages end there.
+    (return) tuple: (list of review dicts with "title_highlight", "snippet" and
+    "score", whether more results follow, whether older matches went unranked).
+    """
+    terms = parseQuery(query)
+    if not terms:
+        raise ValueError("q must contain at least one word")
+    limit = min(page * perPage + 1, candidates) if candidates else page * perPage + 1
+    matches, truncated = [], False
+    for connection in searchConnections(session, clubCode):
+        if supportsFullText(connection):
+            shardMatches, shardTruncated = _fullTextMatches(connection, terms, clubCode,
+                                                            minRating, limit, candidates)
+            matches += shardMatches
+            truncated = truncated or shardTruncated
+        else:
+            matches += _likeMatches(session, terms, clubCode, minRating, limit)
+            break
+    matches.sort(key=lambda match: match[3])
+    pageMatches = matches[(page - 1) * perPage:page * perPage]
+    reviews = {review.id: review for review in Review.query
+               .options(selectinload(Review.user), selectinload(Review.club))
+               .filter(Review.id.in_([match[0] for match in pageMatches]))}
+    results = [{**reviews[reviewId].toJson(), "title_highlight": titleHighlight,
+                "snippet": snippet, "score": -rank}
+               for reviewId, titleHighlight, snippet, rank in pageMatches if reviewId in reviews]
+    return results, len(matches) > page * perPage, truncated
+
+
+def configureSearch(app):
+    """Index reviews on startup where a review table has no search index yet.
+    Databases created before the index existed are filled in one pass, so
+    search works without a reindex_search job.
+    (arg) app-Flask: An app whose engines and review shards are configured.
+    (return) int: Reviews indexed.
+    """
+    shards = app.extensions.get("reviewShards")
+    with app.app_context():
+        engines = shards.engines if shards is not None else [db.engine]
+        indexed = 0
+        for engine in engines:
+            if engine.dialect.name != "sqlite":
+                continue
+            tableInspector = inspect(engine)
+            if tableInspector.has_table(Review.__tablename__) \
+                    and not tableInspector.has_table(SEARCH_TABLE):
+                with engine.begin() as connection:
+                    indexed += rebuildSearchIndex(connection)
+                app.logger.info("Built the review search index of %s", engine.url)
+        return indexed
+
+
+@event.listens_for(Review.__table__, "after_create")
+def _createSearchIndex(target, connection, **kwargs):
+    """Index reviews wherever a review table is created, shards included."""
+    if supportsFullText(connection):
+        createSearchIndex(connection)
+
+
+@event.listens_for(Review.__table__, "before_drop")
+def _dropSearchIndex(target, connection, **kwargs):
+    """Drop the index with its review table; the triggers go with the table."""
+    if supportsFullText(connection):
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
@@ -0,0 +1,456 @@
+"""
+Hash-partitioned review storage for the Flask club review application.
+With REVIEW_SHARDS above one, Review and ReviewRollup rows live in N SQLite
+files chosen by a stable hash of club_code, which keeps each file and its
+indexes small and lets reads of different clubs use different files. Clubs,
+users, tags and the change log stay in the main database; every review
+write also logs to it, so review writes still take the main write lock one
+at a time. Statements that pin a club or a review id run on one shard; the
+rest are scattered to every shard and their rows merged.
+"""
+import os
+import zlib
+
+from flask import current_app, has_app_context
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, delete, event, func, \
+    inspect, select, update
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList, \
+    Label, UnaryExpression
+from sqlalchemy.sql.functions import FunctionElement
+
+from .database import RoutingSession, db, enableSqliteWriter, isMemoryDatabase
+from .models import Club, Review, ReviewRollup, User
+
+# Tables partitioned by club_code
+SHARDED_TABLES = {Review.__tablename__, ReviewRollup.__tablename__}
+# How per-shard values of an aggregate column combine into one
+AGGREGATE_MERGES = {"count": sum, "sum": sum, "min": min, "max": max}
+# One-row table per shard holding the last review id it handed out; never in the main database
+reviewSequence = Table("review_sequence", MetaData(), Column("last_id", Integer, nullable=False))
+
+
+class UnsupportedShardQuery(RuntimeError):
+    """A SELECT whose result cannot be merged from per-shard results."""
+
+
+def shardIndex(clubCode: str, count: int) -> int:
+    """Return the shard holding a club's reviews.
+    CRC32 is used because hash() of a str differs between processes.
+    (arg) clubCode-str: The club code.
+    (arg) count-int: Number of shards.
+    (return) int: Shard index from 0 to count - 1.
+    """
+    return zlib.crc32(clubCode.encode()) % count
+
+
+def shardPaths(databasePath: str, count: int) -> list:
+    """Return the shard files that sit next to the main database file.
+    (arg) databasePath-str: Path of the main SQLite file.
+    (arg) count-int: Number of shards.
+    (return) list[str]: e.g. clubreview.reviews-0.db, clubreview.reviews-1.db.
+    """
+    base, extension = os.path.splitext(databasePath)
+    return [f"{base}.reviews-{index}{extension or '.db'}" for index in range(count)]
+
+
+def _pinnedValues(statement, parameters):
+    """Return the values that top-level equality or IN conditions fix on sharded columns.
+    (arg) statement-Executable: The statement being executed.
+    (arg) parameters-dict: Parameters passed with it.
+    (return) dict: (table name, column name) to a list of values.
+    """
+    where = getattr(statement, "whereclause", None)
+    if where is None:
+        return {}
+    conjuncts = where.clauses if isinstance(where, BooleanClauseList) \
+        and where.operator is operators.and_ else [where]
+    pinned = {}
+    for clause in conjuncts:
+        if not isinstance(clause, BinaryExpression) \
+                or clause.operator not in (operators.eq, operators.in_op):
+            continue
+        for column, value in ((clause.left, clause.right), (clause.right, clause.left)):
+            table = getattr(column, "table", None)
+            if table is None or getattr(table, "name", None) not in SHARDED_TABLES \
+                    or not isinstance(value, BindParameter):
+                continue
+            bound = value.effective_value
+            if bound is None and isinstance(parameters, dict):
+                bound = parameters.get(value.key)
+            if bound is None:
+                continue
+            values = list(bound) if clause.operator is operators.in_op else [bound]
+            pinned[(table.name, column.name)] = values
+    return pinned
+
+
+def _aggregateName(column):
+    """Return the function name of an aggregate result column, or None."""
+    element = column.element if isinstance(column, Label) else column
+    if isinstance(element, FunctionElement) and element.name in AGGREGATE_MERGES:
+        return element.name
+    return None
+
+
+def _isFunction(column):
+    """Return whether a result column is computed by an SQL function, e.g. avg()."""
+    return isinstance(column.element if isinstance(column, Label) else column, FunctionElement)
+
+
+def _mergeAggregates(name, values):
+    """Combine the per-shard values of one aggregate column; None if every shard had none."""
+    present = [value for value in values if value is not None]
+    return AGGREGATE_MERGES[name](present) if present else None
+
+
+class ReviewShards:
+    """The review shard engines of one app and the statement routing between them."""
+
+    def __init__(self, paths, poolSize=8, maxOverflow=8, connectArgs=None):
+        """Open an engine per shard file.
+        (arg) paths-list[str]: One SQLite file per shard.
+        (arg) poolSize-int, maxOverflow-int: Connection pool of each shard.
+        (arg) connectArgs-dict: Extra driver arguments, e.g. a lock timeout or connection factory.
+        """
+        self.paths = list(paths)
+        self.engines = []
+        for path in self.paths:
+            engine = create_engine(f"sqlite:///{path}", pool_size=poolSize,
+                                   max_overflow=maxOverflow,
+                                   connect_args={"check_same_thread": False,
+                                                 **(connectArgs or {})})
+            # No foreign keys here: clubs and users live in the main database
+            enableSqliteWriter(engine)
+            self.engines.append(engine)
+        self._indexOfEngine = {engine: index for index, engine in enumerate(self.engines)}
+
+    @property
+    def count(self):
+        """Return the number of shards."""
+        return len(self.engines)
+
+    def indexFor(self, clubCode):
+        """Return the shard index of a club."""
+        return shardIndex(clubCode, self.count)
+
+    def engineFor(self, clubCode):
+        """Return the engine of a club's shard."""
+        return self.engines[self.indexFor(clubCode)]
+
+    def createAll(self):
+        """Create the review tables and id sequence in every shard that lacks them.
+        A new sequence starts at the shard's highest review id.
+        (return) None
+        """
+        for index, engine in enumerate(self.engines):
+            for table in (Review.__table__, ReviewRollup.__table__, reviewSequence):
+                table.create(engine, checkfirst=True)
+            with engine.begin() as connection:
+                if connection.scalar(select(func.count()).select_from(reviewSequence)) == 0:
+                    highest = connection.scalar(select(func.max(Review.id)))
+                    connection.execute(reviewSequence.insert().values(
+                        last_id=index if highest is None else highest))
+
+    def dropAll(self):
+        """Drop the review tables and id sequence from every shard.
+        (return) None
+        """
+        for engine in self.engines:
+            for table in (reviewSequence, ReviewRollup.__table__, Review.__table__):
+                table.drop(engine, checkfirst=True)
+
+    def dispose(self):
+        """Drop pooled connections, e.g. ones inherited across fork.
+        (return) None
+        """
+        for engine in self.engines:
+            engine.dispose(close=False)
+
+    def allocateId(self, connection):
+        """Take the next review id from a shard's sequence in the current transaction.
+        Ids on shard k are k mod N, so ids stay unique across shards and a
+        lookup by id goes to one shard. The sequence only grows, so ids of
+        deleted reviews are never handed out again.
+        (arg) connection-Connection: A connection to the shard the review is inserted into.
+        (return) int: The id, or None for connections to other engines.
+        """
+        if connection.engine not in self._indexOfEngine:
+            return None
+        return connection.execute(
+            update(reviewSequence).values(last_id=reviewSequence.c.last_id + self.count)
+            .returning(reviewSequence.c.last_id)).scalar_one()
+
+    @staticmethod
+    def advanceSequence(connection, reviewIds):
+        """Move a shard's sequence past ids that were inserted explicitly, e.g. by a bulk load.
+        (arg) connection-Connection: A connection to the shard.
+        (arg) reviewIds-list[int]: The inserted ids.
+        (return) None
+        """
+        connection.execute(update(reviewSequence).values(
+            last_id=func.max(reviewSequence.c.last_id, max(reviewIds))))
+
+    def flushConnection(self, mapper, instance):
+        """Return the connection a flush writes an object through.
+        (arg) mapper-Mapper: The object's base mapper.
+        (arg) instance-object: The object being flushed.
+        (return) Connection: A shard connection for reviews and rollups, else the main one.
+        """
+        session = object_session(instance)
+        if mapper.persist_selectable.name not in SHARDED_TABLES:
+            return session.connection(bind_arguments={"mapper": mapper})
+        return session.connection(bind_arguments={"bind": self.engines[self.indexOf(instance)]})
+
+    def indexOf(self, instance):
+        """Return the shard of a review or rollup object.
+        Persistent reviews are placed by id, which never needs a load.
+        """
+        key = inspect(instance).key
+        if isinstance(instance, Review) and key is not None:
+            return key[1][0] % self.count
+        return self.indexFor(instance.club_code)
+
+    def handles(self, ormContext):
+        """Return whether a statement reads or writes a sharded table.
+        (arg) ormContext-ORMExecuteState: The statement being executed.
+        (return) bool
+        """
+        mapper = ormContext.bind_mapper
+        if mapper is not None:
+            return mapper.persist_selectable.name in SHARDED_TABLES
+        statement = ormContext.statement
+        table = getattr(statement, "table", None)
+        if table is not None:
+            return table.name in SHARDED_TABLES
+        if ormContext.is_select:
+            return any(getattr(source, "name", None) in SHARDED_TABLES
+                       for source in statement.get_final_froms())
+        return False
+
+    def targets(self, ormContext):
+        """Return the shards a statement has to run on.
+        (arg) ormContext-ORMExecuteState: The statement being executed.
+        (return) list[int]: Shard indexes.
+        """
+        source = ormContext.lazy_loaded_from if ormContext.is_select else None
+        if source is not None and isinstance(source.obj(), Club):
+            return [self.indexFor(source.obj().code)]
+        parameters = ormContext.parameters
+        pinned = _pinnedValues(ormContext.statement,
+                               parameters if isinstance(parameters, dict) else None)
+        for tableName in SHARDED_TABLES:
+            if (tableName, "club_code") in pinned:
+                # An empty IN list matches nothing; any one shard returns that
+                return sorted({self.indexFor(code) for code in pinned[(tableName, "club_code")]}) or [0]
+        if (Review.__tablename__, "id") in pinned:
+            return sorted({int(reviewId) % self.count
+                           for reviewId in pinned[(Review.__tablename__, "id")]}) or [0]
+        return list(range(self.count))
+
+    def _invoke(self, ormContext, index, **kwargs):
+        """Run the statement on one shard."""
+        bindArguments = dict(ormContext.bind_arguments, bind=self.engines[index])
+        return ormContext.invoke_statement(bind_arguments=bindArguments, **kwargs)
+
+    def execute(self, ormContext):
+        """Run a statement on the shards it touches and merge the results.
+        (arg) ormContext-ORMExecuteState: The statement being executed.
+        (return) Result: The combined result.
+        """
+        if ormContext.is_insert:
+            return self._insert(ormContext)
+        targets = self.targets(ormContext)
+        if len(targets) == 1:
+            return self._invoke(ormContext, targets[0])
+        if not ormContext.is_select:
+            results = [self._invoke(ormContext, index) for index in targets]
+            return results[-1]
+        return self._gather(ormContext, targets)
+
+    def _insert(self, ormContext):
+        """Send each inserted row to its club's shard."""
+        parameters = ormContext.parameters
+        rows = parameters if isinstance(parameters, list) else [parameters]
+        if not rows or not all(row and "club_code" in row for row in rows):
+            raise ValueError("Sharded inserts must pass club_code in their parameters")
+        if ormContext.statement.table.name == Review.__tablename__ \
+                and not all(row.get("id") for row in rows):
+            raise ValueError("Sharded review inserts outside the ORM must set ids")
+        groups = {}
+        for row in rows:
+            groups.setdefault(self.indexFor(row["club_code"]), []).append(row)
+        # invoke_statement keeps the caller's number of parameter sets, so
+        # executemany groups go straight to each shard's connection
+        result = None
+        for index, group in sorted(groups.items()):
+            connection = ormContext.session.connection(
+                bind_arguments={"bind": self.engines[index]})
+            if isinstance(parameters, list):
+                result = connection.execute(ormContext.statement, group)
+            else:
+                result = self._invoke(ormContext, index, params=parameters)
+            if ormContext.statement.table.name == Review.__tablename__:
+                self.advanceSequence(connection, [row["id"] for row in group])
+        return result
+
+    def _gather(self, ormContext, targets):
+        """Scatter a SELECT to several shards and merge the rows.
+        Plain rows are merge-sorted by the ORDER BY and cut to LIMIT/OFFSET;
+        COUNT, SUM, MIN and MAX are combined, per group when grouped. Groups
+        keyed by club_code never span shards and pass through unchanged.
+        (raise) UnsupportedShardQuery: For results that per-shard rows cannot
+        give, such as AVG over groups that span shards.
+        """
+        statement = ormContext.statement
+        limit, offset = statement._limit, statement._offset or 0
+        columns = list(statement.selected_columns)
+        aggregates = [_aggregateName(column) for column in columns]
+        groupBy = list(statement._group_by_clauses)
+        mergeGroups = bool(groupBy) and not any(
+            getattr(column, "name", None) == "club_code" for column in groupBy)
+        if mergeGroups and any(_isFunction(column) and not aggregate
+                               for column, aggregate in zip(columns, aggregates)):
+            raise UnsupportedShardQuery(
+                "Only COUNT, SUM, MIN and MAX merge across review shards unless grouped by club_code")
+        if any(aggregates) and not groupBy and not all(aggregates):
+            raise UnsupportedShardQuery("Mixed aggregate and plain columns across review shards")
+
+        perShard = statement
+        if mergeGroups:
+            # A group's rows from each shard are needed before the page can be cut
+            perShard = statement.limit(None).offset(None)
+        elif limit is not None:
+            perShard = statement.limit(limit + offset).offset(None)
+        elif offset:
+            perShard = statement.offset(None)
+        frozen = [self._invoke(ormContext, index, statement=perShard).freeze()
+                  for index in targets]
+        rows = [(row,) if part._source_supports_scalars else tuple(row)
+                for part in frozen for row in part.data]
+
+        if any(aggregates) and not groupBy:
+            rows = [tuple(_mergeAggregates(name, values)
+                          for name, values in zip(aggregates, zip(*rows)))]
+        else:
+            if mergeGroups:
+                groups = {}
+                for row in rows:
+                    key = tuple(value for value, name in zip(row, aggregates) if not name)
+                    groups.setdefault(key, []).append(row)
+                rows = [tuple(_mergeAggregates(name, values) if name else values[0]
+                              for name, values in zip(aggregates, zip(*group)))
+                        for group in groups.values()]
+            keys = list(frozen[0].metadata.keys)
+            for clause in reversed(statement._order_by_clauses):
+                descending = isinstance(clause, UnaryExpression) \
+                    and clause.modifier is operators.desc_op
+                column = clause.element if isinstance(clause, UnaryExpression) else clause
+                rows.sort(key=self._sortKey(column, keys), reverse=descending)
+            rows = rows[offset:None if limit is None else offset + limit]
+        return frozen[0].with_new_rows(rows)()
+
+    @staticmethod
+    def _sortKey(column, keys):
+        """Return a sort key function reading an ORDER BY column from a row."""
+        name = getattr(column, "key", None)
+        if name in keys:
+            position = keys.index(name)
+            pick = lambda row: row[position]
+        else:
+            pick = lambda row: getattr(row[0], name)
+        return lambda row: (pick(row) is None, pick(row))
+
+
+def getReviewShards():
+    """Return the review shards of the current app, if reviews are sharded.
+    (return) ReviewShards: The shards, or None.
+    """
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("reviewShards")
+
+
+def reviewConnection(session, clubCode):
+    """Return the connection that holds a club's reviews in the session's transaction.
+    (arg) session-Session: The session.
+    (arg) clubCode-str: The club code.
+    (return) Connection: The club's shard connection, or the main one.
+    """
+    shards = getReviewShards()
+    if shards is None:
+        return session.connection()
+    return session.connection(bind_arguments={"bind": shards.engineFor(clubCode)})
+
+
+@event.listens_for(RoutingSession, "do_orm_execute", retval=True)
+def _routeShardedStatement(ormContext):
+    """Run statements on sharded tables on the right shards."""
+    shards = getReviewShards()
+    if shards is None or ormContext.bind_arguments.get("bind") is not None \
+            or not shards.handles(ormContext):
+        return None
+    return shards.execute(ormContext)
+
+
+@event.listens_for(Review, "before_insert")
+def _allocateShardedReviewId(mapper, connection, review):
+    """Give a review inserted into a shard an id from that shard's sequence."""
+    shards = getReviewShards()
+    if shards is not None and review.id is None:
+        review.id = shards.allocateId(connection)
+
+
+@event.listens_for(Session, "before_flush")
+def _deleteShardedReviews(session, flushContext, instances):
+    """Delete the reviews and rollups of deleted clubs and users on the shards.
+    Shards have no foreign keys to the main database, so nothing cascades.
+    """
+    shards = getReviewShards()
+    if shards is None:
+        return
+    from .purge import deleteReviews
+    parents = [obj for obj in session.deleted if isinstance(obj, (Club, User))]
+    if not parents:
+        return
+    # Reviews the ORM already deletes through a loaded collection are skipped
+    deleting = {obj.id for obj in session.deleted if isinstance(obj, Review)}
+    with session.no_autoflush:
+        for parent in parents:
+            column, key = (Review.club_code, parent.code) if isinstance(parent, Club) \
+                else (Review.user_id, parent.id)
+            rows = session.execute(
+                select(Review.id, Review.club_code, Review.created_at, Review.rating)
+                .where(column == key)).all()
+            deleteReviews(session, [row for row in rows if row[0] not in deleting])
+            if isinstance(parent, Club):
+                session.execute(delete(ReviewRollup).where(ReviewRollup.club_code == key),
+                                execution_options={"synchronize_session": False})
+
+
+def configureReviewShards(app):
+    """Open the review shards when REVIEW_SHARDS is above one.
+    (arg) app-Flask: An app whose engines are configured.
+    (return) ReviewShards: The shards, or None if reviews stay in the main database.
+    """
+    count = app.config["REVIEW_SHARDS"]
+    if count <= 1:
+        return None
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    if isMemoryDatabase(uri) or not uri.startswith("sqlite:///"):
+        raise ValueError("REVIEW_SHARDS needs a file-backed SQLite database")
+    if app.config["GROUP_COMMIT"]:
+        raise ValueError("REVIEW_SHARDS cannot be combined with GROUP_COMMIT")
+    from .querystats import watchEngine
+    with app.app_context():
+        databasePath = db.engine.url.database
+    shards = ReviewShards(shardPaths(databasePath, count), app.config["READ_POOL_SIZE"],
+                          app.config["READ_POOL_OVERFLOW"],
+                          app.config["SQLALCHEMY_ENGINE_OPTIONS"].get("connect_args"))
+    if app.extensions.get("queryStats") is not None:
+        for engine in shards.engines:
+            watchEngine(engine)
+    shards.createAll()
+    app.extensions["reviewShards"] = shards
+    return shards
@@ -6,8 +6,7 @@ import re
 import html
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# Handlers are configured by the application, never at import time
 logger = logging.getLogger(__name__)
 
 
@@ -31,7 +30,7 @@ def validate_string(value, name, min_length=1, max_length=None, required=True):
             raise ValueError(f"{name} cannot exceed {max_length} characters")
         return True
     except (ValueError, TypeError) as e:
-        logger.warning(f"Validation failed for {name}: {str(e)}")
+        logger.warning("Validation failed for %s: %s", name, e, extra={"field": name})
         raise
 
 
@@ -48,7 +47,7 @@ def validate_integer(value, name, min_val=None, max_val=None, required=True):
             raise ValueError(f"{name} cannot exceed {max_val}")
         return True
     except (ValueError, TypeError) as e:
-        logger.warning(f"Validation failed for {name}: {str(e)}")
+        logger.warning("Validation failed for %s: %s", name, e, extra={"field": name})
         raise
 
 
@@ -61,7 +60,7 @@ def validate_boolean(value, name, required=True):
             raise TypeError(f"{name} must be a boolean")
         return True
     except (ValueError, TypeError) as e:
-        logger.warning(f"Validation failed for {name}: {str(e)}")
+        logger.warning("Validation failed for %s: %s", name, e, extra={"field": name})
         raise
 
 
@@ -73,7 +72,7 @@ def validate_email(email):
             raise ValueError("Invalid email format")
         return True
     except ValueError as e:
-        logger.warning(f"Email validation failed: {str(e)}")
+        logger.warning("Email validation failed: %s", e, extra={"field": "email"})
         raise
 
 
@@ -91,7 +90,7 @@ def validate_club_code(code):
             raise ValueError("Club code must be between 2-50 characters")
         return True
     except (ValueError, TypeError) as e:
-        logger.warning(f"Club code validation failed: {str(e)}")
+        logger.warning("Club code validation failed: %s", e, extra={"field": "code"})
         raise
 
 
@@ -106,7 +105,7 @@ def validate_tags(tags):
             validate_string(tag, "Tag", min_length=2, max_length=50)
         return True
     except (ValueError, TypeError) as e:
-        logger.warning(f"Tags validation failed: {str(e)}")
+        logger.warning("Tags validation failed: %s", e, extra={"field": "tags"})
         raise
 
 
@@ -0,0 +1,5 @@
+import os
+
+# Log records go to pytest's handlers instead of the JSON writer thread; set
+# before src is imported, as src.app builds its app at import time
+os.environ["CLUBREVIEW_STRUCTURED_LOGGING"] = "false"
@@ -0,0 +1,69 @@
+import json
+import threading
+
+import pytest
+
+from src.admission import AdmissionGate, routeClass
+from src.app import app, db
+
+@pytest.fixture(scope="function")
+def testClient():
+    """Set up an in-memory test client and database."""
+    app.config["TESTING"] = True
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+def test_route_classes():
+    """Test that endpoints map onto the configured route classes."""
+    assert routeClass("api.searchClubs", "GET") == "search"
+    assert routeClass("api.getClubReviewStats", "GET") == "stats"
+    assert routeClass("api.getClubs", "GET") == "reads"
+    assert routeClass("api.createReview", "POST") == "writes"
+
+def test_gate_queues_then_sheds():
+    """Test that a full gate queues up to its queue size and sheds the rest."""
+    gate = AdmissionGate("writes", limit=1, queueSize=1, timeout=5.0)
+    assert gate.acquire()
+
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(gate.acquire()))
+    waiter.start()
+    while gate.stats()["queue_depth"] == 0:
+        pass
+    # Queue is full, so the next request is rejected immediately
+    assert not gate.acquire()
+    gate.release()
+    waiter.join()
+    assert results == [True]
+    assert gate.stats()["rejected"] == 1
+    gate.release()
+    assert gate.stats()["active"] == 0
+
+def test_gate_times_out_queued_requests():
+    """Test that a queued request is shed once its wait times out."""
+    gate = AdmissionGate("reads", limit=1, queueSize=4, timeout=0.01)
+    assert gate.acquire()
+    assert not gate.acquire()
+    assert gate.stats()["timed_out"] == 1
+
+def test_overloaded_route_class_returns_503(testClient):
+    """Test that a saturated route class answers 503 with Retry-After."""
+    gate = app.extensions["admissionGates"]["writes"]
+    limit, queueSize = gate.limit, gate.queueSize
+    gate.limit, gate.queueSize = 0, 0
+    try:
+        response = testClient.post('/api/clubs', data=json.dumps({}),
+                                   content_type='application/json')
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        # Reads are admitted by their own gate
+        assert testClient.get('/api/clubs').status_code == 200
+        stats = json.loads(testClient.get('/api/debug/admission').data)
+        assert stats["writes"]["rejected"] >= 1
+        assert stats["reads"]["active"] == 0
+    finally:
+        gate.limit, gate.queueSize = limit, queueSize
@@ -0,0 +1,133 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from src import recommendations
+from src.analytics import ReviewColumns, reviewColumns, summarizeHistogram
+from src.app import app, db
+from src.models import ChangeEvent, Review, User
+from scripts.bootstrap import load_data
+
+# (username, club code, rating)
+REVIEWS = [
+    ("alice", "pppjo", 9), ("bobby", "pppjo", 7), ("carol", "pppjo", 8),
+    ("alice", "penn-memes", 4), ("bobby", "penn-memes", 6),
+    ("alice", "locustlabs", 10), ("carol", "lorem-ipsum", 2),
+]
+
+@pytest.fixture(scope="function")
+def testClient():
+    """Set up a test client with clubs, users and reviews."""
+    app.config["TESTING"] = True
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    with app.app_context():
+        db.create_all()
+        load_data()
+        users = {}
+        for username in sorted({username for username, _, _ in REVIEWS}):
+            user = User.createNewUser(username, f"{username}@upenn.edu", set())
+            users[username] = User.addUserToDb(user).id
+        for username, clubCode, rating in REVIEWS:
+            Review.addReviewToDb(Review.createNewReview(
+                users[username], clubCode, rating, "Review title", ""))
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+def getJson(testClient, path):
+    """Return the decoded JSON body of a successful GET."""
+    response = testClient.get(path)
+    assert response.status_code == 200
+    return json.loads(response.data)
+
+def test_summarize_histogram():
+    """Test nearest-rank percentiles over a rating histogram."""
+    summary = summarizeHistogram([0, 1, 0, 0, 0, 0, 0, 0, 0, 2, 1])
+    assert summary["count"] == 4
+    assert summary["average_rating"] == 7.25
+    assert (summary["p25"], summary["p50"], summary["p90"]) == (1, 9, 10)
+    assert summarizeHistogram([0] * 11)["p50"] is None
+
+def test_reused_review_id_replaces_the_whole_row():
+    """Test that a new review given a deleted review's id is stored under its own club, user and date."""
+    store = ReviewColumns()
+    store.built = True
+    store.apply([("upsert", 1, "lorem-ipsum", 1, 9, 100.0), ("upsert", 2, "locustlabs", 2, 4, 200.0),
+                 ("delete", 2), ("upsert", 2, "lorem-ipsum", 3, 7, 300.0)])
+    codes, histograms = store.clubHistograms()
+    counts = {code: [int(count) for count in histograms[ordinal]] for ordinal, code in enumerate(codes)}
+    assert counts["lorem-ipsum"][7] == counts["lorem-ipsum"][9] == 1
+    assert sum(counts["locustlabs"][1:]) == 0
+    assert (store.users[1], store.createdAt[1], store.deleted) == (3, 300.0, 0)
+    assert store.clubHistograms(start=250.0)[1][store.clubOrdinals["lorem-ipsum"]][7] == 1
+
+def test_tag_analytics(testClient):
+    """Test per-tag rating percentiles over the clubs carrying each tag."""
+    tags = getJson(testClient, '/api/analytics/tags')["tags"]
+    # Undergraduate: pppjo, lorem-ipsum, pppp, locustlabs
+    assert tags["Undergraduate"]["count"] == 5
+    assert tags["Undergraduate"]["p50"] == 8
+    assert tags["Literary"]["rating_distribution"]["2"] == 1
+    assert tags["Academic"]["count"] == 0
+
+def test_eligibility_analytics(testClient):
+    """Test rating distributions per eligibility class."""
+    classes = getJson(testClient, '/api/analytics/eligibility')["classes"]
+    assert classes["graduate"]["count"] == 2
+    assert classes["graduate"]["average_rating"] == 5.0
+    assert classes["both"]["count"] == 1
+    assert classes["undergraduate"]["count"] == 4
+
+def test_store_follows_writes(testClient):
+    """Test that inserts, edits and deletes reach the columnar store."""
+    getJson(testClient, '/api/analytics/tags')
+    assert len(reviewColumns) == len(REVIEWS)
+    review = Review.query.filter_by(club_code="lorem-ipsum").first()
+    testClient.put(f'/api/reviews/{review.id}', data=json.dumps({"rating": 10}),
+                   content_type='application/json')
+    tags = getJson(testClient, '/api/analytics/tags')["tags"]
+    assert tags["Literary"]["rating_distribution"]["10"] == 1
+    testClient.delete('/api/clubs/pppjo')
+    assert len(reviewColumns) == len(REVIEWS) - 3
+    assert getJson(testClient, '/api/analytics/tags')["tags"]["Undergraduate"]["count"] == 2
+
+def test_store_follows_other_processes(testClient):
+    """Test that reviews written outside this process are read back from the change log."""
+    getJson(testClient, '/api/analytics/tags')
+    dropped = Review.query.filter_by(club_code="lorem-ipsum").first().id
+    userId = User.query.filter_by(username="carol").first().id
+    db.session.remove()
+    # Another worker's commits: no session events fire here
+    with db.engine.begin() as connection:
+        added = connection.execute(Review.__table__.insert(), {
+            "user_id": userId, "club_code": "pppp", "rating": 3, "title": "Elsewhere",
+            "created_at": datetime.utcnow(), "updated_at": datetime.utcnow()}).inserted_primary_key[0]
+        connection.execute(Review.__table__.delete().where(Review.id == dropped))
+        connection.execute(ChangeEvent.__table__.insert(), [
+            {"entity": "review", "entity_key": str(key), "action": action,
+             "created_at": datetime.utcnow()}
+            for key, action in ((added, "created"), (dropped, "deleted"))])
+    tags = getJson(testClient, '/api/analytics/tags')["tags"]
+    assert len(reviewColumns) == len(REVIEWS)
+    # Literary: penn-memes and the deleted lorem-ipsum review; Academic: pppp
+    assert tags["Literary"]["count"] == 2
+    assert tags["Academic"]["count"] == 1 and tags["Academic"]["p50"] == 3
+
+def test_numpy_matches_fallback(testClient, monkeypatch):
+    """Test that the vectorized and pure Python aggregates agree."""
+    for clubCode, memberCount in (("pppjo", 200), ("penn-memes", 15), ("locustlabs", 80)):
+        testClient.put(f'/api/clubs/{clubCode}', data=json.dumps({"memberCount": memberCount}),
+                       content_type='application/json')
+    paths = ['/api/analytics/tags', '/api/analytics/eligibility',
+             '/api/analytics/member-correlation', '/api/analytics/tags?from=2000-01-01&to=2000-01-02']
+    expected = [getJson(testClient, path) for path in paths]
+    monkeypatch.setattr(recommendations, "np", None)
+    assert [getJson(testClient, path) for path in paths] == expected
+    assert expected[3]["tags"]["Undergraduate"]["count"] == 0
+    assert expected[2]["reviews"] == len(REVIEWS)
+    assert -1 <= expected[2]["review_level"] <= 1
+
+def test_analytics_bad_dates(testClient):
+    """Test that malformed date windows are rejected."""
+    assert testClient.get('/api/analytics/tags?from=yesterday').status_code == 400
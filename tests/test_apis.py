@@ -3,6 +3,8 @@ from src.app import app, db
 from src.models import Club, User
 from scripts.bootstrap import create_user, load_data
 import json
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 @pytest.fixture(scope="function")
 def testClient():
@@ -60,4 +62,122 @@ def testSearchClubsAPI(testClient):
     response = testClient.get('/api/clubs/search?query=Penn')
     assert response.status_code == 200
     clubs = json.loads(response.data)
-    assert all("Penn" in club["name"] for club in clubs)
\ No newline at end of file
+    assert all("Penn" in club["name"] for club in clubs)
+
+def testGetTagsAPI(testClient):
+    """Test listing tags with club counts, most used first.
+    (return) None
+    """
+    load_data()
+    expected = dict(db.session.execute(db.text(
+        "SELECT tag_name, COUNT(*) FROM club_tag_association GROUP BY tag_name")).all())
+
+    response = testClient.get('/api/tags?per_page=100')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    counts = [tag["club_count"] for tag in data["tags"]]
+    assert counts == sorted(counts, reverse=True)
+    assert {tag["name"]: tag["club_count"] for tag in data["tags"]} == expected
+    assert data["total"] == len(expected)
+
+    page = json.loads(testClient.get('/api/tags?sort=name&per_page=2&page=2').data)
+    assert [tag["name"] for tag in page["tags"]] == sorted(expected)[2:4]
+    assert testClient.get('/api/tags?sort=size').status_code == 400
+    for query in ("page=0", "page=-1", "per_page=0", "per_page=101"):
+        assert testClient.get(f'/api/tags?{query}').status_code == 400
+
+def testTagCountsFollowClubChanges(testClient):
+    """Test that tag club counts follow tag edits and club deletes.
+    (return) None
+    """
+    load_data()
+    def count(name):
+        return json.loads(testClient.get(f'/api/tags/{name}').data)["club_count"]
+    before = count("Undergraduate")
+
+    testClient.put('/api/clubs/pppjo', data=json.dumps({"tags": ["Academic", "Literary"]}),
+                   content_type='application/json')
+    assert count("Undergraduate") == before - 1
+    testClient.delete('/api/clubs/locustlabs')
+    db.session.get(Club, "lorem-ipsum").removeTag("Undergraduate")
+    db.session.commit()
+    remaining = db.session.execute(db.text(
+        "SELECT COUNT(*) FROM club_tag_association WHERE tag_name = 'Undergraduate'")).scalar()
+    assert count("Undergraduate") == remaining == before - 3
+
+def testGetTagClubsPaginatedAPI(testClient):
+    """Test paging through a tag's clubs as compact entries.
+    (return) None
+    """
+    load_data()
+    first = json.loads(testClient.get('/api/tags/Undergraduate?per_page=1').data)
+    assert first["club_count"] == first["pages"]
+    assert set(first["clubs"][0]) == {"code", "name", "memberCount"}
+    second = json.loads(testClient.get('/api/tags/Undergraduate?per_page=1&page=2').data)
+    assert second["clubs"][0]["code"] > first["clubs"][0]["code"]
+    assert testClient.get('/api/tags/Nonexistent').status_code == 404
+    for query in ("page=0", "page=-1", "per_page=0"):
+        assert testClient.get(f'/api/tags/Undergraduate?{query}').status_code == 400
+
+def testFavoriteCountsFollowUserChanges(testClient):
+    """Test that favorites_count follows every favorite change and paging uses it.
+    (return) None
+    """
+    load_data()
+    def favorites(code, query="count_only=true"):
+        return json.loads(testClient.get(f'/api/clubs/{code}/favoritedBy?{query}').data)
+    userIds = []
+    for username in ("alice", "bobby", "carol"):
+        response = testClient.post('/api/users', data=json.dumps({
+            "username": username, "email": f"{username}@upenn.edu", "favorites": ["pppjo"]}),
+            content_type='application/json')
+        userIds.append(json.loads(response.data)["id"])
+    assert favorites("pppjo")["favorites_count"] == 3
+
+    testClient.put(f'/api/users/{userIds[0]}', data=json.dumps({"favorites": ["pppp"]}),
+                   content_type='application/json')
+    user = db.session.get(User, userIds[1])
+    user.addFavorite("pppp")
+    user.favoriteClubs.append(db.session.get(Club, "penn-memes"))
+    db.session.commit()
+    testClient.delete(f'/api/users/{userIds[2]}')
+    assert favorites("pppjo")["favorites_count"] == 1
+    assert favorites("pppp")["favorites_count"] == 2
+    assert favorites("penn-memes")["favorites_count"] == 1
+
+    first = favorites("pppp", "per_page=1")
+    second = favorites("pppp", "per_page=1&page=2")
+    assert first["pages"] == 2
+    assert first["favorited_by"] + second["favorited_by"] == ["alice", "bobby"]
+    assert testClient.get('/api/clubs/pppp/favoritedBy?per_page=0').status_code == 400
+    assert testClient.get('/api/clubs/pppp/favoritedBy?page=0').status_code == 400
+    assert testClient.get('/api/clubs/pppp/favoritedBy?page=-2').status_code == 400
+
+def testMultiGetClubsAndUsersAPI(testClient):
+    """Test fetching several clubs and users by key in request order.
+    (return) None
+    """
+    load_data()
+    create_user()
+    statements = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    # GET requests may read through the read pool, so listen on every engine
+    event.listen(Engine, "before_cursor_execute", capture)
+    try:
+        response = testClient.get('/api/clubs?codes=pppp,nope,PPPJO,pppp')
+    finally:
+        event.remove(Engine, "before_cursor_execute", capture)
+    data = json.loads(response.data)
+    assert [club["code"] for club in data["clubs"]] == ["pppp", "pppjo"]
+    assert data["missing"] == ["nope"]
+    # Clubs, then their tags and their reviews in one batch each
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 3
+
+    josh = User.query.filter_by(username="Josh").first()
+    data = json.loads(testClient.get(f'/api/users?ids=999,{josh.id}').data)
+    assert [user["username"] for user in data["users"]] == ["Josh"]
+    assert data["missing"] == [999]
+    assert testClient.get('/api/users?ids=1,abc').status_code == 400
+    tooMany = ",".join(str(i) for i in range(1, 102))
+    assert testClient.get(f'/api/users?ids={tooMany}').status_code == 400
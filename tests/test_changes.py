@@ -0,0 +1,73 @@
+import json
+import threading
+import time
+
+import pytest
+
+from src.app import app, db
+from scripts.bootstrap import load_data, create_user
+
+@pytest.fixture(scope="function")
+def testClient():
+    """Set up a test client with the bundled clubs and one user."""
+    app.config["TESTING"] = True
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    with app.app_context():
+        db.create_all()
+        load_data()
+        create_user()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+def getChanges(testClient, query=""):
+    """Return the decoded /api/changes response."""
+    response = testClient.get(f'/api/changes{query}')
+    assert response.status_code == 200
+    return json.loads(response.data)
+
+def test_changes_are_logged_in_order(testClient):
+    """Test that creates, updates and deletes show up as typed events."""
+    cursor = getChanges(testClient, '?limit=1000')["cursor"]
+    testClient.put('/api/clubs/pppjo', data=json.dumps({"memberCount": 40, "tags": ["Academic"]}),
+                   content_type='application/json')
+    testClient.post('/api/reviews', data=json.dumps({
+        "user_id": 1, "club_code": "pppp", "rating": 8, "title": "Great club"}),
+        content_type='application/json')
+    testClient.delete('/api/clubs/lorem-ipsum')
+
+    feed = getChanges(testClient, f'?since={cursor}')
+    events = [(change["entity"], change["key"], change["action"]) for change in feed["changes"]]
+    assert events[0] == ("club", "pppjo", "updated")
+    assert ("review", "1", "created") in events
+    assert events[-1] == ("club", "lorem-ipsum", "deleted")
+    # One event per object and transaction, however many flushes it took
+    assert events.count(("club", "pppjo", "updated")) == 1
+    assert feed["cursor"] == feed["changes"][-1]["cursor"] > cursor
+    assert getChanges(testClient, f'?since={feed["cursor"]}')["changes"] == []
+
+def test_changes_paginate(testClient):
+    """Test limit and has_more when more changes are waiting."""
+    first = getChanges(testClient, '?limit=2')
+    assert len(first["changes"]) == 2 and first["has_more"]
+    second = getChanges(testClient, f'?since={first["cursor"]}&limit=1000')
+    assert second["changes"][0]["cursor"] > first["cursor"]
+    assert not second["has_more"]
+    assert testClient.get('/api/changes?limit=0').status_code == 400
+    assert testClient.get('/api/changes?wait=60').status_code == 400
+
+def test_long_poll_wakes_on_commit(testClient):
+    """Test that a waiting request returns as soon as a change is committed."""
+    cursor = getChanges(testClient, '?limit=1000')["cursor"]
+    started = time.monotonic()
+    results = []
+    poller = threading.Thread(target=lambda: results.append(
+        getChanges(app.test_client(), f'?since={cursor}&wait=10')))
+    poller.start()
+    time.sleep(0.2)
+    testClient.put('/api/clubs/pppp', data=json.dumps({"memberCount": 7}),
+                   content_type='application/json')
+    poller.join()
+    # Faster than the one second re-poll, so the commit woke the request
+    assert time.monotonic() - started < 1.0
+    assert [change["key"] for change in results[0]["changes"]] == ["pppp"]
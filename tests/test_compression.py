@@ -0,0 +1,72 @@
+import gzip
+import json
+
+import pytest
+
+from src.app import app, db
+from src.compression import chooseEncoding
+from scripts.bootstrap import load_data
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+@pytest.fixture(scope="function")
+def testClient():
+    """Set up a test client with the bundled clubs loaded."""
+    app.config["TESTING"] = True
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    with app.app_context():
+        db.create_all()
+        load_data()
+        app.extensions["compressionCache"].clear()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+def test_choose_encoding():
+    """Test Accept-Encoding negotiation."""
+    assert chooseEncoding(parse_accept_header("gzip, deflate")) == "gzip"
+    assert chooseEncoding(parse_accept_header("gzip;q=0, identity")) is None
+    assert chooseEncoding(parse_accept_header("")) is None
+    assert chooseEncoding(Accept()) is None
+
+def test_large_json_is_gzipped(testClient):
+    """Test that big JSON payloads are compressed when the client accepts gzip."""
+    plain = testClient.get('/api/clubs')
+    assert "Content-Encoding" not in plain.headers
+    assert plain.headers["ETag"]
+
+    response = testClient.get('/api/clubs', headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert json.loads(gzip.decompress(response.data)) == json.loads(plain.data)
+    assert len(response.data) < len(plain.data)
+
+def test_compressed_body_is_cached(testClient):
+    """Test that a repeated payload is compressed once and then served from cache."""
+    cache = app.extensions["compressionCache"]
+    first = testClient.get('/api/clubs', headers={"Accept-Encoding": "gzip"})
+    second = testClient.get('/api/clubs', headers={"Accept-Encoding": "gzip"})
+    assert first.data == second.data
+    assert cache.misses == 1 and cache.hits == 1
+
+def test_small_payload_not_compressed(testClient):
+    """Test that responses under the size threshold are sent as-is."""
+    response = testClient.get('/api/clubs/pppjo/reviews', headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+
+def test_etag_revalidation(testClient):
+    """Test that a matching If-None-Match yields 304 and a change yields 200."""
+    response = testClient.get('/api/clubs', headers={"Accept-Encoding": "gzip"})
+    etag = response.headers["ETag"]
+    cached = testClient.get('/api/clubs', headers={"Accept-Encoding": "gzip",
+                                                   "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.data == b""
+
+    testClient.put('/api/clubs/pppjo', data=json.dumps({"memberCount": 12}),
+                   content_type='application/json')
+    changed = testClient.get('/api/clubs', headers={"Accept-Encoding": "gzip",
+                                                    "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
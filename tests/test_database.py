@@ -0,0 +1,97 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateTable
+
+from src.database import DEFAULT_CONFIG, create_app, db, engineOptions, getReadEngine
+from src.models import Club, Review, Tag
+
+@pytest.fixture(scope="function")
+def fileApp(tmp_path):
+    """Set up an app backed by a temporary SQLite file.
+    (return) Flask: App with a writer connection and a read-only pool.
+    """
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'routing.db'}"})
+    with app.app_context():
+        db.create_all()
+        Tag.addTagToDb(Tag.createTag("Academic"))
+        db.session.commit()
+        db.session.remove()
+    yield app
+    with app.app_context():
+        getReadEngine().dispose()
+        db.engine.dispose()
+
+def test_writer_uses_wal(fileApp):
+    """Test that the writer connection switches the file to WAL."""
+    with fileApp.app_context():
+        mode = db.session.execute(text("PRAGMA journal_mode")).scalar()
+        assert mode == "wal"
+
+def test_get_requests_use_read_pool(fileApp):
+    """Test that GET request queries are routed to the read-only engine."""
+    with fileApp.test_request_context("/api/tags", method="GET"):
+        assert db.session.get_bind() is getReadEngine()
+        assert Tag.query.filter_by(name="Academic").first() is not None
+        with pytest.raises(OperationalError):
+            db.session.execute(text("CREATE TABLE scratch (id INTEGER)"))
+        db.session.remove()
+
+def test_write_requests_use_writer(fileApp):
+    """Test that non-GET requests and flushes go to the writer engine."""
+    with fileApp.test_request_context("/api/tags", method="POST"):
+        assert db.session.get_bind() is db.engine
+        db.session.remove()
+    with fileApp.test_request_context("/api/tags", method="GET"):
+        Tag.addTagToDb(Tag.createTag("Literary"))
+        db.session.commit()
+        assert Tag.query.filter_by(name="Literary").first() is not None
+        db.session.remove()
+
+def test_memory_database_has_no_read_pool():
+    """Test that in-memory databases keep a single shared engine."""
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+    with app.test_request_context("/", method="GET"):
+        assert getReadEngine() is None
+        assert db.session.get_bind() is db.engine
+
+def test_environment_configures_database(tmp_path, monkeypatch):
+    """Test that the URI and pool settings come from the environment, below explicit config."""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'env.db'}")
+    monkeypatch.setenv("CLUBREVIEW_DATABASE_STATEMENT_TIMEOUT_MS", "250")
+    monkeypatch.setenv("CLUBREVIEW_READ_POOL_SIZE", "2")
+    app = create_app({"READ_POOL_OVERFLOW": 1})
+    with app.app_context():
+        assert db.engine.url.database == str(tmp_path / 'env.db')
+        assert db.engine.pool.size() == 1
+        assert getReadEngine().pool.size() == 2
+        assert app.config["SQLALCHEMY_ENGINE_OPTIONS"]["connect_args"]["timeout"] == 0.25
+        getReadEngine().dispose()
+        db.engine.dispose()
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+    with app.app_context():
+        assert db.engine.url.database == ":memory:"
+
+def test_server_engine_options():
+    """Test the pool and statement timeout options for a server database."""
+    config = dict(DEFAULT_CONFIG, SQLALCHEMY_DATABASE_URI="postgresql://club@db/clubreview",
+                  DATABASE_POOL_SIZE=20, DATABASE_STATEMENT_TIMEOUT_MS=1500)
+    options = engineOptions(config)
+    assert options["pool_size"] == 20
+    assert options["max_overflow"] == DEFAULT_CONFIG["DATABASE_MAX_OVERFLOW"]
+    assert options["pool_pre_ping"] is True
+    assert options["connect_args"] == {"options": "-c statement_timeout=1500"}
+    config["SQLALCHEMY_ENGINE_OPTIONS"] = {"pool_size": 5, "connect_args": {"sslmode": "require"}}
+    options = engineOptions(config)
+    assert options["pool_size"] == 5
+    assert options["connect_args"] == {"options": "-c statement_timeout=1500", "sslmode": "require"}
+
+def test_check_constraints_compile_for_postgres():
+    """Test that the table constraints quote mixed-case columns and count characters on PostgreSQL."""
+    clubDdl = str(CreateTable(Club.__table__).compile(dialect=postgresql.dialect()))
+    assert 'CHECK ("memberCount" >= 0)' in clubDdl
+    assert 'CHECK ("undergraduatesAllowed" OR "graduatesAllowed")' in clubDdl
+    assert "CHECK (char_length(name) >= 3)" in clubDdl
+    reviewDdl = str(CreateTable(Review.__table__).compile(dialect=postgresql.dialect()))
+    assert "CHECK (rating BETWEEN 1 AND 10)" in reviewDdl
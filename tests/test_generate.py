@@ -0,0 +1,91 @@
+import json
+
+import pytest
+from sqlalchemy import func, select
+
+from src.database import create_app, db
+from src.models import Club, Review, ReviewRollup, Tag, clubTagAssociation, userClubAssociation
+from src.shards import shardIndex
+from scripts.generate import DatasetGenerator, allocate, generate
+
+@pytest.fixture(scope="function")
+def memoryApp():
+    """Set up an empty in-memory app."""
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "TESTING": True})
+    with app.app_context():
+        db.create_all()
+        db.session.remove()
+    yield app
+
+def test_generator_is_deterministic():
+    """Test that a seed fixes every row and reviews are one per user and club."""
+    first = DatasetGenerator(30, 200, 1500, seed=7)
+    second = DatasetGenerator(30, 200, 1500, seed=7)
+    assert list(first.clubTagRows()) == list(second.clubTagRows())
+    assert list(first.favoriteRows()) == list(second.favoriteRows())
+    reviews = list(first.reviewRows())
+    assert reviews == list(second.reviewRows())
+    assert len(reviews) == 1500
+    assert len({(review["user_id"], review["club_code"]) for review in reviews}) == 1500
+    assert reviews != list(DatasetGenerator(30, 200, 1500, seed=8).reviewRows())
+    # Clubs and users do not depend on the number of reviews
+    assert list(first.clubRows()) == list(DatasetGenerator(30, 200, 10, seed=7).clubRows())
+
+def test_allocate_respects_total_and_cap():
+    """Test that allocation hands out exactly the total without passing the cap."""
+    counts = allocate(50, [100.0, 1.0, 1.0, 1.0], 20)
+    assert sum(counts) == 50 and max(counts) == 20
+    with pytest.raises(ValueError):
+        allocate(81, [1.0] * 4, 20)
+
+def test_generate_fills_tables_and_derived_counts(memoryApp):
+    """Test a load into an app: row counts, favorite and tag counts, rollups and the API."""
+    generator = DatasetGenerator(20, 100, 800, seed=3, favoritesPerUser=3.0)
+    with memoryApp.app_context():
+        written = generate(db.session, generator, batchSize=64)
+        session = db.session
+        assert session.scalar(select(func.count()).select_from(Review)) == 800
+        assert written["clubs"] == 20 and written["users"] == 100
+        favorites = dict(session.execute(select(userClubAssociation.c.club_code, func.count())
+                                         .group_by(userClubAssociation.c.club_code)).all())
+        for club in session.scalars(select(Club)):
+            assert club.favorites_count == favorites.get(club.code, 0)
+            assert club.undergraduatesAllowed or club.graduatesAllowed
+        tagged = dict(session.execute(select(clubTagAssociation.c.tag_name, func.count())
+                                      .group_by(clubTagAssociation.c.tag_name)).all())
+        assert {tag.name: tag.clubCount for tag in session.scalars(select(Tag))
+                if tag.clubCount} == tagged
+        assert session.scalar(select(func.sum(ReviewRollup.review_count))
+                              .where(ReviewRollup.bucket == "month")) == 800
+        busiest = session.scalar(select(Review.club_code).group_by(Review.club_code)
+                                 .order_by(func.count().desc()).limit(1))
+        db.session.remove()
+    client = memoryApp.test_client()
+    stats = json.loads(client.get(f'/api/clubs/{busiest}/reviews/stats').data)
+    assert stats["total_reviews"] > 800 / 20
+    # The search index is rebuilt after the load and kept current afterwards
+    found = json.loads(client.get('/api/reviews/search?q=recruiting&per_page=100').data)
+    assert found["results"] and all("recruiting" in (review["text"] or "").lower()
+                                    or "recruiting" in review["title"].lower()
+                                    for review in found["results"])
+
+def test_generate_into_review_shards(tmp_path):
+    """Test that sharded loads put each review on its club's shard with a matching id."""
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'main.db'}",
+                      "REVIEW_SHARDS": 3, "BACKGROUND_PURGE": False})
+    shards = app.extensions["reviewShards"]
+    with app.app_context():
+        db.create_all()
+        generate(db.session, DatasetGenerator(12, 60, 300, seed=1, shardCount=3), batchSize=50)
+        total = 0
+        for index, engine in enumerate(shards.engines):
+            with engine.connect() as connection:
+                for reviewId, clubCode in connection.execute(select(Review.id, Review.club_code)):
+                    assert shardIndex(clubCode, 3) == index == reviewId % 3
+                    total += 1
+        assert total == 300
+        assert db.session.scalar(select(func.sum(ReviewRollup.review_count))
+                                 .where(ReviewRollup.bucket == "day")) == 300
+        db.session.remove()
+        db.drop_all()
+    shards.dropAll()
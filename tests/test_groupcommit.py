@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from src import groupcommit
+from src.database import create_app, db, getReadEngine, routesToReadPool
+from src.models import Club, User, Review
+from scripts.bootstrap import load_data, create_user
+
+CLUB_CODES = ["pppjo", "lorem-ipsum", "penn-memes", "pppp", "locustlabs"]
+
+@pytest.fixture(scope="function")
+def groupApp(tmp_path):
+    """Set up a file-backed app with group commit enabled.
+    (return) Flask: App whose inserts go through the group committer.
+    """
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'group.db'}",
+        "GROUP_COMMIT": True,
+        "GROUP_COMMIT_WINDOW_MS": 50
+    })
+    committer = app.extensions["groupCommitter"]
+    with app.app_context():
+        db.create_all()
+        load_data()
+        create_user()
+        db.session.remove()
+    yield app
+    committer.stop()
+    with app.app_context():
+        getReadEngine().dispose()
+        db.engine.dispose()
+
+def submitReview(app, userId, clubCode, results):
+    """Create a review inside a POST request context and record the outcome."""
+    with app.test_request_context("/api/reviews", method="POST"):
+        try:
+            review = Review.createNewReview(user_id=userId, club_code=clubCode,
+                                            rating=7, title="Group commit review")
+            Review.addReviewToDb(review)
+            results[clubCode] = review.toJson()
+        except Exception as e:
+            results[clubCode] = e
+        finally:
+            db.session.remove()
+
+def test_user_insert_goes_through_committer(groupApp):
+    """Test that users and their favorites are committed by the writer thread."""
+    committer = groupApp.extensions["groupCommitter"]
+    with groupApp.app_context():
+        josh = User.query.filter_by(username="Josh").first()
+        assert {club.code for club in josh.favoriteClubs} == {"penn-memes"}
+    assert committer.unitsCommitted >= 1
+
+def test_concurrent_reviews_share_batches(groupApp):
+    """Test that concurrent review inserts are coalesced into fewer commits."""
+    committer = groupApp.extensions["groupCommitter"]
+    batchesBefore = committer.batchesCommitted
+    with groupApp.app_context():
+        userId = User.query.filter_by(username="Josh").first().id
+    results = {}
+    threads = [threading.Thread(target=submitReview, args=(groupApp, userId, code, results))
+               for code in CLUB_CODES]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(isinstance(result, dict) for result in results.values())
+    assert results["pppjo"]["user_username"] == "Josh"
+    assert committer.batchesCommitted - batchesBefore < len(CLUB_CODES)
+    with groupApp.app_context():
+        assert Review.query.count() == len(CLUB_CODES)
+
+def test_constraint_error_fails_only_its_request(groupApp):
+    """Test that one failing unit does not roll back the rest of its batch."""
+    committer = groupApp.extensions["groupCommitter"]
+    with groupApp.app_context():
+        userId = User.query.filter_by(username="Josh").first().id
+    duplicate = Review(user_id=userId, club_code="pppjo", rating=5, title="First review")
+    committer.submit(lambda session: session.add(duplicate))
+
+    results = {}
+    def submitDuplicate():
+        try:
+            committer.submit(lambda session: session.add(
+                Review(user_id=userId, club_code="pppjo", rating=6, title="Second review")))
+            results["duplicate"] = None
+        except Exception as e:
+            results["duplicate"] = e
+
+    threads = [threading.Thread(target=submitDuplicate),
+               threading.Thread(target=submitReview, args=(groupApp, userId, "pppp", results))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert isinstance(results["duplicate"], IntegrityError)
+    assert isinstance(results["pppp"], dict)
+    with groupApp.app_context():
+        assert Review.query.count() == 2
+
+def test_failed_begin_fails_every_waiting_request(groupApp, monkeypatch):
+    """Test that a batch failing before its first unit fails its requests at once."""
+    committer = groupApp.extensions["groupCommitter"]
+    committer.timeout = 2
+    def failingBegin(session, *args, **kwargs):
+        raise RuntimeError("disk I/O error")
+    monkeypatch.setattr(groupcommit.Session, "begin", failingBegin)
+    with pytest.raises(RuntimeError, match="disk I/O error"):
+        committer.submit(lambda session: None)
+
+def test_write_requests_read_on_the_writer(groupApp):
+    """Test that reads in write requests skip the read pool while group commit is on."""
+    with groupApp.test_request_context("/api/clubs/pppjo", method="PUT"):
+        assert not routesToReadPool()
+    with groupApp.test_request_context("/api/clubs/pppjo", method="GET"):
+        assert routesToReadPool()
@@ -0,0 +1,156 @@
+import json
+import os
+import socket
+import subprocess
+import time
+
+import pytest
+from sqlalchemy import text
+
+from src.database import create_app, db, getReadEngine
+from src.jobs import INTERRUPTED_ERROR, configureJobs
+from src.models import Club, Job, Review, ReviewRollup, User
+from scripts.bootstrap import load_data
+
+@pytest.fixture(scope="function")
+def jobApp(tmp_path):
+    """Set up a file-backed app with one job worker and reviews to work on.
+    (return) Flask: App with a threaded job runner.
+    """
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'jobs.db'}",
+        "PURGE_BATCH_SIZE": 1,
+        "JOB_PAUSE_MS": 0
+    })
+    app.instance_path = str(tmp_path)
+    with app.app_context():
+        db.create_all()
+        load_data()
+        for username in ("alice", "bobby", "carol"):
+            user = User.addUserToDb(User.createNewUser(username, f"{username}@upenn.edu", set()))
+            Review.addReviewToDb(Review.createNewReview(user.id, "pppjo", 8, "Review title"))
+        db.session.remove()
+    yield app
+    app.extensions["jobRunner"].shutdown()
+    with app.app_context():
+        getReadEngine().dispose()
+        db.engine.dispose()
+
+def waitForJob(client, jobId, timeout=10.0):
+    """Poll a job until it finishes and return its JSON."""
+    deadline = time.monotonic() + timeout
+    while True:
+        job = json.loads(client.get(f'/api/jobs/{jobId}').data)
+        if job["status"] in ("succeeded", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.02)
+
+def test_rebuild_job_runs_in_background(jobApp):
+    """Test that a queued rollup rebuild succeeds and reports its result."""
+    client = jobApp.test_client()
+    with jobApp.app_context():
+        db.session.query(ReviewRollup).delete()
+        db.session.commit()
+    response = client.post('/api/jobs', data=json.dumps({"kind": "rebuild_rollups"}),
+                           content_type='application/json')
+    assert response.status_code == 202
+    job = json.loads(response.data)
+    assert response.headers["Location"] == f"/api/jobs/{job['id']}"
+    job = waitForJob(client, job["id"])
+    assert job["status"] == "succeeded" and job["progress"] == 1.0
+    assert job["result"]["rollup_rows"] > 0
+    stats = json.loads(client.get('/api/clubs/pppjo/reviews/trend').data)
+    assert sum(bucket["count"] for bucket in stats["buckets"]) == 3
+
+def test_reindex_search_job(jobApp):
+    """Test that the reindex job restores a search index that was dropped."""
+    client = jobApp.test_client()
+    with jobApp.app_context():
+        db.session.execute(text("DROP TABLE review_search"))
+        db.session.commit()
+    response = client.post('/api/jobs', data=json.dumps({"kind": "reindex_search"}),
+                           content_type='application/json')
+    job = waitForJob(client, json.loads(response.data)["id"])
+    assert job["status"] == "succeeded" and job["result"]["reviews"] == 3
+    data = json.loads(client.get('/api/reviews/search?q=review').data)
+    assert len(data["results"]) == 3
+
+def test_purge_and_export_jobs_report_progress(jobApp):
+    """Test that batched jobs commit progress and finish with their result."""
+    client = jobApp.test_client()
+    response = client.post('/api/jobs', data=json.dumps({
+        "kind": "export", "params": {"entities": ["clubs", "reviews"], "batchSize": 2}}),
+        content_type='application/json')
+    job = waitForJob(client, json.loads(response.data)["id"])
+    assert job["status"] == "succeeded"
+    with open(job["result"]["path"]) as exported:
+        lines = [json.loads(line) for line in exported]
+    assert len(lines) == job["result"]["rows"]["clubs"] + 3
+    assert {line["type"] for line in lines} == {"clubs", "reviews"}
+
+    response = client.post('/api/jobs', data=json.dumps({
+        "kind": "purge", "params": {"kind": "club", "key": "pppjo"}}),
+        content_type='application/json')
+    job = waitForJob(client, json.loads(response.data)["id"])
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"reviews_deleted": 3}
+    assert job["message"] == "Deleted 3 reviews"
+    with jobApp.app_context():
+        assert db.session.get(Club, "pppjo") is None
+
+def test_failed_jobs_and_limits(jobApp):
+    """Test failure reporting, unknown kinds, missing jobs and the queue limit."""
+    client = jobApp.test_client()
+    response = client.post('/api/jobs', data=json.dumps({
+        "kind": "purge", "params": {"kind": "tag"}}), content_type='application/json')
+    job = waitForJob(client, json.loads(response.data)["id"])
+    assert job["status"] == "failed" and "purge needs" in job["error"]
+    response = client.post('/api/jobs', data=json.dumps({"kind": "defragment"}),
+                           content_type='application/json')
+    assert response.status_code == 400
+    assert client.get('/api/jobs/999').status_code == 404
+
+    runner = jobApp.extensions["jobRunner"]
+    runner.queueSize = 0
+    response = client.post('/api/jobs', data=json.dumps({"kind": "recount_tags"}),
+                           content_type='application/json')
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
+
+def test_unfinished_jobs_of_exited_processes_fail_on_start(jobApp):
+    """Test that startup fails orphaned queued and running jobs and leaves live ones alone."""
+    exited = subprocess.Popen(["true"])
+    exited.wait()
+    host = socket.gethostname()
+    owners = {"exited": f"{host}:{exited.pid}", "alive": f"{host}:{os.getppid()}",
+              "remote": "elsewhere:1", "legacy": None}
+    with jobApp.app_context():
+        ids = {}
+        for name, owner in owners.items():
+            job = Job.createJob("recount_tags", {})
+            job.status, job.owner = "running", owner
+            db.session.add(job)
+            db.session.commit()
+            ids[name] = job.id
+        db.session.remove()
+    jobApp.extensions["jobRunner"].shutdown()
+    configureJobs(jobApp)
+    client = jobApp.test_client()
+    statuses = {name: json.loads(client.get(f'/api/jobs/{jobId}').data)["status"]
+                for name, jobId in ids.items()}
+    assert statuses == {"exited": "failed", "alive": "running", "remote": "running",
+                        "legacy": "failed"}
+    assert json.loads(client.get(f'/api/jobs/{ids["exited"]}').data)["error"] == INTERRUPTED_ERROR
+
+    # A job row that disappears before it runs is skipped without an error
+    jobApp.extensions["jobRunner"]._run(10 ** 6)
+
+def test_memory_database_runs_jobs_inline():
+    """Test that jobs finish within the request when the database is in memory."""
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+    with app.app_context():
+        db.create_all()
+    response = app.test_client().post('/api/jobs', data=json.dumps({"kind": "recount_tags"}),
+                                      content_type='application/json')
+    assert response.status_code == 202
+    assert json.loads(response.data)["status"] == "succeeded"
@@ -0,0 +1,74 @@
+import json
+import logging
+import queue
+
+import pytest
+
+from src import logconfig
+from src.database import create_app
+from src.logconfig import JsonFormatter, NonBlockingQueueHandler, RateLimitFilter
+
+def makeRecord(msg="Validation failed for %s: %s", args=("Tag", "too short"), level=logging.WARNING):
+    """Return a log record as a logger call would create it."""
+    return logging.getLogger("src.validation").makeRecord(
+        "src.validation", level, __file__, 1, msg, args, None, extra={"field": "Tag"})
+
+def test_json_formatter_includes_extra_fields():
+    """Test that records become one JSON object with their extra fields."""
+    entry = json.loads(JsonFormatter().format(makeRecord()))
+    assert entry["message"] == "Validation failed for Tag: too short"
+    assert entry["level"] == "WARNING"
+    assert entry["field"] == "Tag"
+    assert "args" not in entry
+
+def test_rate_limit_then_sample():
+    """Test that a template passes a burst, then one in every few records."""
+    limiter = RateLimitFilter(burst=2, window=60.0, sampleEvery=3)
+    passed = [limiter.filter(makeRecord()) for _ in range(11)]
+    assert passed == [True, True, False, False, True, False, False, True, False, False, True]
+    sampled = makeRecord()
+    for _ in range(2):
+        limiter.filter(makeRecord())
+    assert limiter.filter(sampled) and sampled.suppressed == 2
+    assert limiter.filter(makeRecord("Other template %s", ("x",)))
+    assert all(limiter.filter(makeRecord(level=logging.ERROR)) for _ in range(20))
+
+def test_queue_handler_defers_formatting_and_never_blocks():
+    """Test that records are queued unformatted and dropped when the queue is full."""
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    record = makeRecord()
+    handler.handle(record)
+    handler.handle(makeRecord())
+    assert handler.dropped == 1
+    queued = handler.queue.get_nowait()
+    assert queued.msg == "Validation failed for %s: %s" and queued.args == ("Tag", "too short")
+
+@pytest.fixture(scope="function")
+def structuredLogging(monkeypatch):
+    """Let a test install the process's log handler, then restore the src logger.
+    (return) dict: Config that turns structured logging on.
+    """
+    logger = logging.getLogger("src")
+    level = logger.level
+    monkeypatch.setattr(logconfig, "_handler", None)
+    monkeypatch.setattr(logger, "handlers", [])
+    monkeypatch.setattr(logger, "propagate", logger.propagate)
+    yield {"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "STRUCTURED_LOGGING": True}
+    logconfig.stopWriter()
+    logger.setLevel(level)
+
+def test_app_logs_through_queue_handler(structuredLogging):
+    """Test that create_app routes the src loggers to the queue handler once."""
+    first = create_app(structuredLogging)
+    second = create_app(structuredLogging)
+    handler = first.extensions["logHandler"]
+    assert handler is second.extensions["logHandler"]
+    assert logging.getLogger("src").handlers.count(handler) == 1
+    assert first.logger.name.startswith("src") and not first.logger.handlers
+
+def test_tests_leave_src_logs_to_pytest(caplog):
+    """Test that without structured logging src records reach pytest's handlers."""
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+    assert "logHandler" not in app.extensions
+    logging.getLogger("src.validation").warning("Captured %s", "warning")
+    assert "Captured warning" in caplog.text
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+from flask import g
+
+from src.database import create_app, db
+from src.lookups import lookup
+from src.models import Club, User
+from scripts.bootstrap import load_data, create_user
+
+@pytest.fixture(scope="function")
+def lookupApp():
+    """Set up an in-memory app reporting lookup counters."""
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "TESTING": True,
+                      "LOOKUP_DEBUG_HEADERS": True})
+    with app.app_context():
+        db.create_all()
+        load_data()
+        create_user()
+        db.session.remove()
+    yield app
+
+def test_lookups_are_cached_per_request(lookupApp):
+    """Test that repeated lookups hit the cache and flushes drop stale results."""
+    with lookupApp.test_request_context():
+        first = lookup(Club, code="pppjo")
+        assert lookup(Club, code="pppjo") is first
+        assert lookup(User, username="nobody") is None
+        assert lookup(User, username="nobody") is None
+        user = User.addUserToDb(User.createNewUser("nobody", "nobody@example.com", set()))
+        # The miss is forgotten once a user is flushed, and the hit is filed under its id
+        assert lookup(User, username="nobody") is user
+        assert lookup(User, id=user.id) is user
+        # createNewUser reuses the cached miss on the username
+        assert g.lookups.hits == 4 and g.lookups.queries == 4
+        db.session.remove()
+
+def test_lookup_headers_and_fresh_requests(lookupApp):
+    """Test the debug headers and that a later request sees committed changes."""
+    client = lookupApp.test_client()
+    response = client.post('/api/reviews', data=json.dumps({
+        "user_id": 1, "club_code": "pppjo", "rating": 8, "title": "Great club!"}),
+        content_type='application/json')
+    assert response.status_code == 201
+    assert int(response.headers["X-Lookup-Queries"]) >= 2
+    assert "X-Lookup-Hits" in response.headers
+    # A duplicate is still refused, and renames are visible to the next request
+    response = client.post('/api/reviews', data=json.dumps({
+        "user_id": 1, "club_code": "pppjo", "rating": 5, "title": "Again"}),
+        content_type='application/json')
+    assert response.status_code == 400
+    client.put('/api/clubs/pppjo', data=json.dumps({"name": "Renamed"}), content_type='application/json')
+    assert json.loads(client.get('/api/clubs?codes=pppjo').data)["clubs"][0]["name"] == "Renamed"
+    with lookupApp.app_context():
+        db.session.remove()
+
+def test_lookups_end_with_the_request(lookupApp):
+    """Test that a request sharing an outer app context does not reuse the last request's results."""
+    client = lookupApp.test_client()
+    with lookupApp.app_context():
+        for _ in range(2):
+            response = client.get('/api/users/1/reviews/pppjo')
+            assert response.headers["X-Lookup-Hits"] == "0"
+            db.session.remove()
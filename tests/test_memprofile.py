@@ -0,0 +1,56 @@
+import json
+import tracemalloc
+
+import pytest
+
+from src.database import create_app, db
+from scripts.bootstrap import load_data
+
+@pytest.fixture(scope="function")
+def testClient():
+    """Set up an app that traces every request.
+    (return) TestClient: Client of an in-memory app with profiling on.
+    """
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "MEMORY_PROFILING": True,
+        "MEMORY_SAMPLE_RATE": 1.0
+    })
+    with app.app_context():
+        db.create_all()
+        load_data()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+    app.extensions["memoryProfiler"].reset()
+
+def test_requests_are_profiled_per_route(testClient):
+    """Test that sampled requests record peak and retained bytes by route."""
+    for _ in range(2):
+        assert testClient.get('/api/clubs').status_code == 200
+    assert not tracemalloc.is_tracing()
+
+    data = json.loads(testClient.get('/api/debug/memory').data)
+    stats = data["routes"]["GET /api/clubs"]
+    assert stats["samples"] == 2
+    assert stats["peak_bytes_max"] >= stats["peak_bytes_mean"] > 0
+    assert data["diff"] is None
+    assert "GET /api/debug/memory" not in data["routes"]
+
+def test_snapshot_diff(testClient):
+    """Test that two snapshots produce a diff of allocation sites."""
+    assert testClient.post('/api/debug/memory').status_code == 201
+    retained = [bytearray(4096) for _ in range(64)]
+    assert testClient.post('/api/debug/memory').status_code == 201
+    diff = json.loads(testClient.get('/api/debug/memory?limit=5').data)["diff"]
+    assert len(diff) <= 5
+    assert any("test_memprofile.py" in site["site"] and site["size_diff"] >= 4096 * 64
+               for site in diff)
+    assert testClient.delete('/api/debug/memory').status_code == 200
+    assert not tracemalloc.is_tracing()
+    del retained
+
+def test_memory_profiling_disabled_by_default():
+    """Test that the endpoint reports profiling as off unless enabled."""
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+    assert app.test_client().get('/api/debug/memory').status_code == 404
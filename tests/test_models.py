@@ -321,3 +321,43 @@ def test_user_json_with_reviews(testClient):
         # Check JSON includes review count
         user_json = user.toJson()
         assert user_json["reviews_count"] == 1
+
+
+def test_set_tags_applies_difference(testClient):
+    """Test that replacing tags issues one DELETE and one INSERT on the links.
+    (return) None
+    """
+    from sqlalchemy import event
+    from src.models import Tag, tagDictionary
+    club = db.session.get(Club, "pppjo")
+    before = {tag.name for tag in club.tags}
+    kept = sorted(before)[0]
+    statements = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "club_tag_association" in statement.split("WHERE")[0]:
+            statements.append(statement.split()[0])
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        club.setTags({kept, "Brand New Tag"})
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+    db.session.commit()
+    assert statements == ["SELECT", "DELETE", "INSERT"]
+    assert {tag.name for tag in club.tags} == {kept, "Brand New Tag"}
+    assert db.session.get(Tag, "Brand New Tag").clubCount == 1
+    assert tagDictionary.missing(db.session, {"Brand New Tag"}) == set()
+
+
+def test_tag_dictionary_ignores_rolled_back_tags(testClient):
+    """Test that tags created in a rolled back transaction stay unknown.
+    (return) None
+    """
+    from src.models import Tag, tagDictionary
+    club = db.session.get(Club, "pppjo")
+    club.addTag("Ephemeral")
+    db.session.rollback()
+    assert tagDictionary.missing(db.session, {"Ephemeral"}) == {"Ephemeral"}
+    club.addTag("Ephemeral")
+    db.session.commit()
+    assert db.session.get(Tag, "Ephemeral").clubCount == 1
+    assert "Ephemeral" in {tag.name for tag in club.tags}
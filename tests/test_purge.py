@@ -0,0 +1,109 @@
+import json
+
+import pytest
+from sqlalchemy import event, text
+
+from src.database import create_app, db, getReadEngine
+from src.models import Club, Review, ReviewRollup, Tag, User
+from scripts.bootstrap import load_data
+
+REVIEWERS = ["alice", "bobby", "carol", "danny", "erica"]
+
+def loadReviews():
+    """Load the bundled clubs and have every reviewer review two clubs."""
+    load_data()
+    for username in REVIEWERS:
+        user = User.addUserToDb(User.createNewUser(username, f"{username}@upenn.edu", {"pppjo"}))
+        for clubCode in ("pppjo", "pppp"):
+            Review.addReviewToDb(Review.createNewReview(user.id, clubCode, 7, "Review title"))
+    db.session.remove()
+
+@pytest.fixture(scope="function")
+def purgeApp(tmp_path):
+    """Set up a file-backed app that purges anything with three or more reviews.
+    (return) Flask: App with a background purger.
+    """
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'purge.db'}",
+        "PURGE_THRESHOLD": 3,
+        "PURGE_BATCH_SIZE": 2
+    })
+    with app.app_context():
+        db.create_all()
+        loadReviews()
+    yield app
+    app.extensions["purger"].stop()
+    with app.app_context():
+        getReadEngine().dispose()
+        db.engine.dispose()
+
+@pytest.fixture(scope="function")
+def memoryApp():
+    """Set up an in-memory app, which deletes inline."""
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+    with app.app_context():
+        db.create_all()
+        loadReviews()
+        yield app
+
+def test_inline_delete_cascades_in_database(memoryApp):
+    """Test that deleting a club never loads or deletes its children row by row."""
+    statements = []
+    event.listen(db.engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    response = memoryApp.test_client().delete('/api/clubs/pppjo')
+    assert response.status_code == 200
+    assert not any(statement.startswith(("SELECT review", "DELETE FROM review",
+                                         "DELETE FROM club_tag", "DELETE FROM user_club"))
+                   for statement in statements)
+    for table in ("review", "review_rollup", "club_tag_association", "user_club_association"):
+        assert db.session.execute(
+            text(f"SELECT COUNT(*) FROM {table} WHERE club_code = 'pppjo'")).scalar() == 0
+    assert db.session.get(Tag, "Athletics").clubCount == 0
+
+def test_inline_user_delete_updates_rollups_and_changes(memoryApp):
+    """Test that a user deleted inline leaves neither rollups nor the change feed behind."""
+    client = memoryApp.test_client()
+    userId = User.query.filter_by(username="alice").first().id
+    reviewIds = {str(review.id) for review in Review.query.filter_by(user_id=userId)}
+    cursor = json.loads(client.get('/api/changes').data)["cursor"]
+    assert client.delete(f'/api/users/{userId}').status_code == 200
+    trend = json.loads(client.get('/api/clubs/pppp/reviews/trend?bucket=day').data)
+    stats = json.loads(client.get('/api/clubs/pppp/reviews/stats').data)
+    assert sum(bucket["count"] for bucket in trend["buckets"]) == stats["total_reviews"] \
+        == len(REVIEWERS) - 1
+    changes = json.loads(client.get(f'/api/changes?since={cursor}').data)["changes"]
+    assert {change["key"] for change in changes if change["entity"] == "review"
+            and change["action"] == "deleted"} == reviewIds
+    assert {"entity": "user", "key": str(userId), "action": "deleted"}.items() \
+        <= next(change for change in changes if change["entity"] == "user").items()
+
+def test_large_club_is_purged_in_background(purgeApp):
+    """Test that a club over the threshold is deleted by the purger in batches."""
+    client = purgeApp.test_client()
+    assert client.delete('/api/clubs/pppjo').status_code == 202
+    purger = purgeApp.extensions["purger"]
+    purger.join()
+    assert purger.purged == len(REVIEWERS)
+    with purgeApp.app_context():
+        assert db.session.get(Club, "pppjo") is None
+        assert Review.query.filter_by(club_code="pppjo").count() == 0
+        assert Review.query.count() == len(REVIEWERS)
+        assert db.session.get(Tag, "Athletics").clubCount == 0
+    # Small clubs are still deleted inline
+    assert client.delete('/api/clubs/penn-memes').status_code == 200
+
+def test_user_purge_keeps_rollups_correct(purgeApp):
+    """Test that batch-deleting a user's reviews takes them out of club rollups."""
+    with purgeApp.app_context():
+        userId = User.query.filter_by(username="alice").first().id
+    client = purgeApp.test_client()
+    response = client.delete(f'/api/users/{userId}?background=true')
+    assert response.status_code == 202
+    assert json.loads(response.data)["message"] == "User alice scheduled for deletion"
+    purgeApp.extensions["purger"].join()
+    with purgeApp.app_context():
+        assert db.session.get(User, userId) is None
+        rollup = ReviewRollup.query.filter_by(club_code="pppp", bucket="day").one()
+        assert rollup.review_count == len(REVIEWERS) - 1
+        assert rollup.rating_sum == 7 * (len(REVIEWERS) - 1)
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from src.database import create_app, db
+from src.querystats import fingerprint
+from scripts.bootstrap import load_data
+
+@pytest.fixture(scope="function")
+def testClient():
+    """Set up an app with statement statistics on and the bundled clubs.
+    (return) TestClient: Client of an in-memory app with QUERY_STATS on.
+    """
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "QUERY_STATS": True})
+    with app.app_context():
+        db.create_all()
+        load_data()
+        db.session.commit()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+def test_fingerprint_normalizes_literals():
+    """Test that literals, IN lists and multi-row VALUES share a fingerprint."""
+    assert fingerprint("SELECT * FROM club WHERE code = 'abc' AND memberCount > 10") \
+        == "SELECT * FROM club WHERE code = ? AND memberCount > ?"
+    assert fingerprint("SELECT name FROM tag WHERE name IN (?, ?, ?)") \
+        == fingerprint("SELECT name FROM tag\n WHERE name IN (?, ?)")
+    assert fingerprint("INSERT INTO t (a, b) VALUES (?, ?), (?, ?), (?, ?)") \
+        == "INSERT INTO t (a, b) VALUES (?, ...), ..."
+    assert fingerprint("SELECT anon_1.x FROM t2 AS anon_1") == "SELECT anon_1.x FROM t2 AS anon_1"
+
+def test_query_stats_endpoint(testClient):
+    """Test that statements are aggregated, sorted by total time and reset."""
+    assert testClient.delete('/api/debug/queries').status_code == 200
+    for _ in range(3):
+        assert testClient.get('/api/clubs/pppjo/reviews').status_code == 200
+    testClient.get('/api/clubs')
+
+    data = json.loads(testClient.get('/api/debug/queries?limit=1000').data)
+    statements = data["statements"]
+    assert data["fingerprints"] == len(statements)
+    totals = [entry["total_ms"] for entry in statements]
+    assert totals == sorted(totals, reverse=True)
+    clubScan = [entry for entry in statements
+                if entry["statement"].startswith("SELECT club.code")
+                and "WHERE" not in entry["statement"]]
+    assert clubScan and clubScan[0]["rows"] == db.session.execute(
+        db.text("SELECT COUNT(*) FROM club")).scalar()
+    assert max(entry["calls"] for entry in statements) >= 3
+
+    assert testClient.get('/api/debug/queries?limit=0').status_code == 400
+    testClient.delete('/api/debug/queries')
+    assert json.loads(testClient.get('/api/debug/queries').data)["statements"] == []
+
+def test_query_stats_are_off_by_default():
+    """Test that default deployments neither instrument statements nor serve or reset them."""
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+    assert "queryStats" not in app.extensions
+    client = app.test_client()
+    assert client.get('/api/debug/queries').status_code == 404
+    assert client.delete('/api/debug/queries').status_code == 404
@@ -0,0 +1,100 @@
+import pytest
+import json
+from datetime import datetime
+
+from src import recommendations
+from src.app import app, db
+from src.models import ChangeEvent, User, userClubAssociation
+from src.recommendations import coFavoriteIndex, countCooccurrences
+from scripts.bootstrap import load_data
+
+FAVORITES = {
+    "alice": {"pppjo", "penn-memes", "locustlabs"},
+    "bobby": {"pppjo", "penn-memes"},
+    "carol": {"pppjo", "pppp"},
+    "danny": {"penn-memes"},
+}
+
+@pytest.fixture(scope="function")
+def testClient():
+    """Set up a test client with clubs and users who favorited them."""
+    app.config["TESTING"] = True
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    with app.app_context():
+        db.create_all()
+        load_data()
+        for username, favorites in FAVORITES.items():
+            User.addUserToDb(User.createNewUser(username, f"{username}@upenn.edu", favorites))
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+def userId(username):
+    """Return the id of a fixture user."""
+    return User.query.filter_by(username=username).first().id
+
+def test_cooccurrence_numpy_matches_fallback(monkeypatch):
+    """Test that the vectorized and pure Python pair counts agree."""
+    userIds = [1, 1, 1, 2, 2, 3, 3, 4]
+    clubIds = [0, 1, 2, 0, 1, 0, 3, 1]
+    expected = sorted(countCooccurrences(userIds, clubIds, 4))
+    monkeypatch.setattr(recommendations, "np", None)
+    assert sorted(countCooccurrences(userIds, clubIds, 4)) == expected
+    assert (0, 1, 2) in expected and (1, 0, 2) in expected
+
+def test_related_clubs_api(testClient):
+    """Test that related clubs are ranked by cosine similarity."""
+    response = testClient.get('/api/clubs/pppjo/related')
+    assert response.status_code == 200
+    related = json.loads(response.data)["related"]
+    # penn-memes: 2 shared fans, |pppjo|=3, |penn-memes|=3 -> 2/3
+    assert related[0]["code"] == "penn-memes"
+    assert related[0]["similarity"] == pytest.approx(2 / 3, abs=1e-4)
+    assert {club["code"] for club in related} == {"penn-memes", "locustlabs", "pppp"}
+
+    response = testClient.get('/api/clubs/pppjo/related?limit=1')
+    assert len(json.loads(response.data)["related"]) == 1
+    assert testClient.get('/api/clubs/no-such-club/related').status_code == 404
+    assert testClient.get('/api/clubs/pppjo/related?limit=0').status_code == 400
+
+def test_user_recommendations_api(testClient):
+    """Test that recommendations skip clubs the user already favorited."""
+    response = testClient.get(f'/api/users/{userId("danny")}/recommendations')
+    assert response.status_code == 200
+    codes = [club["code"] for club in json.loads(response.data)["recommendations"]]
+    assert codes[0] == "pppjo"
+    assert "penn-memes" not in codes
+    assert testClient.get('/api/users/9999/recommendations').status_code == 404
+
+def test_index_updates_incrementally(testClient):
+    """Test that favorite changes are reflected without a full rebuild."""
+    testClient.get('/api/clubs/pppp/related')
+    assert coFavoriteIndex.built
+
+    danny = userId("danny")
+    testClient.put(f'/api/users/{danny}', data=json.dumps({"favorites": ["pppp", "lorem-ipsum"]}),
+                   content_type='application/json')
+    related = json.loads(testClient.get('/api/clubs/pppp/related').data)["related"]
+    assert "lorem-ipsum" in {club["code"] for club in related}
+    assert coFavoriteIndex.userClubs[danny] == {"pppp", "lorem-ipsum"}
+
+    testClient.delete(f'/api/users/{userId("carol")}')
+    related = json.loads(testClient.get('/api/clubs/pppp/related').data)["related"]
+    assert "pppjo" not in {club["code"] for club in related}
+
+def test_index_follows_other_processes(testClient):
+    """Test that favorites committed outside this process are read back from the change log."""
+    # The second read applies the fixture's own favorite changes
+    for _ in range(2):
+        testClient.get('/api/clubs/pppp/related')
+    danny = userId("danny")
+    db.session.remove()
+    # Another worker's commit: no session events fire here
+    with db.engine.begin() as connection:
+        connection.execute(userClubAssociation.insert(), {"user_id": danny, "club_code": "pppp"})
+        connection.execute(ChangeEvent.__table__.insert(), {
+            "entity": "user", "entity_key": str(danny), "action": "updated",
+            "created_at": datetime.utcnow()})
+    related = json.loads(testClient.get('/api/clubs/pppp/related').data)["related"]
+    assert "penn-memes" in {club["code"] for club in related}
+    assert coFavoriteIndex.userClubs[danny] == {"pppp", "penn-memes"}
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from src.database import create_app, db
+from scripts.bootstrap import load_data
+from scripts.replay import InProcessSender, RouteMatcher, loadRecords, replay, summarize
+
+@pytest.fixture(scope="function")
+def memoryApp():
+    """Set up an in-memory app with the bundled clubs loaded."""
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "TESTING": True})
+    with app.app_context():
+        db.create_all()
+        load_data()
+        db.session.remove()
+    yield app
+
+def writeLines(path, lines):
+    """Write objects to a JSON lines file."""
+    path.write_text("\n".join(json.dumps(line) for line in lines) + "\n")
+
+def test_load_records_skips_unusable_lines(tmp_path):
+    """Test that lines without a method and path are skipped and offsets start at zero."""
+    recording = tmp_path / "traffic.jsonl"
+    writeLines(recording, [
+        {"method": "get", "path": "/api/clubs", "timestamp": 100.5},
+        {"request_id": "user-001", "title": "Not a request"},
+        {"method": "POST", "path": "/api/clubs", "body": {"code": "x"}, "timestamp": 101.0}
+    ])
+    records, skipped = loadRecords(recording)
+    assert skipped == 1
+    assert [record["method"] for record in records] == ["GET", "POST"]
+    assert [record["offset"] for record in records] == [0.0, 0.5]
+
+def test_replay_reports_per_route_stats(memoryApp, tmp_path):
+    """Test an in-process replay grouped by URL rule with errors counted."""
+    recording = tmp_path / "traffic.jsonl"
+    writeLines(recording, [
+        {"method": "GET", "path": "/api/clubs/pppjo/reviews"},
+        {"method": "GET", "path": "/api/clubs/locustlabs/reviews"},
+        {"method": "POST", "path": "/api/clubs", "body": {}},
+        {"method": "GET", "path": "/missing"}
+    ])
+    records, _ = loadRecords(recording)
+    results, elapsed = replay(records, lambda: InProcessSender(memoryApp),
+                              RouteMatcher(memoryApp), concurrency=1, speed=0, loops=2)
+    report = summarize(results, elapsed)
+    assert report["overall"]["count"] == 8
+    club = report["routes"]["GET /api/clubs/<club_code>/reviews"]
+    assert club["count"] == 4 and club["statuses"] == {"200": 4}
+    assert club["p50_ms"] <= club["p95_ms"] <= club["p99_ms"]
+    assert report["routes"]["POST /api/clubs"]["statuses"] == {"400": 2}
+    assert report["routes"]["GET <unmatched>"]["count"] == 2
+    assert report["overall"]["error_rate"] == 0.0
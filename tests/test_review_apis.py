@@ -1,7 +1,12 @@
 import pytest
 import json
+from sqlalchemy import text
+
 from src.app import app, db
-from src.models import User
+from src.database import create_app, getReadEngine
+from datetime import datetime
+
+from src.models import User, Review
 from scripts.bootstrap import load_data, create_user
 
 @pytest.fixture(scope="function")
@@ -265,3 +270,126 @@ def test_get_reviews_pagination_api(testClient):
         assert "total" in data
         assert "pages" in data
         assert "current_page" in data
+
+def test_get_club_review_trend_api(testClient):
+    """Test rating trends served from review rollups."""
+    with app.app_context():
+        user = User.query.filter_by(username="Josh").first()
+        user2 = User.createNewUser("trenduser", "trend@example.com", set())
+        User.addUserToDb(user2)
+        for reviewer, rating, createdAt in ((user, 6, datetime(2024, 1, 15)),
+                                            (user2, 9, datetime(2024, 2, 20))):
+            review = Review.createNewReview(user_id=reviewer.id, club_code="pppjo",
+                                            rating=rating, title="Trend review")
+            review.created_at = createdAt
+            Review.addReviewToDb(review)
+        
+        response = testClient.get('/api/clubs/pppjo/reviews/trend?bucket=month')
+        assert response.status_code == 200
+        buckets = json.loads(response.data)["buckets"]
+        assert [b["bucket_start"] for b in buckets] == ["2024-01-01", "2024-02-01"]
+        assert buckets[1]["average_rating"] == 9.0
+        assert buckets[1]["histogram"]["9"] == 1
+        
+        response = testClient.get('/api/clubs/pppjo/reviews/trend?bucket=day&from=2024-02-01&to=2024-02-28')
+        buckets = json.loads(response.data)["buckets"]
+        assert [b["bucket_start"] for b in buckets] == ["2024-02-20"]
+        
+        assert testClient.get('/api/clubs/pppjo/reviews/trend?bucket=year').status_code == 400
+        assert testClient.get('/api/clubs/pppjo/reviews/trend?from=yesterday').status_code == 400
+        assert testClient.get('/api/clubs/no-club/reviews/trend').status_code == 404
+
+def test_multi_get_reviews_api(testClient):
+    """Test fetching several reviews by id with their user and club names."""
+    with app.app_context():
+        user = User.query.filter_by(username="Josh").first()
+        ids = []
+        for code in ("pppjo", "pppp"):
+            response = testClient.post('/api/reviews', data=json.dumps({
+                "user_id": user.id, "club_code": code, "rating": 7, "title": "Solid club"}),
+                content_type='application/json')
+            ids.append(json.loads(response.data)["id"])
+
+        response = testClient.get(f'/api/reviews?ids={ids[1]},12345,{ids[0]}')
+        data = json.loads(response.data)
+        assert [review["id"] for review in data["reviews"]] == [ids[1], ids[0]]
+        assert data["reviews"][0]["user_username"] == "Josh"
+        assert data["missing"] == [12345]
+        assert testClient.get('/api/reviews?ids=').status_code == 400
+
+def test_search_reviews_api(testClient):
+    """Test ranked full-text search with snippets, filters, paging and index updates."""
+    with app.app_context():
+        josh = User.query.filter_by(username="Josh").first()
+        other = User.addUserToDb(User.createNewUser("searcher", "search@example.com", set()))
+        posted = {}
+        for user, code, rating, title, text in (
+                (josh, "pppjo", 9, "Recruiting powerhouse", "Helped me with recruiting season."),
+                (josh, "penn-memes", 4, "Memes only", "Nothing about careers here."),
+                (other, "pppjo", 6, "Decent jugglers", "Some recruiting talk at meetings.")):
+            response = testClient.post('/api/reviews', data=json.dumps({
+                "user_id": user.id, "club_code": code, "rating": rating,
+                "title": title, "text": text}), content_type='application/json')
+            posted[title] = json.loads(response.data)["id"]
+
+        data = json.loads(testClient.get('/api/reviews/search?q=recruit*').data)
+        results = data["results"]
+        # The title match ranks first
+        assert [r["id"] for r in results] == [posted["Recruiting powerhouse"], posted["Decent jugglers"]]
+        assert results[0]["title_highlight"] == "<mark>Recruiting</mark> powerhouse"
+        assert "<mark>recruiting</mark>" in results[1]["snippet"]
+        assert results[0]["club_name"] and results[0]["score"] >= results[1]["score"]
+        assert data["has_more"] is False
+
+        data = json.loads(testClient.get('/api/reviews/search?q=recruiting&min_rating=7').data)
+        assert [r["id"] for r in data["results"]] == [posted["Recruiting powerhouse"]]
+        data = json.loads(testClient.get('/api/reviews/search?q=recruiting&club_code=penn-memes').data)
+        assert data["results"] == []
+        data = json.loads(testClient.get('/api/reviews/search?q=recruiting&per_page=1').data)
+        assert len(data["results"]) == 1 and data["has_more"] is True and data["truncated"] is False
+
+        reviewId = posted["Memes only"]
+        testClient.put(f'/api/reviews/{reviewId}', data=json.dumps({"text": "Great for recruiting"}),
+                       content_type='application/json')
+        testClient.delete(f'/api/reviews/{posted["Decent jugglers"]}')
+        data = json.loads(testClient.get('/api/reviews/search?q=recruiting').data)
+        assert {r["id"] for r in data["results"]} == {posted["Recruiting powerhouse"], reviewId}
+
+        assert testClient.get('/api/reviews/search?q=%20').status_code == 400
+        assert testClient.get('/api/reviews/search?q=---').status_code == 400
+        assert testClient.get('/api/reviews/search?q=club&min_rating=11').status_code == 400
+
+def test_search_ranks_all_matches_unless_windowed(tmp_path):
+    """Test full ranking by default, the flagged candidate window, and building a missing index on start."""
+    uri = f"sqlite:///{tmp_path / 'search.db'}"
+    apps = [create_app({"SQLALCHEMY_DATABASE_URI": uri, "BACKGROUND_PURGE": False})]
+    with apps[0].app_context():
+        db.create_all()
+        load_data()
+        create_user()
+        josh = User.query.filter_by(username="Josh").first()
+        # The oldest review is the best match; newer ones only mention the word once
+        Review.addReviewToDb(Review.createNewReview(josh.id, "pppjo", 9, "Recruiting",
+                                                    "Recruiting events and recruiting advice."))
+        for code in ("penn-memes", "pppp", "locustlabs"):
+            Review.addReviewToDb(Review.createNewReview(josh.id, code, 5, "Fine club",
+                                                        "Some recruiting talk at meetings."))
+        # As on a database created before the index existed
+        db.session.execute(text("DROP TABLE review_search"))
+        db.session.commit()
+        db.session.remove()
+    apps.append(create_app({"SQLALCHEMY_DATABASE_URI": uri, "BACKGROUND_PURGE": False}))
+    apps.append(create_app({"SQLALCHEMY_DATABASE_URI": uri, "BACKGROUND_PURGE": False,
+                            "SEARCH_CANDIDATES": 2}))
+
+    data = json.loads(apps[1].test_client().get('/api/reviews/search?q=recruiting').data)
+    assert len(data["results"]) == 4 and data["truncated"] is False
+    assert data["results"][0]["club_code"] == "pppjo"
+    data = json.loads(apps[2].test_client().get('/api/reviews/search?q=recruiting').data)
+    assert len(data["results"]) == 2 and data["truncated"] is True and data["has_more"] is False
+    assert "pppjo" not in {review["club_code"] for review in data["results"]}
+    for searchApp in apps:
+        searchApp.extensions["jobRunner"].shutdown()
+        with searchApp.app_context():
+            getReadEngine().dispose()
+            db.engine.dispose()
@@ -1,7 +1,9 @@
 import pytest
 
 from src.app import app, db
-from src.models import Club, User, Review
+from datetime import date, datetime
+
+from src.models import Club, User, Review, ReviewRollup
 from scripts.bootstrap import load_data, create_user
 
 @pytest.fixture(scope="function")
@@ -207,3 +209,53 @@ def test_review_to_json(testClient):
         assert json_data["user_username"] == "Josh"
         assert "created_at" in json_data
         assert "updated_at" in json_data
+
+def test_review_rollups_follow_writes(testClient):
+    """Test that rollups track review inserts, rating edits and deletes."""
+    with app.app_context():
+        user = User.query.filter_by(username="Josh").first()
+        user2 = User.createNewUser("testuser2", "test2@example.com", set())
+        User.addUserToDb(user2)
+        
+        first = Review.createNewReview(user_id=user.id, club_code="pppjo",
+                                       rating=8, title="Good club")
+        first.created_at = datetime(2024, 3, 6, 12, 0)
+        Review.addReviewToDb(first)
+        second = Review.createNewReview(user_id=user2.id, club_code="pppjo",
+                                        rating=4, title="Okay club")
+        second.created_at = datetime(2024, 3, 8, 9, 30)
+        Review.addReviewToDb(second)
+        
+        week = db.session.get(ReviewRollup, ("pppjo", "week", date(2024, 3, 4)))
+        assert week.review_count == 2
+        assert week.toJson()["average_rating"] == 6.0
+        assert week.histogram()["8"] == 1 and week.histogram()["4"] == 1
+        
+        second.updateRating(10)
+        db.session.commit()
+        month = db.session.get(ReviewRollup, ("pppjo", "month", date(2024, 3, 1)))
+        assert month.rating_sum == 18
+        assert month.rating_4 == 0 and month.rating_10 == 1
+        
+        db.session.delete(first)
+        db.session.commit()
+        day = db.session.get(ReviewRollup, ("pppjo", "day", date(2024, 3, 6)))
+        assert day.review_count == 0
+        assert month.review_count == 1
+
+def test_review_rollup_rebuild(testClient):
+    """Test that rebuilding rollups reproduces the incrementally kept rows."""
+    with app.app_context():
+        user = User.query.filter_by(username="Josh").first()
+        for code, rating in (("pppjo", 7), ("penn-memes", 9)):
+            Review.addReviewToDb(Review.createNewReview(
+                user_id=user.id, club_code=code, rating=rating, title="Rollup review"))
+        kept = sorted((r.club_code, r.bucket, r.bucket_start, r.review_count, r.rating_sum)
+                      for r in ReviewRollup.query.all())
+        
+        assert ReviewRollup.rebuild(db.session) == len(kept)
+        db.session.commit()
+        db.session.expire_all()
+        rebuilt = sorted((r.club_code, r.bucket, r.bucket_start, r.review_count, r.rating_sum)
+                         for r in ReviewRollup.query.all())
+        assert rebuilt == kept
@@ -0,0 +1,167 @@
+import json
+
+import pytest
+from sqlalchemy import func, select, text
+
+from src.database import create_app, db
+from src.models import Club, Review, User
+from src.shards import UnsupportedShardQuery, shardIndex
+from scripts.bootstrap import load_data
+
+SHARDS = 3
+REVIEWERS = ["alice", "bobby", "carol"]
+
+@pytest.fixture(scope="function")
+def shardedApp(tmp_path):
+    """Set up a file-backed app whose reviews are split across three shards.
+    (return) Flask: App with bundled clubs, three users and their reviews.
+    """
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'main.db'}",
+        "REVIEW_SHARDS": SHARDS,
+        "BACKGROUND_PURGE": False
+    })
+    with app.app_context():
+        db.create_all()
+        load_data()
+        codes = [code for (code,) in db.session.query(Club.code).order_by(Club.code).limit(6)]
+        for username in REVIEWERS:
+            db.session.add(User.createNewUser(username, f"{username}@upenn.edu", set()))
+        db.session.commit()
+        userIds = [user.id for user in User.query.order_by(User.id)]
+        db.session.remove()
+    client = app.test_client()
+    for userId in userIds:
+        for rating, code in enumerate(codes, start=3):
+            response = client.post('/api/reviews', data=json.dumps({
+                "user_id": userId, "club_code": code, "rating": rating, "title": "Sharded review"}),
+                content_type='application/json')
+            assert response.status_code == 201
+    yield app, codes, userIds
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    app.extensions["reviewShards"].dropAll()
+
+def shardRows(app, index):
+    """Return (id, club_code) of every review stored in one shard."""
+    with app.extensions["reviewShards"].engines[index].connect() as connection:
+        return connection.execute(text("SELECT id, club_code FROM review")).all()
+
+def test_reviews_are_placed_by_club_code(shardedApp):
+    """Test that each review lives on its club's shard with an id of that shard."""
+    app, codes, userIds = shardedApp
+    stored = []
+    for index in range(SHARDS):
+        for reviewId, clubCode in shardRows(app, index):
+            assert shardIndex(clubCode, SHARDS) == index
+            assert reviewId % SHARDS == index
+            stored.append(reviewId)
+    assert len(stored) == len(set(stored)) == len(codes) * len(userIds)
+    with app.app_context():
+        assert db.session.execute(text("SELECT COUNT(*) FROM review")).scalar() == 0
+
+def test_single_shard_routes(shardedApp):
+    """Test club reviews, stats, trend and id lookups on a sharded store."""
+    app, codes, userIds = shardedApp
+    client = app.test_client()
+    reviews = json.loads(client.get(f'/api/clubs/{codes[0]}/reviews?sort=rating_desc').data)
+    assert {review["club_code"] for review in reviews} == {codes[0]}
+    assert len(reviews) == len(userIds)
+    stats = json.loads(client.get(f'/api/clubs/{codes[0]}/reviews/stats').data)
+    assert stats["total_reviews"] == len(userIds)
+    trend = json.loads(client.get(f'/api/clubs/{codes[1]}/reviews/trend').data)
+    assert sum(bucket["count"] for bucket in trend["buckets"]) == len(userIds)
+
+    reviewId = reviews[0]["id"]
+    assert json.loads(client.get(f'/api/reviews/{reviewId}').data)["club_name"]
+    response = client.put(f'/api/reviews/{reviewId}', data=json.dumps({"rating": 10}),
+                          content_type='application/json')
+    assert response.status_code == 200
+    assert client.delete(f'/api/reviews/{reviewId}').status_code == 200
+    assert client.get(f'/api/reviews/{reviewId}').status_code == 404
+
+def test_scatter_gather_routes(shardedApp):
+    """Test that cross-shard listings are merged in order and paged globally."""
+    app, codes, userIds = shardedApp
+    client = app.test_client()
+    seen = []
+    page = 1
+    while True:
+        data = json.loads(client.get(f'/api/reviews?page={page}&per_page=4').data)
+        assert data["total"] == len(codes) * len(userIds)
+        if not data["reviews"]:
+            break
+        seen.extend(review["id"] for review in data["reviews"])
+        page += 1
+    assert seen == sorted(seen) and len(seen) == len(codes) * len(userIds)
+    picked = [seen[4], seen[0], seen[2]]
+    data = json.loads(client.get(f'/api/reviews?ids={",".join(map(str, picked))},99999').data)
+    assert [review["id"] for review in data["reviews"]] == picked
+    assert data["missing"] == [99999]
+
+    mine = json.loads(client.get(f'/api/users/{userIds[0]}/reviews').data)
+    assert {review["club_code"] for review in mine} == set(codes)
+    stamps = [review["created_at"] for review in mine]
+    assert stamps == sorted(stamps, reverse=True)
+    user = json.loads(client.get(f'/api/users/{userIds[0]}').data)
+    assert user["reviews_count"] == len(codes)
+
+def test_search_spans_shards(shardedApp):
+    """Test that review search merges matches from every shard and pages them."""
+    app, codes, userIds = shardedApp
+    client = app.test_client()
+    found = []
+    for page in (1, 2, 3):
+        data = json.loads(client.get(f'/api/reviews/search?q=sharded&page={page}&per_page=8').data)
+        found.extend(review["id"] for review in data["results"])
+    assert len(found) == len(set(found)) == len(codes) * len(userIds)
+    assert data["has_more"] is False
+    data = json.loads(client.get(f'/api/reviews/search?q=sharded&club_code={codes[2]}').data)
+    assert {review["club_code"] for review in data["results"]} == {codes[2]}
+    assert len(data["results"]) == len(userIds)
+
+def test_deletes_remove_sharded_reviews(shardedApp):
+    """Test that deleting a club or a user removes their reviews on every shard."""
+    app, codes, userIds = shardedApp
+    client = app.test_client()
+    assert client.delete(f'/api/clubs/{codes[0]}').status_code == 200
+    assert client.delete(f'/api/users/{userIds[0]}').status_code == 200
+    remaining = [row for index in range(SHARDS) for row in shardRows(app, index)]
+    assert len(remaining) == (len(codes) - 1) * (len(userIds) - 1)
+    assert all(clubCode != codes[0] for _, clubCode in remaining)
+    trend = json.loads(client.get(f'/api/clubs/{codes[1]}/reviews/trend').data)
+    assert sum(bucket["count"] for bucket in trend["buckets"]) == len(userIds) - 1
+
+def test_shards_need_file_database():
+    """Test that sharding is refused for an in-memory database."""
+    with pytest.raises(ValueError):
+        create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "REVIEW_SHARDS": 2})
+
+def test_deleted_review_ids_are_not_reused(shardedApp):
+    """Test that a new review does not take the id of the shard's newest, deleted review."""
+    app, codes, userIds = shardedApp
+    client = app.test_client()
+    newest = max(reviewId for reviewId, clubCode in shardRows(app, shardIndex(codes[0], SHARDS)))
+    deleted = json.loads(client.get(f'/api/reviews/{newest}').data)
+    assert client.delete(f'/api/reviews/{newest}').status_code == 200
+    response = client.post('/api/reviews', data=json.dumps({
+        "user_id": deleted["user_id"], "club_code": deleted["club_code"], "rating": 5,
+        "title": "Again"}),
+        content_type='application/json')
+    assert response.status_code == 201
+    assert json.loads(response.data)["id"] == newest + SHARDS
+
+def test_grouped_aggregates_merge_across_shards(shardedApp):
+    """Test that groups spanning shards are combined, and unmergeable ones are refused."""
+    app, codes, userIds = shardedApp
+    with app.app_context():
+        counts = db.session.execute(
+            select(Review.rating, func.count().label("n"))
+            .group_by(Review.rating).order_by(Review.rating)).all()
+        assert [tuple(row) for row in counts] == [
+            (rating, len(userIds)) for rating in range(3, 3 + len(codes))]
+        with pytest.raises(UnsupportedShardQuery):
+            db.session.execute(select(Review.user_id, func.avg(Review.rating))
+                               .group_by(Review.user_id)).all()
+        db.session.remove()